@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-import json
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
+from app.services.json_repair import parse_json_object
 from app.services.llm import LLMClient
+from app.services.llm_schemas import INTENT_SCHEMA
+from app.services.llm_scheduler import LLMBusy
 
 ALLOWED_INTENTS = {
     "quiz", "ask", "flashcards", "plan",
@@ -11,6 +13,10 @@ ALLOWED_INTENTS = {
     "unknown",
 }
 
+INTENT_CACHE_TTL_S = 7 * 24 * 3600
+
+_UNKNOWN: Dict[str, Any] = {"intent": "unknown", "topic": None, "question": None, "plan_request": None}
+
 async def infer_intent(llm: LLMClient, text: str) -> Dict[str, Any]:
     prompt = f"""
 You are an intent router for a Discord cybersecurity study bot.
@@ -43,16 +49,37 @@ Output JSON schema:
 """.strip()
 
     system = "Return ONLY JSON."
-    raw = await llm.ask(api_key="", prompt=prompt, system=system, max_tokens=220)
-
     try:
-        data = json.loads(raw.strip())
-    except Exception:
-        return {"intent": "unknown", "topic": None, "question": None, "plan_request": None}
+        raw = await llm.ask(
+            api_key="",
+            prompt=prompt,
+            system=system,
+            max_tokens=220,
+            cache=True,
+            cache_ttl=INTENT_CACHE_TTL_S,
+            # a reply that doesn't parse must not route this text for a week
+            cache_if=lambda r: _parse_intent(r) is not None,
+            site="intent",
+            schema=INTENT_SCHEMA,
+        )
+    except LLMBusy:
+        return dict(_UNKNOWN)
+
+    return _parse_intent(raw) or dict(_UNKNOWN)
+
+
+def _parse_intent(raw: str) -> Optional[Dict[str, Any]]:
+    """
+    The routed intent from the model's reply, None if it isn't a JSON
+    object with a known intent.
+    """
+    data, _ = parse_json_object(raw)
+    if data is None:
+        return None
 
     intent = str(data.get("intent", "unknown")).lower()
     if intent not in ALLOWED_INTENTS:
-        intent = "unknown"
+        return None
 
     topic = data.get("topic", None)
     question = data.get("question", None)
@@ -167,6 +167,8 @@ def register_chat_router(client: discord.Client, store, llm: LLMClient):
                 topic=topic,
                 store=store,
                 llm=llm,
+                client=client,
+                guild_id=message.guild.id if message.guild else 0,
             )
             return
 
@@ -194,6 +196,8 @@ def register_chat_router(client: discord.Client, store, llm: LLMClient):
                     topic=value,
                     store=store,
                     llm=llm,
+                    client=client,
+                    guild_id=message.guild.id if message.guild else 0,
                 )
                 return
 
@@ -259,6 +263,8 @@ def register_chat_router(client: discord.Client, store, llm: LLMClient):
                 topic=topic,
                 store=store,
                 llm=llm,
+                client=client,
+                guild_id=message.guild.id if message.guild else 0,
             )
             return
 
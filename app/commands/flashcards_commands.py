@@ -2,12 +2,17 @@ import logging
 import discord
 from discord import app_commands
 
+from config import FLASHCARDS_SLA_S
 from app.utils.perms import clamp
 from app.utils.text import clean_llm_text, topics_autocomplete
 from app.utils.embeds import reply_embed, reply_error
-from app.utils.loading import start_loading, stop_loading
+from app.utils.loading import busy_text, queue_note, start_loading, stop_loading
 
+from app.services.flashcard_decks import GRADE_FORGOT, GRADE_KNEW, FlashcardDecks
 from app.services.flashcards_gen import generate_flashcards
+from app.services.llm_deadline import Deadline
+from app.services.llm_scheduler import LLMBusy, PRIORITY_GENERATION
+from app.services.prefetch import Prefetcher
 from app.views.flashcards_view import FlashcardsView
 
 from app.models.cards import Flashcard
@@ -16,6 +21,54 @@ from app.constants import AI_FOOTER
 log = logging.getLogger("Mentra")
 
 
+async def _get_cards(
+    decks: FlashcardDecks | None, prefetch: Prefetcher | None, llm, *, api_key: str, topic: str, n: int, user_id: int
+):
+    """
+    With stored decks: due reviews and unseen deck cards, generating only
+    what the deck lacks. Otherwise a deck the Prefetcher already made for
+    this user/topic, else a fresh one.
+    """
+    if decks is not None:
+        return await decks.session(
+            llm,
+            api_key=api_key,
+            topic=topic,
+            n=n,
+            user_id=user_id,
+            prefetch=prefetch,
+            deadline=Deadline.after(FLASHCARDS_SLA_S),
+        )
+    if prefetch is not None:
+        cards = prefetch.take_flashcards(user_id, topic, n)
+        if cards:
+            return cards
+    return await generate_flashcards(
+        llm,
+        api_key=api_key,
+        topic=topic,
+        n=n,
+        deadline=Deadline.after(FLASHCARDS_SLA_S),
+    )
+
+
+def _grader(decks: FlashcardDecks | None, user_id: int):
+    """
+    FlashcardsView on_grade hook recording SM-2 reviews, or None.
+    """
+    if decks is None:
+        return None
+    return lambda card, remembered: decks.review(user_id, card.id, GRADE_KNEW if remembered else GRADE_FORGOT)
+
+
+def _prefetch_quiz(prefetch: Prefetcher | None, llm, *, api_key: str, topic: str, store, guild_id: int, user_id: int) -> None:
+    """
+    The deck says "Run /quiz on the same topic": get that quiz ready.
+    """
+    if prefetch is not None:
+        prefetch.speculate_quiz(llm, api_key=api_key, topic=topic, n=5, store=store, guild_id=guild_id, user_id=user_id)
+
+
 async def run_flashcards_from_chat(
     *,
     channel: discord.abc.Messageable,
@@ -23,17 +76,21 @@ async def run_flashcards_from_chat(
     topic: str,
     store,
     llm,
+    client: discord.Client | None = None,
+    guild_id: int = 0,
 ) -> None:
     api_key = store.get_key(user.id) or ""
-    loading_msg = await channel.send(" 🗃️ Generating flashcards...")
+    loading_msg = await channel.send(
+        " 🗃️ Generating flashcards..." + queue_note(llm.queue_position(PRIORITY_GENERATION))
+    )
 
+    prefetch = getattr(client, "prefetch", None)
+    decks = getattr(client, "decks", None)
     try:
-        cards = await generate_flashcards(
-            llm,
-            api_key=api_key,
-            topic=topic,
-            n=10,
-        )
+        cards = await _get_cards(decks, prefetch, llm, api_key=api_key, topic=topic, n=10, user_id=user.id)
+    except LLMBusy as e:
+        await loading_msg.edit(content=busy_text(e.retry_after))
+        return
     except Exception:
         log.exception("Chat flashcards failed")
         await loading_msg.edit(content="❌ Flashcards generation failed. Check logs.")
@@ -66,6 +123,7 @@ async def run_flashcards_from_chat(
         owner_id=user.id,
         topic=clean_llm_text(topic)[:80],
         cards=cards_list,
+        on_grade=_grader(decks, user.id),
     )
 
     try:
@@ -86,6 +144,7 @@ async def run_flashcards_from_chat(
 
         msg = await channel.send(embed=view.current_embed(), view=view)
         view.attach_message(msg)
+        _prefetch_quiz(prefetch, llm, api_key=api_key, topic=topic, store=store, guild_id=guild_id, user_id=user.id)
     except Exception:
         log.exception("Chat flashcards send failed")
         try:
@@ -116,15 +175,21 @@ def register_flashcards_commands(client: discord.Client, store, llm) -> None:
 
         api_key = store.get_key(interaction.user.id) or ""
         await interaction.response.defer(thinking=True)
-        _loading = await start_loading(interaction, "flashcards")
+        _loading = await start_loading(
+            interaction, "flashcards", llm.queue_position(PRIORITY_GENERATION)
+        )
 
+        prefetch = getattr(client, "prefetch", None)
+        decks = getattr(client, "decks", None)
         try:
-            cards = await generate_flashcards(
-                llm,
-                api_key=api_key,
-                topic=topic,
-                n=num_cards,
+            cards = await _get_cards(
+                decks, prefetch, llm, api_key=api_key, topic=topic, n=num_cards, user_id=interaction.user.id
             )
+        except LLMBusy as e:
+            log.warning("/flashcards shed by scheduler user=%s", interaction.user.id)
+            await reply_error(interaction, busy_text(e.retry_after), ephemeral=True)
+            await stop_loading(_loading)
+            return
         except Exception:
             log.exception("LLM /flashcards failed")
             await reply_error(interaction, "Flashcards generation failed. Check logs.", ephemeral=True)
@@ -174,6 +239,7 @@ def register_flashcards_commands(client: discord.Client, store, llm) -> None:
             owner_id=interaction.user.id,
             topic=clean_llm_text(topic)[:80],
             cards=cards_list,
+            on_grade=_grader(decks, interaction.user.id),
         )
 
         await reply_embed(
@@ -195,6 +261,15 @@ def register_flashcards_commands(client: discord.Client, store, llm) -> None:
 
         msg = await interaction.followup.send(embed=view.current_embed(), view=view, ephemeral=False)
         view.attach_message(msg)
+        _prefetch_quiz(
+            prefetch,
+            llm,
+            api_key=api_key,
+            topic=topic,
+            store=store,
+            guild_id=interaction.guild_id or 0,
+            user_id=interaction.user.id,
+        )
 
     @flashcards.autocomplete("topic")
     async def flashcards_topic_autocomplete(interaction: discord.Interaction, current: str):
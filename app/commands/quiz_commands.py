@@ -5,18 +5,31 @@ import logging
 import discord
 from discord import app_commands
 
+from config import QUIZ_SLA_S
 from app.utils.perms import clamp
 from app.utils.text import clean_llm_text, topics_autocomplete
 from app.utils.embeds import reply_embed, reply_error
-from app.utils.loading import start_loading, stop_loading
+from app.utils.loading import busy_text, queue_note, start_loading, stop_loading
 
-from app.services.quiz_gen import generate_quiz_questions
+from app.services.llm_deadline import Deadline
+from app.services.llm_scheduler import LLMBusy, PRIORITY_GENERATION
+from app.services.prefetch import after_quiz
+from app.services.quiz_bank import start_quiz_feed
 from app.views.quiz_view import QuizView
 from app.constants import AI_FOOTER
 
 log = logging.getLogger(__name__)
 
 
+async def _first_question(feed) -> None:
+    """
+    Wait until the quiz can start; re-raise the generation error (e.g.
+    LLMBusy) if it failed before producing any question.
+    """
+    if not await feed.wait_for(1) and feed.error is not None:
+        raise feed.error
+
+
 async def run_quiz_from_chat(
     *,
     client: discord.Client,
@@ -34,24 +47,33 @@ async def run_quiz_from_chat(
 
     api_key = store.get_key(user.id) or ""
 
-    loading_msg = await channel.send(":test_tube: Generating your quiz...")
+    loading_msg = await channel.send(
+        ":test_tube: Generating your quiz..." + queue_note(llm.queue_position(PRIORITY_GENERATION))
+    )
 
     try:
-        qs = await generate_quiz_questions(
+        feed = start_quiz_feed(
             llm,
+            getattr(client, "quiz_bank", None),
             api_key=api_key,
             topic=topic,
             n=num_q,
             store=store,
             guild_id=guild_id,
             user_id=user.id,
+            deadline=Deadline.after(QUIZ_SLA_S),
+            prefetch=getattr(client, "prefetch", None),
         )
+        await _first_question(feed)
+    except LLMBusy as e:
+        await loading_msg.edit(content=busy_text(e.retry_after))
+        return
     except Exception:
         log.exception("Chat /quiz failed")
         await loading_msg.edit(content="❌ Quiz generation failed. Check logs.")
         return
 
-    if not qs:
+    if not feed.questions:
         await loading_msg.edit(
             content="❌ No questions returned. Try a more specific topic."
         )
@@ -62,9 +84,23 @@ async def run_quiz_from_chat(
         owner_id=user.id,
         username=getattr(user, "name", "user"),
         topic=clean_llm_text(topic)[:80],
-        questions=qs,
+        questions=feed.questions,
         timed=timed,
         seconds_per_question=seconds,
+        feed=feed,
+        llm=llm,
+        api_key=api_key,
+        on_finish=lambda: after_quiz(
+            getattr(client, "prefetch", None),
+            llm,
+            getattr(client, "quiz_bank", None),
+            api_key=api_key,
+            topic=topic,
+            n=num_q,
+            store=store,
+            guild_id=guild_id,
+            user_id=user.id,
+        ),
     )
 
     footer = "MentraAI • evidence → impact → remediation\n" + AI_FOOTER
@@ -80,7 +116,7 @@ async def run_quiz_from_chat(
     intro.add_field(
         name="Topic", value=f"• {clean_llm_text(topic) or '-'}", inline=False
     )
-    intro.add_field(name="Questions", value=f"• {len(qs)}", inline=True)
+    intro.add_field(name="Questions", value=f"• {feed.total}", inline=True)
     intro.add_field(name="Timer", value="• 60s/question", inline=True)
     intro.set_footer(text=footer)
 
@@ -89,6 +125,7 @@ async def run_quiz_from_chat(
         msg = await channel.send(embed=view.build_embed(), view=view)
     except Exception:
         log.exception("Chat quiz send failed")
+        feed.cancel()
         return
 
     view.attach_message(msg)
@@ -130,18 +167,29 @@ def register_quiz_commands(client: discord.Client, store, llm) -> None:
 
         api_key = store.get_key(interaction.user.id) or ""
 
-        loading_msg = await start_loading(interaction, "quiz")
+        loading_msg = await start_loading(
+            interaction, "quiz", llm.queue_position(PRIORITY_GENERATION)
+        )
 
         try:
-            qs = await generate_quiz_questions(
+            feed = start_quiz_feed(
                 llm,
+                getattr(client, "quiz_bank", None),
                 api_key=api_key,
                 topic=topic,
                 n=num_q,
                 store=store,
                 guild_id=interaction.guild_id or 0,
                 user_id=interaction.user.id,
+                deadline=Deadline.after(QUIZ_SLA_S),
+                prefetch=getattr(client, "prefetch", None),
             )
+            await _first_question(feed)
+        except LLMBusy as e:
+            log.warning("/quiz shed by scheduler user=%s", interaction.user.id)
+            await stop_loading(loading_msg)
+            await reply_error(interaction, busy_text(e.retry_after), ephemeral=True)
+            return
         except Exception:
             log.exception("LLM /quiz failed")
             await stop_loading(loading_msg)
@@ -150,7 +198,7 @@ def register_quiz_commands(client: discord.Client, store, llm) -> None:
             )
             return
 
-        if not qs:
+        if not feed.questions:
             await stop_loading(loading_msg)
             await reply_error(
                 interaction,
@@ -167,9 +215,23 @@ def register_quiz_commands(client: discord.Client, store, llm) -> None:
             owner_id=interaction.user.id,
             username=getattr(interaction.user, "name", "user"),
             topic=clean_llm_text(topic)[:80],
-            questions=qs,
+            questions=feed.questions,
             timed=timed,
             seconds_per_question=seconds,
+            feed=feed,
+            llm=llm,
+            api_key=api_key,
+            on_finish=lambda: after_quiz(
+                getattr(client, "prefetch", None),
+                llm,
+                getattr(client, "quiz_bank", None),
+                api_key=api_key,
+                topic=topic,
+                n=num_q,
+                store=store,
+                guild_id=interaction.guild_id or 0,
+                user_id=interaction.user.id,
+            ),
         )
 
         footer = "Mentra • evidence → impact → remediation\n" + AI_FOOTER
@@ -189,13 +251,14 @@ def register_quiz_commands(client: discord.Client, store, llm) -> None:
                         "value": f"• {clean_llm_text(topic) or '-'}",
                         "inline": False,
                     },
-                    {"name": "Questions", "value": f"• {len(qs)}", "inline": True},
+                    {"name": "Questions", "value": f"• {feed.total}", "inline": True},
                     {"name": "Timer", "value": "• 60s/question", "inline": True},
                 ],
                 footer=footer,
                 ephemeral=False,
             )
         except discord.NotFound:
+            feed.cancel()
             return
 
         try:
@@ -203,6 +266,7 @@ def register_quiz_commands(client: discord.Client, store, llm) -> None:
                 embed=view.build_embed(), view=view, ephemeral=False
             )
         except discord.NotFound:
+            feed.cancel()
             return
 
         view.attach_message(msg)
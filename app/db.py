@@ -1,4 +1,5 @@
-﻿import os
+﻿import json
+import os
 import sqlite3
 from datetime import date, datetime, timedelta
 from typing import Optional, List, Tuple, Any, Dict
@@ -149,6 +150,79 @@ class KeyStore:
                 """
             )
 
+            # MinHash signature + LSH band buckets (near-duplicate lookup)
+            self._ensure_columns(con, "quiz_seen", {"minhash": "BLOB"})
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quiz_seen_lsh (
+                    seen_id INTEGER NOT NULL,
+                    guild_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    topic TEXT NOT NULL,
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    PRIMARY KEY (seen_id, band)
+                )
+                """
+            )
+            con.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_quiz_seen_lsh_bucket
+                ON quiz_seen_lsh (guild_id, user_id, topic, bucket)
+                """
+            )
+
+            # Bloom filter of seen signatures per user/topic (hot-path membership)
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quiz_seen_filter (
+                    guild_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    topic TEXT NOT NULL,
+                    bits BLOB NOT NULL,
+                    items INTEGER NOT NULL DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (guild_id, user_id, topic)
+                )
+                """
+            )
+
+            # One row per quiz generation: cost and why candidates were rejected
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quiz_gen_ledger (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    guild_id INTEGER,
+                    user_id INTEGER,
+                    model TEXT NOT NULL DEFAULT '',
+                    topic TEXT NOT NULL DEFAULT '',
+                    requested INTEGER NOT NULL DEFAULT 0,
+                    accepted INTEGER NOT NULL DEFAULT 0,
+                    rounds INTEGER NOT NULL DEFAULT 0,
+                    llm_calls INTEGER NOT NULL DEFAULT 0,
+                    responses INTEGER NOT NULL DEFAULT 0,
+                    wall_ms INTEGER NOT NULL DEFAULT 0,
+                    outcome TEXT NOT NULL DEFAULT '',
+                    funnel TEXT NOT NULL DEFAULT '{}',
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            con.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_quiz_gen_ledger_created
+                ON quiz_gen_ledger (created_at)
+                """
+            )
+            # items requested and raw output size (adaptive request sizing)
+            self._ensure_columns(
+                con,
+                "quiz_gen_ledger",
+                {"asked": "INTEGER NOT NULL DEFAULT 0", "parsed": "INTEGER NOT NULL DEFAULT 0", "out_chars": "INTEGER NOT NULL DEFAULT 0"},
+            )
+            # estimator kind: "quiz" (with explanations) or "quiz.lean"
+            self._ensure_columns(con, "quiz_gen_ledger", {"kind": "TEXT NOT NULL DEFAULT 'quiz'"})
+
             con.commit()
             
     def user_topic_breakdown(self, *, user_id: int, days: int = 30, guild_id: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -811,18 +885,188 @@ class KeyStore:
     # -------------------------
     # Quiz Seen
     # -------------------------
-    def add_quiz_seen(self, guild_id: int, user_id: int, topic: str, sig: str, starter3: str, question: str) -> None:
+    def add_quiz_seen(
+        self,
+        guild_id: int,
+        user_id: int,
+        topic: str,
+        sig: str,
+        starter3: str,
+        question: str,
+        *,
+        minhash: Optional[bytes] = None,
+        buckets: Optional[List[int]] = None,
+    ) -> None:
+        topic_norm = (topic or "").strip().lower()
+        with self._connect() as con:
+            cur = con.execute(
+                """
+                INSERT OR IGNORE INTO quiz_seen (guild_id, user_id, topic, sig, starter3, question, minhash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (int(guild_id), int(user_id), topic_norm, sig, starter3 or "", question, minhash),
+            )
+            if cur.rowcount and buckets:
+                self._insert_lsh(con, int(cur.lastrowid), guild_id, user_id, topic_norm, buckets)
+            con.commit()
+
+    @staticmethod
+    def _insert_lsh(con: sqlite3.Connection, seen_id: int, guild_id: int, user_id: int, topic_norm: str, buckets: List[int]) -> None:
+        con.executemany(
+            """
+            INSERT OR REPLACE INTO quiz_seen_lsh (seen_id, guild_id, user_id, topic, band, bucket)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [(seen_id, int(guild_id), int(user_id), topic_norm, band, int(b)) for band, b in enumerate(buckets)],
+        )
+
+    def add_quiz_seen_batch(
+        self,
+        guild_id: int,
+        user_id: int,
+        topic: str,
+        rows: List[Dict[str, Any]],
+        *,
+        filter_bits: Optional[bytes] = None,
+        filter_items: int = 0,
+    ) -> None:
+        """
+        add_quiz_seen() for several questions plus the updated Bloom filter,
+        in one transaction. Row keys: sig, starter3, question, and optional
+        minhash / buckets.
+        """
+        topic_norm = (topic or "").strip().lower()
+        with self._connect() as con:
+            for r in rows:
+                cur = con.execute(
+                    """
+                    INSERT OR IGNORE INTO quiz_seen (guild_id, user_id, topic, sig, starter3, question, minhash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        int(guild_id),
+                        int(user_id),
+                        topic_norm,
+                        r["sig"],
+                        r.get("starter3") or "",
+                        r["question"],
+                        r.get("minhash"),
+                    ),
+                )
+                if cur.rowcount and r.get("buckets"):
+                    self._insert_lsh(con, int(cur.lastrowid), guild_id, user_id, topic_norm, r["buckets"])
+            if filter_bits is not None:
+                con.execute(
+                    """
+                    INSERT INTO quiz_seen_filter (guild_id, user_id, topic, bits, items)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(guild_id, user_id, topic) DO UPDATE SET bits=excluded.bits, items=excluded.items
+                    """,
+                    (int(guild_id), int(user_id), topic_norm, filter_bits, int(filter_items)),
+                )
+            con.commit()
+
+    def get_quiz_seen_filter(self, guild_id: int, user_id: int, topic: str) -> Optional[Tuple[bytes, int, float]]:
+        """
+        (bits, items, age in days) of the stored Bloom filter, or None.
+        """
+        topic_norm = (topic or "").strip().lower()
+        with self._connect() as con:
+            row = con.execute(
+                """
+                SELECT bits, items, julianday('now') - julianday(created_at) AS age_days
+                FROM quiz_seen_filter
+                WHERE guild_id=? AND user_id=? AND topic=?
+                """,
+                (int(guild_id), int(user_id), topic_norm),
+            ).fetchone()
+        if row is None:
+            return None
+        return bytes(row["bits"]), int(row["items"] or 0), float(row["age_days"] or 0.0)
+
+    def reset_quiz_seen_filter(self, guild_id: int, user_id: int, topic: str, bits: bytes, items: int) -> None:
+        """
+        Replace the Bloom filter with a freshly built one (restarts its age).
+        """
         topic_norm = (topic or "").strip().lower()
         with self._connect() as con:
             con.execute(
                 """
-                INSERT OR IGNORE INTO quiz_seen (guild_id, user_id, topic, sig, starter3, question)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT OR REPLACE INTO quiz_seen_filter (guild_id, user_id, topic, bits, items, created_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 """,
-                (int(guild_id), int(user_id), topic_norm, sig, starter3 or "", question),
+                (int(guild_id), int(user_id), topic_norm, bits, int(items)),
             )
             con.commit()
 
+    def get_quiz_seen_sigs(self, guild_id: int, user_id: int, topic: str, *, ttl_days: int = 30) -> List[str]:
+        topic_norm = (topic or "").strip().lower()
+        with self._connect() as con:
+            rows = con.execute(
+                """
+                SELECT sig FROM quiz_seen
+                WHERE guild_id=? AND user_id=? AND topic=? AND created_at >= datetime('now', ?)
+                """,
+                (int(guild_id), int(user_id), topic_norm, f"-{int(ttl_days)} days"),
+            ).fetchall()
+        return [r["sig"] for r in rows if r["sig"]]
+
+    def find_quiz_seen_near(
+        self,
+        guild_id: int,
+        user_id: int,
+        topic: str,
+        buckets: List[int],
+        *,
+        ttl_days: int = 30,
+    ) -> List[Tuple[str, Optional[bytes]]]:
+        """
+        (question, minhash) of seen questions sharing at least one LSH bucket.
+        """
+        if not buckets:
+            return []
+        topic_norm = (topic or "").strip().lower()
+        marks = ",".join("?" * len(buckets))
+        with self._connect() as con:
+            rows = con.execute(
+                f"""
+                SELECT DISTINCT s.id, s.question, s.minhash
+                FROM quiz_seen_lsh l
+                JOIN quiz_seen s ON s.id = l.seen_id
+                WHERE l.guild_id=? AND l.user_id=? AND l.topic=?
+                  AND l.bucket IN ({marks})
+                  AND s.created_at >= datetime('now', ?)
+                """,
+                (int(guild_id), int(user_id), topic_norm, *[int(b) for b in buckets], f"-{int(ttl_days)} days"),
+            ).fetchall()
+        return [(r["question"], r["minhash"]) for r in rows]
+
+    def get_quiz_seen_unhashed(self, guild_id: int, user_id: int, topic: str, *, limit: int = 500) -> List[Tuple[int, str]]:
+        """
+        Rows written before MinHash indexing existed (see set_quiz_seen_minhash).
+        """
+        topic_norm = (topic or "").strip().lower()
+        with self._connect() as con:
+            rows = con.execute(
+                """
+                SELECT id, question FROM quiz_seen
+                WHERE guild_id=? AND user_id=? AND topic=? AND minhash IS NULL
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (int(guild_id), int(user_id), topic_norm, int(limit)),
+            ).fetchall()
+        return [(int(r["id"]), r["question"]) for r in rows]
+
+    def set_quiz_seen_minhash(
+        self, seen_id: int, guild_id: int, user_id: int, topic: str, minhash: bytes, buckets: List[int]
+    ) -> None:
+        topic_norm = (topic or "").strip().lower()
+        with self._connect() as con:
+            con.execute("UPDATE quiz_seen SET minhash=? WHERE id=?", (minhash, int(seen_id)))
+            self._insert_lsh(con, int(seen_id), guild_id, user_id, topic_norm, buckets)
+            con.commit()
+
     def get_recent_quiz_seen(
         self,
         guild_id: int,
@@ -866,9 +1110,122 @@ class KeyStore:
     def prune_quiz_seen(self, *, ttl_days: int = 60) -> int:
         with self._connect() as con:
             cur = con.execute("DELETE FROM quiz_seen WHERE created_at < datetime('now', ?)", (f"-{int(ttl_days)} days",))
+            con.execute("DELETE FROM quiz_seen_lsh WHERE seen_id NOT IN (SELECT id FROM quiz_seen)")
             con.commit()
             return int(cur.rowcount or 0)
 
+    def add_quiz_gen_ledger(
+        self,
+        *,
+        guild_id: Optional[int],
+        user_id: Optional[int],
+        model: str,
+        topic: str,
+        requested: int,
+        accepted: int,
+        rounds: int,
+        llm_calls: int,
+        responses: int,
+        wall_ms: int,
+        outcome: str,
+        funnel: Dict[str, int],
+        asked: int = 0,
+        parsed: int = 0,
+        out_chars: int = 0,
+        kind: str = "quiz",
+    ) -> None:
+        """
+        funnel: rejection reason -> count, stored as compact JSON.
+        asked: items requested over all calls; parsed / out_chars: items
+        parsed and the raw output size they came from. kind: the yield
+        estimator kind the run fed ("quiz" or "quiz.lean").
+        """
+        with self._connect() as con:
+            con.execute(
+                """
+                INSERT INTO quiz_gen_ledger
+                    (guild_id, user_id, model, topic, requested, accepted, rounds, llm_calls, responses, wall_ms, outcome, funnel,
+                     asked, parsed, out_chars, kind)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    None if guild_id is None else int(guild_id),
+                    None if user_id is None else int(user_id),
+                    model or "",
+                    (topic or "").strip().lower(),
+                    int(requested),
+                    int(accepted),
+                    int(rounds),
+                    int(llm_calls),
+                    int(responses),
+                    int(wall_ms),
+                    outcome or "",
+                    json.dumps({k: int(v) for k, v in sorted(funnel.items()) if v}, separators=(",", ":")),
+                    int(asked),
+                    int(parsed),
+                    int(out_chars),
+                    kind or "quiz",
+                ),
+            )
+            con.commit()
+
+    def recent_quiz_gen_yields(self, *, days: int = 14, limit: int = 500) -> List[sqlite3.Row]:
+        """
+        Latest finished generations (oldest first) with what was asked and
+        accepted, for the request-size estimator.
+        """
+        with self._connect() as con:
+            rows = con.execute(
+                """
+                SELECT kind, model, topic, asked, accepted, parsed, out_chars, funnel
+                FROM quiz_gen_ledger
+                WHERE created_at >= datetime('now', ?) AND asked > 0 AND outcome IN ('ok', 'short')
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (f"-{int(days)} days", int(limit)),
+            ).fetchall()
+        return rows[::-1]
+
+    def quiz_gen_funnel(self, *, days: int = 30, model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Rejection funnel summed over the ledger: totals plus reasons sorted
+        by count, each with its share of all rejections and per LLM call.
+        """
+        sql = "SELECT model, requested, accepted, rounds, llm_calls, wall_ms, outcome, funnel FROM quiz_gen_ledger WHERE created_at >= datetime('now', ?)"
+        args: List[Any] = [f"-{int(days)} days"]
+        if model:
+            sql += " AND model=?"
+            args.append(model)
+        with self._connect() as con:
+            rows = con.execute(sql, args).fetchall()
+
+        reasons: Dict[str, int] = {}
+        outcomes: Dict[str, int] = {}
+        totals = {"generations": len(rows), "requested": 0, "accepted": 0, "rounds": 0, "llm_calls": 0, "wall_ms": 0}
+        for r in rows:
+            for k in ("requested", "accepted", "rounds", "llm_calls", "wall_ms"):
+                totals[k] += int(r[k] or 0)
+            outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+            try:
+                funnel = json.loads(r["funnel"] or "{}")
+            except ValueError:
+                continue
+            for k, v in funnel.items():
+                reasons[k] = reasons.get(k, 0) + int(v)
+
+        rejected = sum(reasons.values())
+        calls = max(1, totals["llm_calls"])
+        return {
+            **totals,
+            "rejected": rejected,
+            "outcomes": outcomes,
+            "reasons": [
+                {"reason": k, "count": v, "share": round(v / max(1, rejected), 3), "per_call": round(v / calls, 2)}
+                for k, v in sorted(reasons.items(), key=lambda kv: kv[1], reverse=True)
+            ],
+        }
+
     def get_recent_quiz_avoid(
         self,
         guild_id: int,
@@ -0,0 +1,442 @@
+"""
+Local OpenAI-compatible fake LLM server for offline benchmarks and
+regression runs.
+
+Speaks POST /v1/chat/completions and POST /v1/responses (streaming and
+non-streaming) and answers with canned, well-formed output for the
+prompts MentraAI sends (quiz blocks, flashcards JSON, study plan days,
+MentraScan JSON, intent JSON, key points). Latency, error injection,
+malformed outputs and the per-item rejection rate are configurable.
+
+    python -m app.devtools.fake_llm_server --port 8001 --latency 0.3 \\
+        --error-rate 0.05 --malformed-rate 0.1
+
+Then point the bot at it with OPENAI_BASE_URL=http://127.0.0.1:8001/v1.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeLLMConfig:
+    latency_s: float = 0.0          # fixed delay before the first byte
+    jitter_s: float = 0.0           # + uniform(0, jitter_s)
+    token_delay_s: float = 0.0      # delay between streamed chunks
+    error_rate: float = 0.0         # probability of an injected HTTP error
+    error_statuses: Tuple[int, ...] = (429, 500, 503)
+    retry_after_s: float = 1.0      # Retry-After sent with injected 429s
+    malformed_rate: float = 0.0     # probability of a canned malformed output
+    reject_rate: float = 0.0        # per item: duplicate / invalid quiz blocks and cards, skipped plan days
+    seed: Optional[int] = None
+    stats: Dict[str, int] = field(default_factory=lambda: {"requests": 0, "errors": 0, "malformed": 0})
+
+
+# -----------------------------
+# Canned content
+# -----------------------------
+_SUBJECTS = [
+    "SMB", "Kerberos", "LDAP", "SQL injection", "XSS", "SSRF", "JWT", "NTLM relay",
+    "DNS zone transfer", "SNMP", "NFS exports", "sudo misconfig", "SUID binaries",
+    "cron jobs", "PowerShell logging", "AS-REP roasting", "Kerberoasting", "IDOR",
+    "CSRF", "file upload", "LFI", "command injection", "XXE", "deserialization",
+    "RDP", "WinRM", "SSH keys", "password spraying", "pass-the-hash", "DCSync",
+]
+
+_QUIZ_TEMPLATES = [
+    "During {s} testing, which first step is most useful?",
+    "For {s} findings, what evidence best proves impact?",
+    "Against {s} exposure, which remediation is most effective?",
+    "When triaging {s}, which signal matters most?",
+    "Regarding {s}, which tool output confirms the issue?",
+]
+
+_CHOICES = [
+    ("Enumerate exposed services", "Reboot the target host", "Disable all logging", "Skip to exploitation"),
+    ("Capture a working proof", "Guess from the banner", "Trust the scanner score", "Assume default creds"),
+    ("Apply least privilege", "Rename the service", "Hide the port number", "Ignore until audit"),
+    ("Validate with a safe request", "Run a full DoS test", "Delete the audit trail", "Change user passwords"),
+]
+
+
+def _n_from(prompt: str, pattern: str, default: int) -> int:
+    m = re.search(pattern, prompt, re.IGNORECASE)
+    try:
+        return max(1, int(m.group(1))) if m else default
+    except ValueError:
+        return default
+
+
+class _Canned:
+    def __init__(self, rng: random.Random, reject_rate: float = 0.0):
+        self.rng = rng
+        self.reject_rate = max(0.0, min(1.0, float(reject_rate)))
+        self.counter = 0
+        self._quiz_seen: List[str] = []
+        self._card_seen: List[Dict[str, str]] = []
+
+    def _reject(self) -> bool:
+        return self.reject_rate > 0 and self.rng.random() < self.reject_rate
+
+    def _tick(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    def quiz(self, prompt: str) -> str:
+        n = _n_from(prompt, r"EXACTLY\s+(\d+)\s+question", 1)
+        blocks = []
+        for _ in range(n):
+            if self._reject():
+                if self._quiz_seen and self.rng.random() < 0.5:
+                    blocks.append(self.rng.choice(self._quiz_seen))      # repeat -> dedupe reject
+                else:
+                    blocks.append(re.sub(r"(?m)^ANSWER:.*\n", "", self._quiz_block()))  # invalid
+                continue
+            block = self._quiz_block()
+            self._quiz_seen.append(block)
+            blocks.append(block)
+        return "\n".join(blocks)
+
+    @staticmethod
+    def quiz_json(blocks: str) -> str:
+        """
+        Same questions in the structured-output shape ({"questions": [...]}).
+        """
+        out = []
+        for block in blocks.split("---"):
+            q = re.search(r"(?m)^Q: (.*)$", block)
+            if not q:
+                continue
+            ans = re.search(r"(?m)^ANSWER: ([A-D])", block)
+            exp = re.search(r"(?m)^EXPLAIN: (.*)$", block)
+            out.append(
+                {
+                    "question": q.group(1),
+                    "choices": re.findall(r"(?m)^[A-D]\) (.*)$", block),
+                    "answer": ans.group(1) if ans else "",
+                    "explanation": exp.group(1) if exp else "",
+                }
+            )
+        return json.dumps({"questions": out})
+
+    def _quiz_block(self) -> str:
+        i = self._tick()
+        subj = _SUBJECTS[i % len(_SUBJECTS)]
+        tpl = _QUIZ_TEMPLATES[(i // len(_SUBJECTS)) % len(_QUIZ_TEMPLATES)]
+        choices = list(_CHOICES[i % len(_CHOICES)])
+        correct = choices[0]
+        self.rng.shuffle(choices)
+        letter = "ABCD"[choices.index(correct)]
+        return (
+            f"Q: {tpl.format(s=subj)}\n"
+            f"A) {choices[0]}\nB) {choices[1]}\nC) {choices[2]}\nD) {choices[3]}\n"
+            f"ANSWER: {letter}\n"
+            f"EXPLAIN: {correct} is the sound approach for {subj}.\n"
+            "---"
+        )
+
+    def flashcards(self, prompt: str) -> str:
+        n = _n_from(prompt, r"EXACTLY\s+(\d+)\s+(?:cybersecurity\s+)?flashcards", 5)
+        cards = []
+        for _ in range(n):
+            if self._reject():
+                if self._card_seen:
+                    cards.append(dict(self.rng.choice(self._card_seen)))  # repeat -> dedupe reject
+                else:
+                    cards.append({"q": "", "a": ""})                     # empty -> dropped
+                continue
+            i = self._tick()
+            subj = _SUBJECTS[i % len(_SUBJECTS)]
+            card = {
+                "q": f"Card {i}: what is the key risk of {subj}?",
+                "a": f"{subj} can expose credentials or code paths; verify it with a safe proof.",
+            }
+            self._card_seen.append(card)
+            cards.append(card)
+        return json.dumps({"cards": cards})
+
+    def plan(self, prompt: str) -> str:
+        m = re.search(r"missing days:\s*([\d,\s]+)", prompt, re.IGNORECASE)
+        if m:
+            days = [int(x) for x in re.findall(r"\d+", m.group(1))]
+        else:
+            m = re.search(r"Day\s+(\d+)\s+to\s+Day\s+(\d+)", prompt)
+            start, end = (int(m.group(1)), int(m.group(2))) if m else (1, 7)
+            days = list(range(start, end + 1))
+        out = []
+        for d in days:
+            if self._reject():
+                continue  # skipped day -> "missing days" retry
+            subj = _SUBJECTS[d % len(_SUBJECTS)]
+            out.append(
+                f"Day {d}:\n"
+                f"Goal: Practice {subj} end to end.\n"
+                f"- Set up a lab target for {subj}\n"
+                f"- Enumerate and note findings\n"
+                f"- Write a 5-line summary\n"
+                f"Mini exercise: exploit one {subj} weakness safely.\n"
+            )
+        return "\n".join(out)
+
+    def mentrascan(self, prompt: str) -> str:
+        n = _n_from(prompt, r"(\d+)\s+days", 7)
+        days = []
+        for d in range(1, n + 1):
+            subj = _SUBJECTS[d % len(_SUBJECTS)]
+            days.append(
+                {
+                    "day": d,
+                    "timebox": "60 min",
+                    "goal": f"Build a small {subj} exercise.",
+                    "tasks": [f"Implement a {subj} example", "Write 5 bullet notes"],
+                    "quiz": [f"What is {subj}?", "How do you test it?", "How do you fix it?"],
+                }
+            )
+        return json.dumps({"title": "Study plan", "days": days})
+
+    def intent(self, prompt: str) -> str:
+        m = re.search(r'MESSAGE:\s*(.+)', prompt)
+        return json.dumps({"intent": "ask", "topic": None, "question": (m.group(1).strip() if m else "help"), "plan_request": None})
+
+    def key_points(self, prompt: str) -> str:
+        return "\n".join(f"- Key point {i}: {_SUBJECTS[i]} basics" for i in range(1, 10))
+
+    def explain(self, prompt: str) -> str:
+        nums = re.findall(r"(?m)^(\d+)\. ", prompt)
+        return "\n".join(f"{n}: It is the step that gives verifiable evidence first." for n in nums)
+
+    def answer(self, prompt: str) -> str:
+        return (
+            "Short answer: start with enumeration, confirm with a safe proof, then fix.\n\n"
+            "- Identify the exposed surface\n- Validate impact\n- Recommend remediation"
+        )
+
+    def malformed(self, kind: str, good: str) -> str:
+        choice = self.rng.randrange(3)
+        if kind == "quiz":
+            if choice == 0:
+                return re.sub(r"(?m)^ANSWER:.*\n", "", good)             # missing answer
+            if choice == 1:
+                return re.sub(r"(?m)^D\) .*\n", "", good)                # 3 choices
+            return good.replace("\n---", " ---")                         # inline separators
+        if kind in ("flashcards", "mentrascan", "intent"):
+            if choice == 0:
+                return "```json\n" + good[:-1] + ",}\n```"               # fenced + trailing comma
+            if choice == 1:
+                return "Here is your JSON:\n" + good[: max(10, len(good) // 2)]  # truncated
+            return good.replace('"', "'")                                # python-style quotes
+        return good[: max(10, len(good) // 2)]
+
+    def respond(self, system: str, prompt: str, malformed: bool) -> Tuple[str, str]:
+        s = (system or "").lower()
+        p = prompt or ""
+        if "multiple-choice" in s:
+            kind, text = "quiz", self.quiz(p)
+            if "explain" not in s and '"explanation"' not in s:
+                # QUIZ_LAZY_EXPLAIN format
+                text = re.sub(r"(?m)^EXPLAIN:.*\n", "", text)
+            if '"questions"' in s:
+                text = self.quiz_json(text)
+        elif "explain cybersecurity quiz answers" in s:
+            kind, text = "explain", self.explain(p)
+        elif "flashcards" in p.lower() and '"cards"' in p:
+            kind, text = "flashcards", self.flashcards(p)
+        elif s.startswith("you are mentrascan"):
+            kind, text = "mentrascan", self.mentrascan(p)
+        elif '"intent"' in p:
+            kind, text = "intent", self.intent(p)
+        elif "key study points" in p.lower():
+            kind, text = "key_points", self.key_points(p)
+        elif re.search(r"Day\s+\d+", p) or "missing days" in p.lower():
+            kind, text = "plan", self.plan(p)
+        else:
+            kind, text = "answer", self.answer(p)
+
+        if malformed or (kind == "mentrascan" and self._reject()):
+            text = self.malformed(kind, text)
+        return kind, text
+
+
+# -----------------------------
+# App
+# -----------------------------
+def _split_messages(body: Dict[str, Any]) -> Tuple[str, str]:
+    msgs = body.get("messages") or body.get("input") or []
+    system, user = "", ""
+    if isinstance(msgs, str):
+        return "", msgs
+    for m in msgs:
+        if not isinstance(m, dict):
+            continue
+        content = m.get("content")
+        if isinstance(content, list):
+            content = " ".join(str(p.get("text", "")) for p in content if isinstance(p, dict))
+        if m.get("role") == "system":
+            system += str(content or "")
+        elif m.get("role") == "user":
+            user += str(content or "")
+    return system, user
+
+
+def _usage(prompt: str, text: str, responses: bool) -> Dict[str, int]:
+    p = max(1, len(prompt) // 4)
+    c = max(1, len(text) // 4)
+    if responses:
+        return {"input_tokens": p, "output_tokens": c, "total_tokens": p + c}
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+
+
+def _chunks(text: str, size: int = 24) -> List[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+
+def create_app(config: Optional[FakeLLMConfig] = None) -> FastAPI:
+    cfg = config or FakeLLMConfig()
+    rng = random.Random(cfg.seed)
+    canned = _Canned(rng, cfg.reject_rate)
+    app = FastAPI(title="MentraAI fake LLM")
+    app.state.config = cfg
+
+    async def _delay() -> None:
+        d = cfg.latency_s + (rng.uniform(0, cfg.jitter_s) if cfg.jitter_s > 0 else 0.0)
+        if d > 0:
+            await asyncio.sleep(d)
+
+    def _maybe_error() -> Optional[JSONResponse]:
+        if cfg.error_rate > 0 and rng.random() < cfg.error_rate:
+            cfg.stats["errors"] += 1
+            status = rng.choice(cfg.error_statuses)
+            headers = {"Retry-After": str(cfg.retry_after_s)} if status == 429 else {}
+            return JSONResponse({"error": {"message": f"injected {status}"}}, status_code=status, headers=headers)
+        return None
+
+    def _generate(body: Dict[str, Any]) -> Tuple[str, str]:
+        system, user = _split_messages(body)
+        malformed = cfg.malformed_rate > 0 and rng.random() < cfg.malformed_rate
+        if malformed:
+            cfg.stats["malformed"] += 1
+        _kind, text = canned.respond(system, user, malformed)
+        return user, text
+
+    async def _sse(events: List[Dict[str, Any]]) -> AsyncIterator[bytes]:
+        for ev in events:
+            yield f"data: {json.dumps(ev)}\n\n".encode("utf-8")
+            if cfg.token_delay_s > 0:
+                await asyncio.sleep(cfg.token_delay_s)
+        yield b"data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        cfg.stats["requests"] += 1
+        body = await request.json()
+        await _delay()
+        err = _maybe_error()
+        if err is not None:
+            return err
+
+        prompt, text = _generate(body)
+        model = body.get("model", "fake")
+        created = int(time.time())
+
+        if body.get("stream"):
+            events: List[Dict[str, Any]] = [
+                {"object": "chat.completion.chunk", "model": model, "created": created,
+                 "choices": [{"index": 0, "delta": {"content": part}}]}
+                for part in _chunks(text)
+            ]
+            events.append(
+                {"object": "chat.completion.chunk", "model": model, "created": created,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                 "usage": _usage(prompt, text, False)}
+            )
+            return StreamingResponse(_sse(events), media_type="text/event-stream")
+
+        # `n` samples per request, like OpenAI
+        texts = [text] + [_generate(body)[1] for _ in range(max(1, int(body.get("n") or 1)) - 1)]
+        return JSONResponse(
+            {
+                "object": "chat.completion",
+                "model": model,
+                "created": created,
+                "choices": [
+                    {"index": i, "message": {"role": "assistant", "content": t}, "finish_reason": "stop"}
+                    for i, t in enumerate(texts)
+                ],
+                "usage": _usage(prompt, "".join(texts), False),
+            }
+        )
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        cfg.stats["requests"] += 1
+        body = await request.json()
+        await _delay()
+        err = _maybe_error()
+        if err is not None:
+            return err
+
+        prompt, text = _generate(body)
+        usage = _usage(prompt, text, True)
+
+        if body.get("stream"):
+            events = [{"type": "response.output_text.delta", "delta": part} for part in _chunks(text)]
+            events.append({"type": "response.completed", "response": {"usage": usage}})
+            return StreamingResponse(_sse(events), media_type="text/event-stream")
+
+        return JSONResponse(
+            {
+                "object": "response",
+                "output_text": text,
+                "output": [{"type": "message", "content": [{"type": "output_text", "text": text}]}],
+                "usage": usage,
+            }
+        )
+
+    @app.get("/stats")
+    async def stats():
+        return cfg.stats
+
+    return app
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="OpenAI-compatible fake LLM server for MentraAI")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds before first byte")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra uniform latency (seconds)")
+    ap.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-statuses", default="429,500,503")
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--reject-rate", type=float, default=0.0, help="per item: duplicate/invalid questions and cards, skipped plan days")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    import uvicorn
+
+    cfg = FakeLLMConfig(
+        latency_s=args.latency,
+        jitter_s=args.jitter,
+        token_delay_s=args.token_delay,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(x) for x in args.error_statuses.split(",") if x.strip()),
+        malformed_rate=args.malformed_rate,
+        reject_rate=args.reject_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
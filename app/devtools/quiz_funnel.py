@@ -0,0 +1,44 @@
+"""
+Quiz generation rejection funnel from the quiz_gen_ledger table: which
+validation checks drop the most candidates, and how many LLM calls the
+generations cost.
+
+    python -m app.devtools.quiz_funnel --days 7
+    python -m app.devtools.quiz_funnel --model llama-3.1-8b-instant --json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+
+from app.db import KeyStore
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Summarise the quiz generation ledger")
+    ap.add_argument("--db", default=os.getenv("DB_PATH", "./data/studybot.sqlite3"))
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--model", default="", help="only generations with this model")
+    ap.add_argument("--json", action="store_true", help="print the raw summary as JSON")
+    args = ap.parse_args()
+
+    summary = KeyStore(args.db).quiz_gen_funnel(days=args.days, model=args.model or None)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    gens = max(1, summary["generations"])
+    print(
+        f"{summary['generations']} generation(s) | accepted {summary['accepted']}/{summary['requested']} | "
+        f"{summary['llm_calls'] / gens:.1f} calls and {summary['rounds'] / gens:.1f} rounds each | "
+        f"{summary['wall_ms'] / gens / 1000:.1f}s avg"
+    )
+    print("outcomes: " + (", ".join(f"{k}={v}" for k, v in sorted(summary["outcomes"].items())) or "-"))
+    print(f"{'reason':<28}{'count':>8}{'share':>8}{'/call':>8}")
+    for r in summary["reasons"]:
+        print(f"{r['reason']:<28}{r['count']:>8}{r['share']:>8.1%}{r['per_call']:>8}")
+
+
+if __name__ == "__main__":
+    main()
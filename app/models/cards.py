@@ -1,6 +1,8 @@
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class Flashcard:
     q: str
     a: str
+    id: Optional[int] = None  # deck card id (FlashcardDecks), None if not stored
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import hashlib
+import math
+from typing import Iterable, Optional
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings, serialisable to a compact blob.
+    No false negatives; false positives at about `fp_rate` while holding
+    up to `capacity` items (the rate rises past that, so owners rebuild).
+    """
+
+    HASHES = 7  # optimal for ~1% false positives
+
+    def __init__(self, capacity: int = 2048, fp_rate: float = 0.01, *, data: Optional[bytes] = None, count: int = 0):
+        if data:
+            self.bits = bytearray(data)
+        else:
+            m = math.ceil(-max(1, int(capacity)) * math.log(fp_rate) / (math.log(2) ** 2))
+            self.bits = bytearray((m + 7) // 8)
+        self.m = len(self.bits) * 8
+        self.count = int(count)
+
+    @property
+    def capacity(self) -> int:
+        """
+        Items this size holds at ~1% false positives.
+        """
+        return int(self.m * (math.log(2) ** 2) / -math.log(0.01))
+
+    def _positions(self, item: str) -> Iterable[int]:
+        d = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        return ((h1 + i * h2) % self.m for i in range(self.HASHES))
+
+    def add(self, item: str) -> bool:
+        """
+        Add an item; False if it was (probably) already present.
+        """
+        new = False
+        for p in self._positions(item):
+            byte, bit = divmod(p, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item: object) -> bool:
+        if not isinstance(item, str):
+            return False
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
@@ -1,12 +1,22 @@
 """
 This file intentionally keeps rules conservative to avoid false positives.
+
+Rules are registered on RULES with the terms they look for. All term lists
+are compiled into one regex, so a candidate is normalised and scanned once
+no matter how many rules there are, and a whole parsed batch is scanned
+in a single pass (rule_check_batch).
 """
 
 from __future__ import annotations
 
+import bisect
 import re
+import threading
+import time
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.llm_metrics import render_gauges
 
 
 # -----------------------------
@@ -16,6 +26,7 @@ from typing import List, Optional
 class RuleResult:
     ok: bool
     reason: str = ""
+    rule: str = ""  # short id of the failing rule (generation funnel key)
 
 
 # -----------------------------
@@ -25,51 +36,298 @@ def _norm(s: str) -> str:
     return re.sub(r"\s+", " ", (s or "").strip()).lower()
 
 
-def _has_any(text: str, terms: List[str]) -> bool:
-    t = _norm(text)
-    return any(term in t for term in terms)
+class RuleContext:
+    """
+    One candidate, normalised once, with the registered terms found in
+    each field. Rules ask has()/choice_has() instead of scanning text.
+    """
+
+    __slots__ = ("question", "choices", "answer_index", "explanation", "fields", "found", "known")
+
+    def __init__(self, question: str, choices: List[str], answer_index: int, explanation: str):
+        self.question = question or ""
+        self.choices = choices
+        self.answer_index = answer_index
+        self.explanation = explanation or ""
+        # q, expl, choice 0..n-1
+        self.fields: List[str] = [_norm(self.question), _norm(self.explanation)] + [_norm(c) for c in choices]
+        self.found: List[FrozenSet[str]] = []
+        self.known: FrozenSet[str] = frozenset()  # terms the matcher looked for
 
+    def _has(self, field: int, terms: Iterable[str]) -> bool:
+        found = self.found[field]
+        text = self.fields[field]
+        # terms a rule didn't register fall back to a plain substring test
+        return any(t in found or (t not in self.known and t in text) for t in terms)
 
-def _choice_text(choices: List[str], idx: int) -> str:
-    if not choices or idx < 0 or idx >= len(choices):
-        return ""
-    return choices[idx] or ""
+    def has(self, field: str, *terms: str) -> bool:
+        """
+        field: "q" or "expl".
+        """
+        return self._has(0 if field == "q" else 1, terms)
 
+    def choice_has(self, idx: int, *terms: str) -> bool:
+        if idx < 0 or idx >= len(self.choices):
+            return False
+        return self._has(2 + idx, terms)
 
-def _choice_has(choices: List[str], idx: int, terms: List[str]) -> bool:
-    return _has_any(_choice_text(choices, idx), terms)
+    def find_choice(self, *terms: str) -> Optional[int]:
+        for i in range(len(self.choices)):
+            if self.choice_has(i, *terms):
+                return i
+        return None
 
+    @property
+    def answer(self) -> str:
+        return self.fields[2 + self.answer_index]
 
-def _find_choice_idx(choices: List[str], terms: List[str]) -> Optional[int]:
-    for i, c in enumerate(choices or []):
-        if _has_any(c, terms):
-            return i
-    return None
 
+RuleFn = Callable[[RuleContext], Optional[RuleResult]]
 
+# where a term rule looks: field index test given (field, ctx)
+_FIELDS: Dict[str, Callable[[int, RuleContext], bool]] = {
+    "q": lambda f, ctx: f == 0,
+    "expl": lambda f, ctx: f == 1,
+    "choices": lambda f, ctx: f >= 2,
+    "answer": lambda f, ctx: f == 2 + ctx.answer_index,
+}
 
-def _rule_block_misconception_questions(q: str, choices: List[str], ai: int, expl: str) -> Optional[RuleResult]:
+
+class _Rule:
+    __slots__ = ("name", "fn", "field", "reason", "calls", "hits", "ns")
+
+    def __init__(self, name: str, fn: Optional[RuleFn] = None, *, field: str = "", reason: str = ""):
+        self.name = name
+        self.fn = fn
+        self.field = field
+        self.reason = reason
+        self.calls = 0
+        self.hits = 0
+        self.ns = 0
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
     """
-    Misconception/myth questions are a major source of ambiguity.
-    For reliability, we block them deterministically.
+    Regex matching any of `terms`, factored as a prefix trie so each text
+    position costs a few character tests instead of one per term; greedy,
+    so the longest term starting at a position wins.
     """
-    qn = _norm(q)
-    if "common misconception" in qn or "misconception" in qn or "myth" in qn:
-        return RuleResult(False, "Misconception-style questions are often ambiguous; blocked for reliability.")
-    return None
+    trie: Dict[str, dict] = {}
+    for t in terms:
+        node = trie
+        for ch in t:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        alts = [re.escape(ch) + build(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class RuleEngine:
+    """
+    Registry of exam rules plus one compiled matcher for all their terms.
+
+    Two kinds of rules, run in registration order (first failure wins):
+    - term rules (banned()): a term list, the field it must not appear in
+      and a reason. Resolved straight from the scan, no Python per rule.
+    - function rules (@rule): fn(ctx) for logic beyond a term list; terms
+      they pass to ctx.has()/choice_has() are matched by the same scan.
+
+    The matcher is a trie regex of every registered term in a lookahead,
+    so each text position reports the longest term starting there; the
+    terms contained in it come from a table built at compile time. That
+    is the same answer as testing `term in text` for every term, from one
+    pass over a whole batch.
+
+    Per-rule hit counts and time are kept for stats() and the metrics
+    endpoint (rules are pure CPU, so wall time is CPU time; term rules
+    share the "_scan" line).
+    """
+
+    def __init__(self):
+        self._rules: List[_Rule] = []
+        self.terms: FrozenSet[str] = frozenset()
+        self._regex: Optional[re.Pattern] = None
+        self._contained: Dict[str, FrozenSet[str]] = {}
+        self._term_rules: Dict[str, Tuple[int, ...]] = {}
+        self._lock = threading.Lock()
+        self.candidates = 0
+        self.scan_ns = 0
+
+    # -----------------------------
+    # Registration
+    # -----------------------------
+    def rule(self, name: Optional[str] = None, *, terms: Iterable[str] = ()) -> Callable[[RuleFn], RuleFn]:
+        """
+        Decorator: register fn(ctx) -> RuleResult | None, with the terms
+        it looks up via ctx.has()/choice_has().
+        """
 
+        def deco(fn: RuleFn) -> RuleFn:
+            self._add(_Rule(name or fn.__name__.removeprefix("_rule_"), fn), terms)
+            return fn
 
+        return deco
+
+    def banned(self, name: str, *, terms: Iterable[str], field: str = "q", reason: str) -> None:
+        """
+        Reject candidates whose `field` ("q", "expl", "choices" = any
+        choice, "answer" = the correct one) contains any of `terms`.
+        """
+        if field not in _FIELDS:
+            raise ValueError(f"unknown rule field: {field}")
+        self._add(_Rule(name, field=field, reason=reason), terms)
+
+    def _add(self, rule: _Rule, terms: Iterable[str]) -> None:
+        norm = {_norm(t) for t in terms if t.strip()}
+        with self._lock:
+            self._rules.append(rule)
+            if rule.fn is None:
+                idx = len(self._rules) - 1
+                for t in norm:
+                    self._term_rules[t] = self._term_rules.get(t, ()) + (idx,)
+            self._compile(self.terms | norm)
+
+    def _compile(self, terms: FrozenSet[str]) -> None:
+        self.terms = frozenset(terms)
+        if not terms:
+            self._regex = None
+            self._contained = {}
+            return
+        self._regex = re.compile("(?=(" + _trie_pattern(terms) + "))")
+        self._contained = {t: frozenset(u for u in terms if u in t) for t in terms}
+
+    # -----------------------------
+    # Matching
+    # -----------------------------
+    def _scan(self, texts: Sequence[str]) -> List[FrozenSet[str]]:
+        """
+        Registered terms found in each text, from one pass over all of them.
+        """
+        if self._regex is None or not texts:
+            return [frozenset()] * len(texts)
+        t0 = time.perf_counter_ns()
+        starts: List[int] = []
+        pos = 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t) + 1
+        found: List[set] = [set() for _ in texts]
+        # "\0" never occurs in a term, so no match crosses two texts
+        for m in self._regex.finditer("\0".join(texts)):
+            found[bisect.bisect_right(starts, m.start()) - 1].update(self._contained[m.group(1)])
+        self.scan_ns += time.perf_counter_ns() - t0
+        return [frozenset(f) for f in found]
+
+    # -----------------------------
+    # Evaluation
+    # -----------------------------
+    def _evaluate(self, ctx: RuleContext) -> RuleResult:
+        # earliest term rule the scan triggered (len(rules) = none)
+        first = len(self._rules)
+        for f, found in enumerate(ctx.found):
+            for term in found:
+                for ri in self._term_rules.get(term, ()):
+                    if ri < first and _FIELDS[self._rules[ri].field](f, ctx):
+                        first = ri
+
+        for r in self._rules[:first]:
+            if r.fn is None:
+                continue
+            t0 = time.perf_counter_ns()
+            res = r.fn(ctx)
+            r.ns += time.perf_counter_ns() - t0
+            r.calls += 1
+            if res is not None and res.ok is False:
+                r.hits += 1
+                return res if res.rule else RuleResult(False, res.reason, r.name)
+
+        if first < len(self._rules):
+            r = self._rules[first]
+            r.hits += 1
+            return RuleResult(False, r.reason, r.name)
+        return RuleResult(True, "")
+
+    def check_batch(self, items: Sequence[Tuple[str, List[str], int, str]]) -> List[RuleResult]:
+        """
+        Results for (question, choices, answer_index, explanation) items,
+        in order; all texts are scanned in one pass.
+        """
+        results: List[Optional[RuleResult]] = [None] * len(items)
+        ctxs: List[Tuple[int, RuleContext]] = []
+        for i, (q, choices, ai, expl) in enumerate(items):
+            if not isinstance(choices, list) or len(choices) not in (3, 4):
+                results[i] = RuleResult(False, "Invalid structure for rule_check (choices length).", "structure")
+            elif not isinstance(ai, int) or not (0 <= ai < len(choices)):
+                results[i] = RuleResult(False, "Invalid structure for rule_check (answer_index range).", "structure")
+            else:
+                ctxs.append((i, RuleContext(q, choices, ai, expl)))
+
+        found = iter(self._scan([f for _, ctx in ctxs for f in ctx.fields]))
+        for i, ctx in ctxs:
+            ctx.found = [next(found) for _ in ctx.fields]
+            ctx.known = self.terms
+            results[i] = self._evaluate(ctx)
+        self.candidates += len(items)
+        return results  # type: ignore[return-value]
+
+    # -----------------------------
+    # Observability
+    # -----------------------------
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        rule -> {calls, hits, ms}; "_scan" is the shared term matcher
+        (which is also all the time term rules take).
+        """
+        out = {
+            r.name: {"calls": r.calls if r.fn else self.candidates, "hits": r.hits, "ms": round(r.ns / 1e6, 3)}
+            for r in self._rules
+        }
+        out["_scan"] = {"calls": self.candidates, "hits": 0, "ms": round(self.scan_ns / 1e6, 3)}
+        return out
+
+    def metrics_text(self) -> str:
+        stats = self.stats()
+        gauges = [
+            (
+                "mentra_exam_rule_hits",
+                "Candidates rejected per exam rule since start.",
+                [({"rule": k}, v["hits"]) for k, v in stats.items() if k != "_scan"],
+            ),
+            (
+                "mentra_exam_rule_seconds",
+                "Time spent per exam rule since start (_scan = term matcher).",
+                [({"rule": k}, v["ms"] / 1000.0) for k, v in stats.items()],
+            ),
+        ]
+        return "\n".join(render_gauges(gauges)) + "\n"
+
+
+RULES = RuleEngine()
 
 
 # -----------------------------
-# Public entry point
+# Rules
 # -----------------------------
-_RULES = [
-    # Anti-LLM core failures
-    _rule_block_misconception_questions,
-]
+# Misconception/myth questions are a major source of ambiguity.
+# For reliability, we block them deterministically.
+RULES.banned(
+    "block_misconception_questions",
+    terms=("misconception", "myth"),
+    field="q",
+    reason="Misconception-style questions are often ambiguous; blocked for reliability.",
+)
 
 
+# -----------------------------
+# Public entry points
+# -----------------------------
 def rule_check(
     question: str,
     choices: List[str],
@@ -79,19 +337,11 @@ def rule_check(
     """
     Run deterministic exam rules. Returns ok=False if a strong-signal mismatch is found.
     """
-    q = question or ""
-    expl = explanation or ""
+    return RULES.check_batch([(question, choices, answer_index, explanation)])[0]
 
-    if not isinstance(choices, list) or len(choices) not in (3, 4):
-        return RuleResult(False, "Invalid structure for rule_check (choices length).")
-
-    if not isinstance(answer_index, int) or not (0 <= answer_index < len(choices)):
-        return RuleResult(False, "Invalid structure for rule_check (answer_index range).")
-
-    for fn in _RULES:
-        res = fn(q, choices, answer_index, expl)
-        if res is not None and res.ok is False:
-            return res
-
-    return RuleResult(True, "")
 
+def rule_check_batch(items: Sequence[Tuple[str, List[str], int, str]]) -> List[RuleResult]:
+    """
+    rule_check() for many candidates (e.g. one parsed LLM response) at once.
+    """
+    return RULES.check_batch(items)
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models.cards import Flashcard
+from app.services.flashcards_gen import generate_flashcards
+from app.services.gen_yield import model_of
+from app.services.llm_deadline import Deadline
+from app.services.llm_metrics import render_gauges
+from app.services.llm_scheduler import LLMBusy
+from app.services.quiz_gen import _normalize_topic, _q_only_signature
+
+log = logging.getLogger("MentraAI")
+
+# SM-2 grades the flashcards view records
+GRADE_FORGOT = 1
+GRADE_KNEW = 4
+
+# a forgotten card comes back in the next session rather than tomorrow
+RELEARN_DAYS = 10 / 1440
+MIN_EASE = 1.3
+START_EASE = 2.5
+
+
+def sm2(ease: float, interval_days: float, reps: int, quality: int) -> Tuple[float, float, int]:
+    """
+    One SM-2 step: (ease, interval_days, reps) after a review graded
+    0 (blackout) .. 5 (perfect).
+    """
+    q = max(0, min(5, int(quality)))
+    if q < 3:
+        reps = 0
+        interval_days = RELEARN_DAYS
+    else:
+        reps += 1
+        if reps == 1:
+            interval_days = 1.0
+        elif reps == 2:
+            interval_days = 6.0
+        else:
+            interval_days = round(max(1.0, interval_days) * ease)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+    return ease, float(interval_days), reps
+
+
+class FlashcardDecks:
+    """
+    Persistent flashcard decks (SQLite tables `flashcard_decks` and
+    `flashcard_cards`), content-addressed by normalised topic and model
+    and shared by every user, plus per-user SM-2 review state
+    (`flashcard_reviews`, indexed on user/deck/due time).
+
+    A session is the user's due reviews first, then deck cards they
+    haven't studied yet; the LLM is only asked for what the deck can't
+    cover, and those cards join the deck for the next user. Cards older
+    than max_age_days are no longer handed out as new (the deck
+    refreshes) but stay scheduled for users already reviewing them.
+    """
+
+    def __init__(self, db_path: str, *, max_age_days: float = 30.0):
+        self.db_path = db_path
+        self.max_age_s = float(max_age_days) * 86400
+
+        self.sessions = 0
+        self.served_due = 0
+        self.served_new = 0
+        self.generated = 0
+        self.llm_sessions = 0
+        self.reviews = 0
+        self.evicted = 0
+
+        self._init_db()
+
+    # -------------------------
+    # SQLite
+    # -------------------------
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS flashcard_decks (
+                    deck TEXT PRIMARY KEY,
+                    topic TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS flashcard_cards (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    deck TEXT NOT NULL,
+                    qsig TEXT NOT NULL,
+                    q TEXT NOT NULL,
+                    a TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_flashcard_cards_qsig ON flashcard_cards(deck, qsig)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_flashcard_cards_created ON flashcard_cards(deck, created_at)")
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS flashcard_reviews (
+                    user_id INTEGER NOT NULL,
+                    card_id INTEGER NOT NULL,
+                    deck TEXT NOT NULL,
+                    ease REAL NOT NULL,
+                    interval_days REAL NOT NULL,
+                    reps INTEGER NOT NULL DEFAULT 0,
+                    lapses INTEGER NOT NULL DEFAULT 0,
+                    due_at REAL NOT NULL,
+                    reviewed_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, card_id)
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_flashcard_reviews_due ON flashcard_reviews(user_id, deck, due_at)")
+            con.commit()
+
+    @staticmethod
+    def deck_key(topic: str, model: str) -> str:
+        base = _normalize_topic(topic) + "||" + (model or "")
+        return hashlib.sha256(base.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _row_to_card(row: sqlite3.Row) -> Flashcard:
+        return Flashcard(q=row["q"], a=row["a"], id=int(row["id"]))
+
+    # -------------------------
+    # Deck
+    # -------------------------
+    def add(self, topic: str, model: str, cards: Iterable[Flashcard]) -> List[Flashcard]:
+        """
+        Store cards in the topic/model deck and return them with their ids;
+        a card whose question the deck already has maps to the stored one.
+        """
+        cards = [c for c in cards if (c.q or "").strip() and (c.a or "").strip()]
+        if not cards:
+            return []
+        deck = self.deck_key(topic, model)
+        now = time.time()
+        sigs = [_q_only_signature(c.q) for c in cards]
+        with self._connect() as con:
+            con.execute(
+                "INSERT OR IGNORE INTO flashcard_decks (deck, topic, model, created_at) VALUES (?,?,?,?)",
+                (deck, _normalize_topic(topic), model or "", now),
+            )
+            con.executemany(
+                "INSERT OR IGNORE INTO flashcard_cards (deck, qsig, q, a, created_at) VALUES (?,?,?,?,?)",
+                [(deck, s, c.q, c.a, now) for s, c in zip(sigs, cards)],
+            )
+            rows = con.execute(
+                f"SELECT id, qsig, q, a FROM flashcard_cards WHERE deck=? AND qsig IN ({','.join('?' * len(sigs))})",
+                (deck, *sigs),
+            ).fetchall()
+            con.commit()
+        by_sig = {r["qsig"]: self._row_to_card(r) for r in rows}
+        out: List[Flashcard] = []
+        for s in dict.fromkeys(sigs):
+            if s in by_sig:
+                out.append(by_sig[s])
+        return out
+
+    def due(self, user_id: int, topic: str, model: str, n: int, *, now: Optional[float] = None) -> List[Flashcard]:
+        """
+        Up to n of the user's cards in this deck whose review is due, most
+        overdue first.
+        """
+        with self._connect() as con:
+            rows = con.execute(
+                """
+                SELECT c.id, c.q, c.a
+                FROM flashcard_reviews r JOIN flashcard_cards c ON c.id = r.card_id
+                WHERE r.user_id=? AND r.deck=? AND r.due_at <= ?
+                ORDER BY r.due_at ASC
+                LIMIT ?
+                """,
+                (int(user_id), self.deck_key(topic, model), time.time() if now is None else now, max(0, int(n))),
+            ).fetchall()
+        return [self._row_to_card(r) for r in rows]
+
+    def unseen(self, user_id: int, topic: str, model: str, n: int) -> List[Flashcard]:
+        """
+        Up to n fresh deck cards the user has never reviewed, oldest first.
+        """
+        with self._connect() as con:
+            rows = con.execute(
+                """
+                SELECT c.id, c.q, c.a
+                FROM flashcard_cards c
+                WHERE c.deck=? AND c.created_at >= ?
+                  AND NOT EXISTS (SELECT 1 FROM flashcard_reviews r WHERE r.user_id=? AND r.card_id=c.id)
+                ORDER BY c.id ASC
+                LIMIT ?
+                """,
+                (self.deck_key(topic, model), time.time() - self.max_age_s, int(user_id), max(0, int(n))),
+            ).fetchall()
+        return [self._row_to_card(r) for r in rows]
+
+    def questions(self, topic: str, model: str, limit: int = 40) -> List[str]:
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT q FROM flashcard_cards WHERE deck=? ORDER BY id DESC LIMIT ?",
+                (self.deck_key(topic, model), int(limit)),
+            ).fetchall()
+        return [r["q"] for r in rows]
+
+    def evict(self) -> int:
+        """
+        Drop stale cards nobody is reviewing.
+        """
+        with self._connect() as con:
+            cur = con.execute(
+                """
+                DELETE FROM flashcard_cards
+                WHERE created_at < ? AND id NOT IN (SELECT card_id FROM flashcard_reviews)
+                """,
+                (time.time() - self.max_age_s,),
+            )
+            con.commit()
+            n = int(cur.rowcount or 0)
+        self.evicted += n
+        return n
+
+    # -------------------------
+    # Reviews (SM-2)
+    # -------------------------
+    def review(self, user_id: int, card_id: int, quality: int, *, now: Optional[float] = None) -> float:
+        """
+        Record one graded review and schedule the next; returns its due time.
+        """
+        now = time.time() if now is None else now
+        with self._connect() as con:
+            card = con.execute("SELECT deck FROM flashcard_cards WHERE id=?", (int(card_id),)).fetchone()
+            if card is None:
+                return now
+            row = con.execute(
+                "SELECT ease, interval_days, reps, lapses FROM flashcard_reviews WHERE user_id=? AND card_id=?",
+                (int(user_id), int(card_id)),
+            ).fetchone()
+            ease, interval, reps, lapses = (
+                (float(row["ease"]), float(row["interval_days"]), int(row["reps"]), int(row["lapses"]))
+                if row is not None
+                else (START_EASE, 0.0, 0, 0)
+            )
+            ease, interval, new_reps = sm2(ease, interval, reps, quality)
+            if new_reps == 0 and reps > 0:
+                lapses += 1
+            due_at = now + interval * 86400
+            con.execute(
+                """
+                INSERT OR REPLACE INTO flashcard_reviews
+                    (user_id, card_id, deck, ease, interval_days, reps, lapses, due_at, reviewed_at)
+                VALUES (?,?,?,?,?,?,?,?,?)
+                """,
+                (int(user_id), int(card_id), card["deck"], ease, interval, new_reps, lapses, due_at, now),
+            )
+            con.commit()
+        self.reviews += 1
+        return due_at
+
+    def _reviewed(self, user_id: int, card_ids: List[int]) -> set[int]:
+        if not card_ids:
+            return set()
+        with self._connect() as con:
+            rows = con.execute(
+                f"SELECT card_id FROM flashcard_reviews WHERE user_id=? AND card_id IN ({','.join('?' * len(card_ids))})",
+                (int(user_id), *card_ids),
+            ).fetchall()
+        return {int(r["card_id"]) for r in rows}
+
+    # -------------------------
+    # Sessions
+    # -------------------------
+    async def session(
+        self,
+        llm,
+        *,
+        api_key: str,
+        topic: str,
+        n: int,
+        user_id: int,
+        prefetch=None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Flashcard]:
+        """
+        n cards for this user: due reviews, then unseen deck cards, then
+        (only if the deck is short) a Prefetcher deck or fresh generation,
+        stored in the deck. Every returned card has an id for review().
+        If the LLM is busy the deck's own cards are served alone.
+        """
+        model = model_of(llm, api_key)
+        n = max(1, int(n))
+        self.sessions += 1
+
+        out = self.due(user_id, topic, model, n)
+        self.served_due += len(out)
+        if len(out) < n:
+            fresh = self.unseen(user_id, topic, model, n - len(out))
+            self.served_new += len(fresh)
+            out += fresh
+        if len(out) >= n:
+            return out
+
+        need = n - len(out)
+        self.evict()
+        made: List[Flashcard] = prefetch.take_flashcards(user_id, topic, need) if prefetch is not None else []
+        if not made:
+            self.llm_sessions += 1
+            try:
+                made = await generate_flashcards(
+                    llm,
+                    api_key=api_key,
+                    topic=topic,
+                    n=need,
+                    avoid=self.questions(topic, model),
+                    **({"deadline": deadline} if deadline else {}),
+                )
+            except LLMBusy as e:
+                # the deck already covered part of the session: serve that
+                if not out:
+                    raise
+                log.info("Flashcard deck session short (%d/%d): %s", len(out), n, e)
+                return out
+        stored = self.add(topic, model, made)
+        self.generated += len(stored)
+
+        # a generated card can collide with one the user already studies
+        have = {c.id for c in out} | self._reviewed(user_id, [c.id for c in stored])
+        out += [c for c in stored if c.id not in have][:need]
+        return out
+
+    # -------------------------
+    # Observability
+    # -------------------------
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": self.sessions,
+            "llm_sessions": self.llm_sessions,
+            "served_due": self.served_due,
+            "served_new": self.served_new,
+            "generated": self.generated,
+            "reviews": self.reviews,
+            "evicted": self.evicted,
+        }
+
+    def metrics_text(self) -> str:
+        with self._connect() as con:
+            row = con.execute("SELECT COUNT(*) AS c FROM flashcard_cards").fetchone()
+        gauges = [
+            ("mentra_flashcard_deck_cards", "Cards stored across all flashcard decks.", [({}, int(row["c"] if row else 0))]),
+            (
+                "mentra_flashcard_deck_events",
+                "Flashcard deck counters since start (sessions, served_due, reviews, ...).",
+                [({"event": k}, v) for k, v in self.stats().items()],
+            ),
+        ]
+        return "\n".join(render_gauges(gauges)) + "\n"
@@ -1,10 +1,18 @@
-import json
+import asyncio
 import logging
 import re
 from typing import Any, Dict, List, Optional
 
+from config import FLASHCARDS_FANOUT
+
 from app.models.cards import Flashcard
-from app.utils.text import jaccard_sim
+from app.services.gen_yield import YIELD, model_of
+from app.services.json_repair import parse_json_object
+from app.services.llm import LLMClient
+from app.services.llm_deadline import Deadline, DeadlineExceeded, expired
+from app.services.llm_schemas import FLASHCARDS_SCHEMA, fast_json
+from app.services.llm_scheduler import PRIORITY_GENERATION, LLMBusy
+from app.services.similarity import SIMILARITY
 
 log = logging.getLogger("MentraAI")
 
@@ -12,96 +20,34 @@ MAX_Q = 110
 MAX_A = 220
 MAX_N = 10
 
-JACCARD_Q_SIM = 0.88
+# cosine (SimilarityService) at which two card questions are duplicates
+# (calibrated in benchmarks/similarity.py)
+COS_Q_SIM = 0.85
+
+# Sub-angles for concurrent sub-batches, so parallel requests cover
+# different ground instead of returning the same cards
+_ANGLES = (
+    "definitions and core concepts",
+    "tooling and commands",
+    "detection and logging",
+    "exploitation and attack techniques",
+    "mitigation and hardening",
+)
 
 
 # -----------------------------
 # JSON helpers (robust)
 # -----------------------------
-def _strip_fences(text: str) -> str:
-    s = (text or "").strip()
-    if s.startswith("```"):
-        parts = s.split("```")
-        if len(parts) >= 3:
-            s = parts[1].strip()
-            if s.lower().startswith("json"):
-                s = s[4:].strip()
-    return s.strip()
-
-
-def _normalize_quotes(s: str) -> str:
-    return s.replace("“", '"').replace("”", '"').replace("’", "'")
-
-
-def _strip_control_chars(s: str) -> str:
-    return re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f]", "", s)
-
-
-def _remove_trailing_commas(s: str) -> str:
-    return re.sub(r",\s*([}\]])", r"\1", s)
-
-
-def _extract_first_json_object(text: str) -> str:
-    s = _strip_control_chars(_normalize_quotes(_strip_fences(text)))
-    start = s.find("{")
-    if start == -1:
-        raise ValueError("No JSON object found")
-
-    depth = 0
-    in_str = False
-    esc = False
-
-    for i in range(start, len(s)):
-        ch = s[i]
-
-        if in_str:
-            if esc:
-                esc = False
-            elif ch == "\\":
-                esc = True
-            elif ch == '"':
-                in_str = False
-            continue
-
-        if ch == '"':
-            in_str = True
-        elif ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return s[start : i + 1].strip()
-
-    raise ValueError("Unbalanced JSON braces")
-
-
 def _safe_json_loads(text: str) -> Dict[str, Any]:
-    candidate = _remove_trailing_commas(_extract_first_json_object(text))
-    data = json.loads(candidate)
-    if not isinstance(data, dict):
-        raise ValueError("JSON root is not an object")
+    data, mode = parse_json_object(text, list_key="cards")
+    if data is None:
+        raise ValueError(f"No JSON object found ({mode})")
+    if mode == "truncated" and isinstance(data.get("cards"), list) and data["cards"]:
+        # the output was cut off inside the last card
+        data["cards"] = data["cards"][:-1]
     return data
 
 
-async def _retry_fix_json(llm, api_key: str, broken: str, n: int) -> Dict[str, Any]:
-    prompt = (
-        "Fix the following so it becomes VALID JSON ONLY.\n"
-        "- Output ONLY JSON\n"
-        '- Keep structure: {"cards": [{"q":"...","a":"..."}]}\n'
-        f"- EXACTLY {n} cards\n"
-        f"- q max {MAX_Q} chars, a max {MAX_A} chars\n\n"
-        f"BROKEN:\n{broken}"
-    )
-
-    fixed = await llm.ask(
-        api_key=api_key,
-        prompt=prompt,
-        system="You repair JSON. Output ONLY valid JSON.",
-        max_tokens=min(1400, 350 + n * 80),
-    )
-    return _safe_json_loads(fixed)
-
-
 # -----------------------------
 # Cleaning / validation
 # -----------------------------
@@ -137,7 +83,7 @@ def _coerce_cards(data: Dict[str, Any]) -> List[Flashcard]:
 # Dedupe / acceptance
 # -----------------------------
 def _accept_card(card: Flashcard, *, out: List[Flashcard]) -> bool:
-    return not any(jaccard_sim(card.q, prev.q) >= JACCARD_Q_SIM for prev in out)
+    return not out or SIMILARITY.max_similarity(card.q, [prev.q for prev in out]) < COS_Q_SIM
 
 
 # -----------------------------
@@ -150,9 +96,13 @@ async def _generate_batch(
     topic: str,
     n: int,
     avoid: Optional[List[str]] = None,
+    deadline: Optional[Deadline] = None,
+    priority: str = PRIORITY_GENERATION,
+    angle: str = "",
 ) -> List[Flashcard]:
     n = max(1, min(MAX_N, int(n)))
     avoid = avoid or []
+    angle_line = f"\nOnly cards about the {angle} of this topic.\n" if angle else ""
 
     avoid_block = ""
     if avoid:
@@ -161,7 +111,7 @@ async def _generate_batch(
 
     prompt = f"""
 Generate EXACTLY {n} cybersecurity flashcards about: {topic}.
-{avoid_block}
+{angle_line}{avoid_block}
 
 Return ONLY valid JSON in this format:
 {{
@@ -184,14 +134,27 @@ Rules:
         api_key=api_key,
         prompt=prompt,
         system="You are an offensive security study assistant. Return ONLY valid JSON.",
-        max_tokens=min(2200, 450 + n * 90),
+        max_tokens=min(2200, 250 + n * 100),
+        priority=priority,
+        site="flashcards.batch",
+        schema=FLASHCARDS_SCHEMA,
+        deadline=deadline,
     )
 
-    try:
-        data = _safe_json_loads(raw)
-    except Exception as e:
-        log.warning("Flashcards JSON parse failed: %s", e)
-        data = await _retry_fix_json(llm, api_key, raw, n)
+    if LLMClient.is_error_text(raw):
+        # an error string is not broken JSON: don't ask the model to repair it
+        log.warning("Flashcards batch failed: %s", (raw or "")[:200])
+        return []
+
+    # structured output parses as-is; the local repair parser is the
+    # fallback (truncated / single-quoted / fenced output)
+    data = fast_json(raw)
+    if data is None:
+        try:
+            data = _safe_json_loads(raw)
+        except ValueError as e:
+            log.warning("Flashcards JSON parse failed: %s", e)
+            return []
 
     return _coerce_cards(data)
 
@@ -205,42 +168,112 @@ async def generate_flashcards(
     api_key: str,
     topic: str,
     n: int,
+    deadline: Optional[Deadline] = None,
+    priority: str = PRIORITY_GENERATION,
+    avoid: Optional[List[str]] = None,
 ) -> List[Flashcard]:
+    """
+    n deduplicated cards. The deck is split into concurrent sub-batches,
+    one per angle of the topic (FLASHCARDS_FANOUT of _ANGLES), merged
+    through dedupe; if that comes up short, a targeted top-up asks for
+    only the missing count (at most two). Wall time is about one LLM call.
+    Past `deadline` no new request starts and the cards made so far are
+    returned (DeadlineExceeded if there are none); a deck still short
+    after the top-ups, or whose top-up was shed, is returned short too.
+    priority is the LLM scheduler class; avoid lists questions the model
+    should not repeat (e.g. a stored deck).
+    """
     n = max(1, min(MAX_N, int(n)))
     topic = (topic or "").strip() or "cybersecurity"
+    avoid = list(avoid or [])
 
-    out: List[Flashcard] = []
-    tries = 0
-
-    while len(out) < n and tries < 3:
-        tries += 1
-        remaining = n - len(out)
-
-        avoid_qs = [c.q for c in out]
-        batch_topic = topic if tries == 1 else f"{topic} (new set {tries})"
+    model = model_of(llm, api_key)
+    topic_key = " ".join(topic.lower().split())
 
-        batch = await _generate_batch(
-            llm,
-            api_key=api_key,
-            topic=batch_topic,
-            n=remaining,
-            avoid=avoid_qs,
-        )
+    out: List[Flashcard] = []
+    timed_out = False
 
+    def _merge(batch: List[Flashcard], ask: int) -> None:
+        before = len(out)
+        seen = 0
         for card in batch:
-            if _accept_card(card, out=out):
-                out.append(card)
             if len(out) >= n:
                 break
-
-    # fail-soft padding (very rare)
-    while len(out) < n:
-        i = len(out) + 1
-        out.append(
-            Flashcard(
-                q=f"{topic}: key concept #{i}?",
-                a="Regenerate to get a full-quality card for this slot.",
+            seen += 1
+            if _accept_card(card, out=out):
+                out.append(card)
+        # cards past the point where the deck was full were never judged
+        YIELD.observe("flashcards", model, topic_key, asked=ask - (len(batch) - seen), accepted=len(out) - before)
+
+    # -----------------------------
+    # Concurrent sub-batches, one angle each
+    # -----------------------------
+    width = max(1, min(int(FLASHCARDS_FANOUT), len(_ANGLES), n))
+    # oversample by the learned acceptance rate so one wave usually fills
+    ask = YIELD.request_size("flashcards", model, topic_key, n, cap=MAX_N + width)
+    sizes = [ask // width + (1 if i < ask % width else 0) for i in range(width)]
+    results = await asyncio.gather(
+        *(
+            _generate_batch(
+                llm,
+                api_key=api_key,
+                topic=topic,
+                n=k,
+                avoid=avoid,
+                deadline=deadline,
+                priority=priority,
+                angle=_ANGLES[i] if width > 1 else "",
             )
-        )
-
+            for i, k in enumerate(sizes)
+        ),
+        return_exceptions=True,
+    )
+    errors: List[BaseException] = []
+    for k, res in zip(sizes, results):
+        if isinstance(res, BaseException):
+            errors.append(res)
+        else:
+            _merge(res, k)
+    timed_out = any(isinstance(e, DeadlineExceeded) for e in errors)
+    if errors and not out and not timed_out:
+        raise errors[0]
+    if errors:
+        log.warning("Flashcards: %d/%d sub-batch(es) failed: %s", len(errors), width, errors[0])
+
+    # -----------------------------
+    # Top-up for the missing count only
+    # -----------------------------
+    tries = 1
+    while len(out) < n and tries < 3 and not timed_out and not expired(deadline):
+        tries += 1
+        missing = n - len(out)
+        ask = YIELD.request_size("flashcards", model, topic_key, missing, cap=MAX_N)
+        try:
+            batch = await _generate_batch(
+                llm,
+                api_key=api_key,
+                topic=f"{topic} (new set {tries})",
+                n=ask,
+                avoid=[c.q for c in out] + avoid,
+                deadline=deadline,
+                priority=priority,
+            )
+        except DeadlineExceeded:
+            timed_out = True
+            break
+        except LLMBusy as e:
+            # same rule as the sub-batches: keep the cards already merged
+            if not out:
+                raise
+            log.warning("Flashcards top-up failed, keeping %d/%d card(s): %s", len(out), n, e)
+            break
+        _merge(batch, ask)
+
+    if len(out) < n:
+        if timed_out or expired(deadline):
+            if not out:
+                raise DeadlineExceeded()
+            log.warning("Flashcards deadline reached: returning %d/%d card(s)", len(out), n)
+        else:
+            log.warning("Flashcards short: returning %d/%d card(s)", len(out), n)
     return out[:n]
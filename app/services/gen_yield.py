@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import json
+import logging
+import math
+import threading
+from typing import Dict, Optional, Tuple
+
+from config import GEN_YIELD_CONFIDENCE
+
+log = logging.getLogger("MentraAI")
+
+_ANY_TOPIC = "*"
+
+
+def _betabinom_tail(k: int, need: int, a: float, b: float) -> float:
+    """
+    P(X >= need) for X ~ BetaBinomial(k, a, b): successes out of k items
+    when the per-item rate is itself uncertain (Beta(a, b)).
+    """
+    if need <= 0:
+        return 1.0
+    if need > k:
+        return 0.0
+    base = math.lgamma(k + 1) + math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) - math.lgamma(k + a + b)
+    total = 0.0
+    for x in range(need, k + 1):
+        total += math.exp(
+            base - math.lgamma(x + 1) - math.lgamma(k - x + 1) + math.lgamma(x + a) + math.lgamma(k - x + b)
+        )
+    return min(1.0, total)
+
+
+def model_of(llm, api_key: str) -> str:
+    """
+    Model name a call with this key uses (the estimator's key), "" if the
+    client can't tell.
+    """
+    model_for = getattr(llm, "model_for", None)
+    return str(model_for(api_key) if callable(model_for) else getattr(llm, "default_model", "") or "")
+
+
+class _Stats:
+    __slots__ = ("asked", "accepted", "chars", "parsed")
+
+    def __init__(self) -> None:
+        self.asked = 0.0
+        self.accepted = 0.0
+        self.chars = 0.0
+        self.parsed = 0.0
+
+
+class YieldEstimator:
+    """
+    Learns what fraction of requested items survive validation and dedupe
+    per (kind, model, topic), and sizes the next request from it.
+
+    The rate is a Beta posterior: the model-wide rate (itself shrunk to
+    `prior_rate`) is the prior for each topic, worth `prior_weight` items,
+    so a new topic starts from what the model usually manages. Counts are
+    scaled down past `window` items so recent generations dominate.
+    request_size() picks the smallest request whose Beta-Binomial
+    predictive P(accepted >= needed) reaches `confidence`: uncertain or
+    low rates oversample more, a model that reliably passes gets asked
+    for exactly what is missing.
+    """
+
+    def __init__(
+        self,
+        *,
+        prior_rate: float = 0.8,
+        prior_weight: float = 20.0,
+        window: float = 400.0,
+        confidence: float = 0.8,
+    ):
+        self.prior_rate = float(prior_rate)
+        self.prior_weight = float(prior_weight)
+        self.window = float(window)
+        self.confidence = float(confidence)
+        self._stats: Dict[Tuple[str, str, str], _Stats] = {}
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Learning
+    # -----------------------------
+    def observe(
+        self,
+        kind: str,
+        model: str,
+        topic: str,
+        *,
+        asked: int,
+        accepted: int,
+        chars: int = 0,
+        parsed: int = 0,
+    ) -> None:
+        """
+        One finished generation: `asked` items requested (minus any the
+        caller never looked at), `accepted` kept; `chars` of raw output
+        holding `parsed` items feed the tokens-per-item estimate.
+        """
+        if asked <= 0:
+            return
+        accepted = max(0, min(int(accepted), int(asked)))
+        with self._lock:
+            for key in ((kind, model, topic), (kind, model, _ANY_TOPIC)):
+                st = self._stats.setdefault(key, _Stats())
+                st.asked += asked
+                st.accepted += accepted
+                if parsed > 0:
+                    st.chars += chars
+                    st.parsed += parsed
+                if st.asked > self.window:
+                    f = self.window / st.asked
+                    st.asked *= f
+                    st.accepted *= f
+                    st.chars *= f
+                    st.parsed *= f
+
+    def seed(self, store) -> None:
+        """
+        Warm up once from the persisted quiz generation ledger, each row
+        under the kind it was generated as ("quiz" / "quiz.lean").
+        """
+        if self._seeded:
+            return
+        self._seeded = True
+        if store is None or not hasattr(store, "recent_quiz_gen_yields"):
+            return
+        try:
+            rows = store.recent_quiz_gen_yields()
+        except Exception as e:
+            log.warning("Generation yield seed failed: %s", e)
+            return
+        for r in rows:
+            try:
+                surplus = int(json.loads(r["funnel"] or "{}").get("surplus", 0))
+            except (ValueError, AttributeError):
+                surplus = 0
+            self.observe(
+                r["kind"] or "quiz",
+                r["model"],
+                r["topic"],
+                asked=int(r["asked"] or 0) - surplus,
+                accepted=int(r["accepted"] or 0),
+                chars=int(r["out_chars"] or 0),
+                parsed=int(r["parsed"] or 0),
+            )
+
+    # -----------------------------
+    # Estimates
+    # -----------------------------
+    def posterior(self, kind: str, model: str, topic: str) -> Tuple[float, float]:
+        """
+        Beta(a, b) for the per-item acceptance rate.
+        """
+        w = self.prior_weight
+        with self._lock:
+            m = self._stats.get((kind, model, _ANY_TOPIC))
+            t = self._stats.get((kind, model, topic))
+            mean = self.prior_rate
+            if m is not None and m.asked > 0:
+                mean = (self.prior_rate * w + m.accepted) / (w + m.asked)
+            mean = min(0.98, max(0.05, mean))
+            a, b = mean * w, (1.0 - mean) * w
+            if t is not None:
+                a += t.accepted
+                b += t.asked - t.accepted
+        return max(a, 1e-3), max(b, 1e-3)
+
+    def rate(self, kind: str, model: str, topic: str) -> float:
+        a, b = self.posterior(kind, model, topic)
+        return a / (a + b)
+
+    def request_size(self, kind: str, model: str, topic: str, needed: int, *, cap: int) -> int:
+        """
+        Items to request so that `needed` pass with ~`confidence`
+        probability, between needed and cap.
+        """
+        needed = max(1, int(needed))
+        cap = max(needed, int(cap))
+        a, b = self.posterior(kind, model, topic)
+        for k in range(needed, cap + 1):
+            if _betabinom_tail(k, needed, a, b) >= self.confidence:
+                return k
+        return cap
+
+    def tokens_per_item(self, kind: str, model: str) -> Optional[float]:
+        """
+        Output tokens one item takes (~4 chars/token), or None before
+        enough output was seen.
+        """
+        with self._lock:
+            st = self._stats.get((kind, model, _ANY_TOPIC))
+            if st is None or st.parsed < 3:
+                return None
+            return st.chars / st.parsed / 4.0
+
+    def max_tokens(self, kind: str, model: str, items: int, *, default: int, base: int = 200) -> int:
+        """
+        Output budget for `items` items: learned size with 40% headroom,
+        never above `default` (the static formula).
+        """
+        tpi = self.tokens_per_item(kind, model)
+        if tpi is None:
+            return default
+        return min(default, base + math.ceil(1.4 * tpi * max(1, items)))
+
+
+# Shared across quiz and flashcard generation
+YIELD = YieldEstimator(confidence=GEN_YIELD_CONFIDENCE)
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Outside strings: runs of a bare word (unquoted key, literal, number)
+_BARE_RE = re.compile(r"[A-Za-z0-9_$+\-.]+")
+# String delimiters: opener -> closers. Smart quotes only delimit where a
+# string can start; inside a "..." string they are ordinary characters.
+_CLOSERS = {'"': '"', "'": "'", "“": "”“\"", "‘": "’'"}
+# Inside strings: runs of plain characters up to a closer / escape / control char
+_RUN = {q: re.compile("[^" + re.escape(c + '"') + "\\\\\\x00-\\x1f]+") for q, c in _CLOSERS.items()}
+_NUM_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+
+_LITERALS = {
+    "true": "true",
+    "false": "false",
+    "null": "null",
+    "True": "true",
+    "False": "false",
+    "None": "null",
+    "undefined": "null",
+    "NaN": "null",
+}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class _Frame:
+    __slots__ = ("obj", "state", "count")
+
+    def __init__(self, obj: bool):
+        self.obj = obj
+        self.state = "key"  # objects: key | colon (key read) | value (colon read)
+        self.count = 0
+
+
+class _Repairer:
+    """
+    One pass over LLM output, re-emitting each top-level object/array as
+    strict JSON. Text outside them (prose, fences) is skipped; inside, the
+    usual model mistakes are rewritten: single and smart quotes, trailing
+    or missing commas, missing colons, unquoted keys and values, Python
+    literals, comments, raw newlines in strings. Output cut off mid-value
+    is closed (strings, arrays, objects; a dangling key gets null).
+    """
+
+    def __init__(self, text: str):
+        self.s = text
+        self.i = 0
+        self.stack: List[_Frame] = []
+        self.buf: List[str] = []
+        self.values: List[str] = []
+        self.truncated = False
+
+    # -----------------------------
+    # Emitting
+    # -----------------------------
+    def _element(self, key: bool = False) -> bool:
+        """
+        Emit the separator before the next element of the current container;
+        True if it lands in key position (caller emits a key).
+        """
+        f = self.stack[-1]
+        if not f.obj:
+            if f.count:
+                self.buf.append(",")
+            f.count += 1
+            return False
+        if f.state == "key":
+            if f.count:
+                self.buf.append(",")
+            if key:
+                f.state = "colon"
+                return True
+            # a value where a key belongs: keep it under an empty key
+            self.buf.append('"":')
+        else:
+            self.buf.append(":")
+        f.state = "key"
+        f.count += 1
+        return False
+
+    def _close(self, f: _Frame) -> None:
+        if f.obj and f.state != "key":
+            self.buf.append(":null")
+            f.count += 1
+        self.buf.append("}" if f.obj else "]")
+
+    def _pop(self, obj: bool) -> None:
+        """
+        Close the innermost container of this kind (and any left open
+        inside it); a stray closer is ignored.
+        """
+        if not any(f.obj == obj for f in self.stack):
+            return
+        while self.stack:
+            f = self.stack.pop()
+            self._close(f)
+            if f.obj == obj:
+                break
+        if not self.stack:
+            self._finish()
+
+    def _finish(self) -> None:
+        self.values.append("".join(self.buf))
+        self.buf = []
+
+    # -----------------------------
+    # Tokens
+    # -----------------------------
+    def _closes(self, k: int) -> bool:
+        s = self.s
+        while k < len(s) and s[k] in " \t\r\n":
+            k += 1
+        return k >= len(s) or s[k] in ",:}]"
+
+    def _string(self, q: str) -> str:
+        """
+        Read a string opened by `q` at self.i; returns it JSON-quoted.
+        Anything but a plain double quote only closes the string before
+        , : } ] or the end, so apostrophes inside 'python-style' strings
+        survive.
+        """
+        s, n = self.s, len(self.s)
+        run = _RUN[q]
+        closers = _CLOSERS[q]
+        out = ['"']
+        j = self.i + 1
+        while True:
+            m = run.match(s, j)
+            if m:
+                out.append(m.group())
+                j = m.end()
+            if j >= n:
+                self.truncated = True
+                break
+            c = s[j]
+            if c in closers:
+                if q != '"' and not self._closes(j + 1):
+                    out.append('\\"' if c == '"' else c)
+                    j += 1
+                    continue
+                j += 1
+                break
+            if c == "\\":
+                nxt = s[j + 1] if j + 1 < n else ""
+                if not nxt:
+                    self.truncated = True
+                    j += 1
+                    break
+                if nxt == "'":
+                    out.append("'")
+                elif nxt == "u" and re.match(r"[0-9a-fA-F]{4}", s[j + 2 : j + 6]):
+                    out.append(s[j : j + 6])
+                    j += 6
+                    continue
+                elif nxt in '"\\/bfnrt':
+                    out.append("\\" + nxt)
+                else:
+                    out.append("\\\\" + (nxt if nxt not in _ESCAPES else _ESCAPES[nxt]))
+                j += 2
+                continue
+            if c == '"':
+                out.append('\\"')
+            elif c in _ESCAPES:
+                out.append(_ESCAPES[c])
+            # other control characters are dropped
+            j += 1
+        self.i = j
+        out.append('"')
+        return "".join(out)
+
+    def _bare(self, key: bool) -> str:
+        m = _BARE_RE.match(self.s, self.i)
+        word = m.group()
+        self.i = m.end()
+        if key:
+            return json.dumps(word)
+        if word in _LITERALS:
+            return _LITERALS[word]
+        if _NUM_RE.fullmatch(word):
+            return word
+        try:
+            num = float(word)
+        except ValueError:
+            num = None
+        if num is not None and num == num and abs(num) != float("inf"):
+            return json.dumps(num)
+        if self.i >= len(self.s):
+            # cut off mid-literal ("tru"): unknown value
+            self.truncated = True
+            return "null"
+        return json.dumps(word)
+
+    def _skip_comment(self) -> bool:
+        s, i = self.s, self.i
+        if s.startswith("//", i):
+            end = s.find("\n", i)
+            self.i = len(s) if end < 0 else end
+            return True
+        if s.startswith("/*", i):
+            end = s.find("*/", i + 2)
+            self.i = len(s) if end < 0 else end + 2
+            return True
+        return False
+
+    # -----------------------------
+    # Main loop
+    # -----------------------------
+    def run(self) -> "_Repairer":
+        s, n = self.s, len(self.s)
+        while self.i < n:
+            c = s[self.i]
+            if not self.stack:
+                # between top-level values: only an opening bracket starts one
+                if c in "{[":
+                    self.buf.append(c)
+                    self.stack.append(_Frame(c == "{"))
+                self.i += 1
+                continue
+
+            if c in " \t\r\n":
+                self.i += 1
+            elif c in "{[":
+                self._element()
+                self.buf.append(c)
+                self.stack.append(_Frame(c == "{"))
+                self.i += 1
+            elif c in "}]":
+                self._pop(c == "}")
+                self.i += 1
+            elif c == ":":
+                f = self.stack[-1]
+                if f.obj and f.state == "colon":
+                    f.state = "value"
+                self.i += 1
+            elif c == ",":
+                f = self.stack[-1]
+                if f.obj and f.state != "key":
+                    # key without a value
+                    self.buf.append(":null")
+                    f.state = "key"
+                    f.count += 1
+                self.i += 1
+            elif c in _CLOSERS:
+                self._element(key=True)
+                self.buf.append(self._string(c))
+            elif _BARE_RE.match(s, self.i):
+                key = self._element(key=True)
+                self.buf.append(self._bare(key))
+            elif c == "/" and self._skip_comment():
+                pass
+            else:
+                self.i += 1
+
+        if self.stack:
+            self.truncated = True
+            while self.stack:
+                self._close(self.stack.pop())
+            self._finish()
+        return self
+
+
+def _merge(values: List[Any], list_key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    One object from the top-level values. With list_key, bare items and
+    arrays are collected under it and every object's list_key is joined
+    ({"cards": [..]}{"cards": [..]} or {"q": ..}{"q": ..}); otherwise later
+    objects fill keys the first lacks and extend its lists.
+    """
+    if list_key:
+        base: Dict[str, Any] = {}
+        items: List[Any] = []
+        for v in values:
+            if isinstance(v, dict) and isinstance(v.get(list_key), list):
+                items.extend(v[list_key])
+                for k, val in v.items():
+                    if k != list_key:
+                        base.setdefault(k, val)
+            elif isinstance(v, dict):
+                items.append(v)
+            elif isinstance(v, list):
+                items.extend(v)
+        if not items and not base:
+            return None
+        base[list_key] = items
+        return base
+
+    out: Optional[Dict[str, Any]] = None
+    for v in values:
+        if not isinstance(v, dict):
+            continue
+        if out is None:
+            out = v
+            continue
+        for k, val in v.items():
+            if isinstance(out.get(k), list) and isinstance(val, list):
+                out[k].extend(val)
+            else:
+                out.setdefault(k, val)
+    return out
+
+
+def repair_json(text: str) -> Tuple[List[Any], bool]:
+    """
+    Every top-level JSON object/array found in `text`, repaired, and
+    whether the output was cut off (something had to be auto-closed).
+    """
+    r = _Repairer(text or "").run()
+    values: List[Any] = []
+    for v in r.values:
+        try:
+            values.append(json.loads(v))
+        except ValueError:
+            continue
+    return values, r.truncated
+
+
+def parse_json_object(raw: str, *, list_key: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Tolerant replacement for json.loads on LLM replies, so a malformed
+    reply is fixed locally instead of costing a repair round-trip.
+    Returns (object or None, mode): "direct" (valid as-is), "repaired",
+    "truncated" (repaired and auto-closed: the last item may be cut
+    short), "empty" or "none". list_key names the list a reply of several
+    concatenated objects or bare items should be gathered into.
+    """
+    s = (raw or "").strip()
+    if not s:
+        return None, "empty"
+    try:
+        obj = json.loads(s)
+        if isinstance(obj, dict):
+            return obj, "direct"
+    except ValueError:
+        pass
+
+    values, truncated = repair_json(s)
+    obj = _merge(values, list_key)
+    if obj is None:
+        return None, "none"
+    return obj, "truncated" if truncated else "repaired"
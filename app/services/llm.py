@@ -1,6 +1,39 @@
-﻿import httpx
-from typing import Optional
+﻿import asyncio
+import httpx
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 import os
+import logging
+
+from app.services.llm_cache import LLMCache
+from app.services.llm_cassette import LLMCassette
+from app.services.llm_metrics import LLMMetrics, parse_usage
+from app.services.llm_singleflight import SingleFlight
+from app.services.llm_scheduler import LLMBusy, LLMScheduler, PRIORITY_INTERACTIVE  # noqa: F401
+from app.services.llm_router import LLMRouter, LLMUnavailable, RETRYABLE_STATUSES
+from app.services.llm_deadline import Deadline
+
+log = logging.getLogger("MentraAI")
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    _HAS_H2 = True
+except Exception:
+    _HAS_H2 = False
+
+class _UpstreamError(Exception):
+    """Upstream HTTP/transport error; str() is the user-facing text."""
+
+    def __init__(self, message: str, *, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in RETRYABLE_STATUSES
+
 
 class LLMClient:
     """
@@ -22,6 +55,18 @@ class LLMClient:
         openai_default_model: Optional[str] = None,
         prefer_responses_api: bool = True,
         force_chat_completions: bool = False,   # <-- aggiungi questo
+        timeout: float = 60.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        cache: Optional[LLMCache] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        router: Optional[LLMRouter] = None,
+        metrics: Optional[LLMMetrics] = None,
+        cassette: Optional[LLMCassette] = None,
+        supports_n: bool = False,
+        structured_output: str = "auto",
     ):
         self.base_url = (base_url or "").rstrip("/")
         self.default_model = default_model
@@ -32,94 +77,267 @@ class LLMClient:
         self.prefer_responses_api = bool(prefer_responses_api)
         self.force_chat_completions = bool(force_chat_completions)
 
+        # Pooled HTTP clients (one per backend base URL)
+        self.timeout = float(timeout)
+        self.limits = httpx.Limits(
+            max_connections=int(max_connections),
+            max_keepalive_connections=int(max_keepalive_connections),
+            keepalive_expiry=float(keepalive_expiry),
+        )
+        self.http2 = bool(http2) and _HAS_H2
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+        # Opt-in response cache (see ask(cache=True))
+        self.cache = cache
+
+        # Concurrent identical requests share one upstream call
+        self.inflight = SingleFlight()
+
+        # Priority queue + adaptive concurrency in front of every backend
+        self.scheduler = scheduler or LLMScheduler()
+
+        # Health tracking, retries, failover and hedging across backends
+        self.router = router or LLMRouter()
+
+        # Per call-site latency / token / status accounting (see metrics_text())
+        self.metrics = metrics or LLMMetrics()
+
+        # Record/replay of raw HTTP traffic for offline benchmarks
+        self.cassette = cassette
+
+        # Backend honors the OpenAI `n` parameter on /chat/completions
+        # (OpenAI does; Ollama ignores it, Groq rejects n > 1)
+        self.supports_n = bool(supports_n)
+
+        # Schema-constrained decoding for calls that pass `schema=`:
+        # "auto" | "json_schema" | "json_object" | "off" (see _response_format)
+        self.structured_output = (structured_output or "off").strip().lower()
+        # Backends that rejected response_format; they get plain requests
+        self._no_structured: set = set()
+
+    # -----------------------------
+    # HTTP client lifecycle
+    # -----------------------------
+    def _client_for(self, base: str) -> httpx.AsyncClient:
+        """
+        Shared keep-alive client for a backend. Created lazily, so calls made
+        before open() (or after aclose()) still work.
+        """
+        client = self._clients.get(base)
+        if client is None or client.is_closed:
+            if self.cassette is not None:
+                inner = None
+                if self.cassette.mode == "record":
+                    inner = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+                client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    transport=self.cassette.transport(inner),
+                )
+            else:
+                client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=self.limits,
+                    http2=self.http2,
+                )
+            self._clients[base] = client
+        return client
+
+    async def open(self) -> None:
+        """
+        Warm up one pooled client per configured backend.
+        """
+        for base in (self.base_url, self.openai_base_url):
+            if base:
+                self._client_for(base)
+        log.info(
+            "LLM HTTP pool ready: backends=%d http2=%s max_conn=%s",
+            len(self._clients),
+            self.http2,
+            self.limits.max_connections,
+        )
+        if self.cassette is not None:
+            log.info("LLM cassette %s: %s", self.cassette.mode, self.cassette.path)
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                log.exception("Failed to close LLM HTTP client")
+
+    async def __aenter__(self) -> "LLMClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
 
     def _is_openai_call(self, api_key: str) -> bool:
         return bool(api_key and self.openai_base_url)
 
-    async def ask(
-        self,
-        api_key: str,
-        prompt: str,
-        system: str = "You are a helpful study assistant.",
-        model: Optional[str] = None,
-        max_tokens: int = 400,
-        temperature: float = 0.2,
-    ) -> str:
+    # -----------------------------
+    # Scheduling
+    # -----------------------------
+    def queue_position(self, priority: str = PRIORITY_INTERACTIVE) -> int:
+        """
+        How many queued LLM calls a new call of this priority would wait behind.
+        """
+        return self.scheduler.position(priority)
+
+    def queue_stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.scheduler.queue_depth(),
+            "backends": self.scheduler.snapshot(),
+        }
+
+    def backend_stats(self) -> Dict[str, Any]:
+        return self.router.snapshot()
+
+    def metrics_text(self) -> str:
+        """
+        Prometheus text format: call-site metrics plus scheduler/router gauges.
+        """
+        sched = self.scheduler.snapshot()
+        health = self.router.snapshot()["backends"]
+        states = {"closed": 0, "half_open": 1, "open": 2}
+        gauges = [
+            (
+                "mentra_llm_queue_depth",
+                "LLM calls waiting for a scheduler slot.",
+                [({"backend": g["backend"]}, g["queued"]) for g in sched],
+            ),
+            (
+                "mentra_llm_inflight",
+                "LLM calls currently holding a scheduler slot.",
+                [({"backend": g["backend"]}, g["active"]) for g in sched],
+            ),
+            (
+                "mentra_llm_concurrency_limit",
+                "Current adaptive concurrency limit per backend.",
+                [({"backend": g["backend"]}, g["limit"]) for g in sched],
+            ),
+            (
+                "mentra_llm_circuit_state",
+                "Circuit breaker state (0=closed, 1=half-open, 2=open).",
+                [({"backend": b}, states.get(h["state"], 0)) for b, h in health.items()],
+            ),
+        ]
+        return self.metrics.render(gauges)
+
+    @staticmethod
+    def _retry_after(r: httpx.Response) -> Optional[float]:
+        raw = (r.headers.get("retry-after") or "").strip()
+        try:
+            return float(raw) if raw else None
+        except ValueError:
+            return None
+
+    # -----------------------------
+    # Request building / parsing
+    # -----------------------------
+    def _resolve(self, api_key: str, model: Optional[str]) -> Dict[str, Any]:
+        """
+        Pick backend, model, headers and API flavour for a call.
+        """
         api_key = (api_key or "").strip()
         provider = os.getenv("LLM_PROVIDER", "").strip().lower()
         if provider == "groq":
             api_key = os.getenv("GROQ_API_KEY", "").strip() or api_key
 
-
-        prompt = f"Answer in English only.\n\n{prompt or ''}"
-        system = system or "You are a helpful study assistant."
-
         use_openai = self._is_openai_call(api_key)
 
         if use_openai:
             used_model = model or self.openai_default_model
-            base = self.openai_base_url  # type: ignore[assignment]
+            base = self.openai_base_url
         else:
             used_model = model or self.default_model
             base = self.base_url
 
-        if not base:
-            return "LLM misconfigured: missing base_url."
-
         headers = {"Content-Type": "application/json"}
         if use_openai:
             headers["Authorization"] = f"Bearer {api_key}"
 
-        async with httpx.AsyncClient(timeout=60) as client:
-            if use_openai and self.prefer_responses_api and (not self.force_chat_completions) and provider != "groq":
-
-
-                url = f"{base}/responses"
-                payload = {
-                    "model": used_model,
-                    "input": [
-                        {"role": "system", "content": system},
-                        {"role": "user", "content": prompt},
-                    ],
-                    "temperature": temperature,
-                    # keep it simple: ask for text output
-                    "max_output_tokens": max_tokens,
-                }
-
-                r = await client.post(url, headers=headers, json=payload)
-                if r.status_code == 401:
-                    return "Invalid API key (401). Use /setkey to update it."
-                if r.status_code >= 400:
-                    body = (r.text or "")[:500]
-                    return f"LLM error ({r.status_code}): {body}"
-
-                data = r.json()
-
-                if isinstance(data, dict) and "output_text" in data:
-                    out = str(data.get("output_text") or "").strip()
-                    if out:
-                        return out
-
-                if isinstance(data, dict) and isinstance(data.get("output"), list):
-                    texts = []
-                    for item in data["output"]:
-                        content = item.get("content") if isinstance(item, dict) else None
-                        if isinstance(content, list):
-                            for part in content:
-                                if isinstance(part, dict):
-                                    if "text" in part:
-                                        texts.append(str(part["text"]))
-                                    elif part.get("type") == "output_text" and "content" in part:
-                                        texts.append(str(part["content"]))
-                    out = "\n".join([t for t in texts if t]).strip()
-                    if out:
-                        return out
-
-                return ""
+        use_responses = bool(
+            use_openai
+            and self.prefer_responses_api
+            and (not self.force_chat_completions)
+            and provider != "groq"
+        )
+
+        return {
+            "name": provider or ("remote" if use_openai else "local"),
+            "base": base or "",
+            "model": used_model,
+            "headers": headers,
+            "use_responses": use_responses,
+        }
+
+    def model_for(self, api_key: str) -> str:
+        """
+        Model a call with this key would use (for logs and ledgers).
+        """
+        return str(self._resolve(api_key, None)["model"] or "")
+
+    def _response_format(self, target: Dict[str, Any], schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Chat-completions `response_format` for a JSON Schema, or None when
+        structured output is off / unsupported by this backend.
+        "auto" uses strict json_schema, except on Groq where only JSON mode
+        is available on every model.
+        """
+        mode = self.structured_output
+        if not schema or mode in ("", "off", "0", "false", "no") or target["base"] in self._no_structured:
+            return None
+        if mode == "auto":
+            mode = "json_object" if target["name"] == "groq" else "json_schema"
+        if mode == "json_object":
+            return {"type": "json_object"}
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": str(schema.get("title") or "output"),
+                "schema": schema,
+                "strict": True,
+            },
+        }
 
+    def _build_request(
+        self,
+        target: Dict[str, Any],
+        *,
+        prompt: str,
+        system: str,
+        max_tokens: int,
+        temperature: float,
+        stream: bool = False,
+        choices: int = 1,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        base = target["base"]
+        fmt = self._response_format(target, schema)
+
+        if target["use_responses"]:
+            url = f"{base}/responses"
+            payload: Dict[str, Any] = {
+                "model": target["model"],
+                "input": [
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt},
+                ],
+                "temperature": temperature,
+                # keep it simple: ask for text output
+                "max_output_tokens": max_tokens,
+            }
+            if fmt is not None:
+                # Responses API flattens the json_schema wrapper into text.format
+                inner = fmt.get("json_schema") or {}
+                payload["text"] = {"format": {"type": fmt["type"], **inner}}
+        else:
             url = f"{base}/chat/completions"
             payload = {
-                "model": used_model,
+                "model": target["model"],
                 "messages": [
                     {"role": "system", "content": system},
                     {"role": "user", "content": prompt},
@@ -128,38 +346,703 @@ class LLMClient:
                 "temperature": temperature,
             }
 
-            r = await client.post(url, headers=headers, json=payload)
+            if choices > 1:
+                payload["n"] = int(choices)
 
-            if r.status_code == 401:
-                return "Invalid API key (401). Use /setkey to update it."
-            if r.status_code >= 400:
-                body = (r.text or "")[:500]
-                return f"LLM error ({r.status_code}): {body}"
+            if fmt is not None:
+                payload["response_format"] = fmt
+
+        if stream:
+            payload["stream"] = True
+
+        return url, payload
+
+    @staticmethod
+    def _error_text(status_code: int, body: str) -> str:
+        if status_code == 401:
+            return "Invalid API key (401). Use /setkey to update it."
+        return f"LLM error ({status_code}): {(body or '')[:500]}"
 
-            data = r.json()
+    @staticmethod
+    def is_error_text(text: str) -> bool:
+        """
+        True if ask() returned one of its error strings instead of model output.
+        """
+        t = (text or "").lstrip()
+        return t.startswith(("LLM error (", "Invalid API key (", "LLM misconfigured:"))
 
-            if isinstance(data, dict) and data.get("choices"):
-                choice0 = data["choices"][0] or {}
-                msg = choice0.get("message") or {}
-                content = (msg.get("content") or "").strip()
-                if content:
-                    return content
+    @staticmethod
+    def _parse_responses_data(data: Any) -> str:
+        if isinstance(data, dict) and "output_text" in data:
+            out = str(data.get("output_text") or "").strip()
+            if out:
+                return out
 
-                text = (choice0.get("text") or "").strip()
-                if text:
-                    return text
+        if isinstance(data, dict) and isinstance(data.get("output"), list):
+            texts = []
+            for item in data["output"]:
+                content = item.get("content") if isinstance(item, dict) else None
+                if isinstance(content, list):
+                    for part in content:
+                        if isinstance(part, dict):
+                            if "text" in part:
+                                texts.append(str(part["text"]))
+                            elif part.get("type") == "output_text" and "content" in part:
+                                texts.append(str(part["content"]))
+            out = "\n".join([t for t in texts if t]).strip()
+            if out:
+                return out
 
-                delta = choice0.get("delta") or {}
-                dcontent = (delta.get("content") or "").strip()
-                if dcontent:
-                    return dcontent
+        return ""
 
-                return ""
+    @staticmethod
+    def _parse_chat_data(data: Any) -> str:
+        if isinstance(data, dict) and data.get("choices"):
+            choice0 = data["choices"][0] or {}
+            msg = choice0.get("message") or {}
+            content = (msg.get("content") or "").strip()
+            if content:
+                return content
 
-            if isinstance(data, dict) and "message" in data:
-                return str(data["message"]).strip()
+            text = (choice0.get("text") or "").strip()
+            if text:
+                return text
 
-            if isinstance(data, dict) and "response" in data:
-                return str(data["response"]).strip()
+            delta = choice0.get("delta") or {}
+            dcontent = (delta.get("content") or "").strip()
+            if dcontent:
+                return dcontent
 
             return ""
+
+        if isinstance(data, dict) and "message" in data:
+            return str(data["message"]).strip()
+
+        if isinstance(data, dict) and "response" in data:
+            return str(data["response"]).strip()
+
+        return ""
+
+    @classmethod
+    def _parse_chat_choices(cls, data: Any) -> List[str]:
+        """
+        Every choice of a chat completion (n > 1); empty ones are dropped.
+        """
+        if not (isinstance(data, dict) and isinstance(data.get("choices"), list)):
+            text = cls._parse_chat_data(data)
+            return [text] if text else []
+        out = []
+        for choice in data["choices"]:
+            text = cls._parse_chat_data({"choices": [choice]})
+            if text:
+                out.append(text)
+        return out
+
+    @staticmethod
+    def _parse_sse_event(use_responses: bool, data: Any) -> str:
+        """
+        Extract the text delta from one SSE event (chat.completion.chunk or
+        response.output_text.delta). Other events yield "".
+        """
+        if not isinstance(data, dict):
+            return ""
+
+        if use_responses:
+            if data.get("type") == "response.output_text.delta":
+                return str(data.get("delta") or "")
+            return ""
+
+        choices = data.get("choices") or []
+        if not choices:
+            return ""
+        choice0 = choices[0] or {}
+        delta = choice0.get("delta") or {}
+        return str(delta.get("content") or choice0.get("text") or "")
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def _cache_key(
+        self,
+        target: Dict[str, Any],
+        *,
+        prompt: str,
+        system: str,
+        max_tokens: int,
+        temperature: float,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        fmt = self._response_format(target, schema)
+        return LLMCache.make_key(
+            backend=f"{target['base']}|{'responses' if target['use_responses'] else 'chat'}",
+            model=str(target["model"]),
+            system=system,
+            prompt=prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            extra=fmt,
+        )
+
+    @staticmethod
+    def _rejects_format(status_code: int, body: str) -> bool:
+        """
+        True if a 400 looks like the backend refusing response_format / json_schema.
+        """
+        if status_code not in (400, 422):
+            return False
+        b = (body or "").lower()
+        return any(k in b for k in ("response_format", "json_schema", "text.format", "structured"))
+
+    async def _complete(
+        self,
+        target: Dict[str, Any],
+        *,
+        prompt: str,
+        system: str,
+        max_tokens: int,
+        temperature: float,
+        priority: str = PRIORITY_INTERACTIVE,
+        meta: Optional[Dict[str, Any]] = None,
+        choices: int = 1,
+        schema: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Any:
+        """
+        One non-streaming round-trip against a single backend.
+        Raises _UpstreamError on HTTP >= 400. `meta` receives status/usage.
+        Returns the text, or a list of texts when choices > 1.
+        A backend that rejects `schema` is remembered and retried once
+        without it (callers keep their text-parsing fallback).
+        With a deadline the HTTP timeout is cut to about the time left.
+        """
+        url, payload = self._build_request(
+            target,
+            prompt=prompt,
+            system=system,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            choices=choices,
+            schema=schema,
+        )
+
+        client = self._client_for(target["base"])
+        # a second past the budget: the deadline (not a backend timeout that
+        # would count against its health) is what ends an over-budget call
+        timeout = self.timeout if deadline is None else min(self.timeout, deadline.remaining() + 1.0)
+        async with self.scheduler.slot(target["base"], priority) as slot:
+            r = await client.post(url, headers=target["headers"], json=payload, timeout=timeout)
+            slot.report(r.status_code, retry_after=self._retry_after(r))
+
+        if ("response_format" in payload or "text" in payload) and self._rejects_format(r.status_code, r.text):
+            log.warning("LLM backend %s rejected structured output; falling back to plain JSON prompts", target["base"])
+            self._no_structured.add(target["base"])
+            return await self._complete(
+                target,
+                prompt=prompt,
+                system=system,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                priority=priority,
+                meta=meta,
+                choices=choices,
+                deadline=deadline,
+            )
+
+        if meta is not None:
+            meta["status"] = r.status_code
+
+        if r.status_code >= 400:
+            raise _UpstreamError(
+                self._error_text(r.status_code, r.text),
+                status=r.status_code,
+                retry_after=self._retry_after(r),
+            )
+
+        data = r.json()
+        if meta is not None:
+            meta["usage"] = parse_usage(data)
+
+        if target["use_responses"]:
+            text = self._parse_responses_data(data)
+            return [text] if choices > 1 else text
+        if choices > 1:
+            return self._parse_chat_choices(data)
+        return self._parse_chat_data(data)
+
+    async def _attempt(self, target: Dict[str, Any], *, site: str = "unknown", **kw: Any) -> str:
+        """
+        _complete() plus health and metrics bookkeeping; transport errors
+        become retryable _UpstreamError.
+        """
+        base = target["base"]
+        health = self.router.health(base)
+        health.on_dispatch()
+        meta: Dict[str, Any] = {}
+        started = time.monotonic()
+        try:
+            text = await self._complete(target, meta=meta, **kw)
+        except _UpstreamError as e:
+            elapsed = time.monotonic() - started
+            self.metrics.observe(site, base, e.status, elapsed)
+            if e.retryable:
+                self.router.record(base, False, elapsed)
+            else:
+                health.probing = False
+            raise
+        except httpx.TransportError as e:
+            elapsed = time.monotonic() - started
+            self.metrics.observe(site, base, "error", elapsed)
+            self.router.record(base, False, elapsed)
+            raise _UpstreamError(f"LLM connection error: {type(e).__name__}") from e
+        except LLMBusy:
+            self.metrics.observe(site, base, "shed")
+            health.probing = False
+            raise
+        except BaseException:
+            # cancelled (e.g. lost a hedge race)
+            health.probing = False
+            raise
+
+        elapsed = time.monotonic() - started
+        self.metrics.observe(site, base, meta.get("status", 200), elapsed, meta.get("usage"))
+        self.router.record(base, True, elapsed)
+        return text
+
+    async def _hedged(self, first: Dict[str, Any], second: Dict[str, Any], **kw: Any) -> str:
+        """
+        Send to `first`; if it has not answered after its p95 latency, also
+        send to `second`. The first successful answer wins.
+        """
+        t1 = asyncio.ensure_future(self._attempt(first, **kw))
+        tasks = [t1]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.router.hedge_delay(first["base"]))
+            if done:
+                return t1.result()
+
+            self.router.hedges += 1
+            t2 = asyncio.ensure_future(self._attempt(second, **kw))
+            tasks.append(t2)
+
+            pending = set(tasks)
+            err: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.cancelled():
+                        continue
+                    if t.exception() is None:
+                        if t is t2:
+                            self.router.hedge_wins += 1
+                        return t.result()
+                    err = t.exception()
+            raise err or _UpstreamError("LLM hedged request failed")
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    def _candidates(self, primary: Dict[str, Any], failed: List[str]) -> List[Dict[str, Any]]:
+        """
+        Healthy targets, with backends that already failed this call moved
+        to the end (so a retry fails over first).
+        """
+        targets = self.router.candidates(primary)
+        return sorted(targets, key=lambda t: t["base"] in failed)
+
+    async def _retry_pause(self, attempt: int, primary: Dict[str, Any], failed: List[str], err: _UpstreamError) -> None:
+        """
+        Back off before the next attempt. Switching to another backend needs
+        no wait; retrying the same one honors Retry-After.
+        """
+        self.router.retries += 1
+        nxt = self._candidates(primary, failed)
+        if nxt and nxt[0]["base"] not in failed:
+            self.router.failovers += 1
+            return
+        await asyncio.sleep(self.router.backoff(attempt, err.retry_after))
+
+    async def _complete_routed(self, primary: Dict[str, Any], *, hedge: bool, **kw: Any) -> str:
+        """
+        Retry / fail over across backends. Non-retryable errors (e.g. 401)
+        raise _UpstreamError; exhausting every attempt raises LLMUnavailable.
+        A `deadline` in kw bounds every attempt and backoff by the time left
+        and raises DeadlineExceeded when it runs out.
+        """
+        deadline: Optional[Deadline] = kw.get("deadline")
+        last: Optional[_UpstreamError] = None
+        failed: List[str] = []
+        for attempt in range(self.router.max_retries + 1):
+            targets = self._candidates(primary, failed)
+            if not targets:
+                break
+            try:
+                if hedge and len(targets) > 1:
+                    call = self._hedged(targets[0], targets[1], **kw)
+                else:
+                    call = self._attempt(targets[0], **kw)
+                return await (call if deadline is None else deadline.run(call))
+            except _UpstreamError as e:
+                if not e.retryable:
+                    raise
+                last = e
+                failed.append(targets[0]["base"])
+                log.warning("LLM call failed on %s (attempt %d): %s", targets[0]["base"], attempt + 1, str(e)[:120])
+
+            if attempt < self.router.max_retries:
+                pause = self._retry_pause(attempt, primary, failed, last)
+                await (pause if deadline is None else deadline.run(pause))
+
+        raise LLMUnavailable(retry_after=(last.retry_after if last and last.retry_after else 10.0))
+
+    async def _stream_upstream(
+        self,
+        target: Dict[str, Any],
+        *,
+        prompt: str,
+        system: str,
+        max_tokens: int,
+        temperature: float,
+        priority: str = PRIORITY_INTERACTIVE,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        meta = {} if meta is None else meta
+        url, payload = self._build_request(
+            target,
+            prompt=prompt,
+            system=system,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+        )
+
+        client = self._client_for(target["base"])
+        async with self.scheduler.slot(target["base"], priority) as slot, client.stream(
+            "POST", url, headers=target["headers"], json=payload
+        ) as r:
+            slot.report(r.status_code, retry_after=self._retry_after(r))
+            meta["status"] = r.status_code
+            if r.status_code >= 400:
+                body = (await r.aread()).decode("utf-8", errors="replace")
+                raise _UpstreamError(
+                    self._error_text(r.status_code, body),
+                    status=r.status_code,
+                    retry_after=self._retry_after(r),
+                )
+
+            ctype = (r.headers.get("content-type") or "").lower()
+            if "text/event-stream" not in ctype:
+                # backend ignored stream=True: fall back to a single JSON body
+                data = json.loads((await r.aread()) or b"{}")
+                meta["usage"] = parse_usage(data)
+                if target["use_responses"]:
+                    yield self._parse_responses_data(data)
+                else:
+                    yield self._parse_chat_data(data)
+                return
+
+            async for line in r.aiter_lines():
+                line = (line or "").strip()
+                if not line.startswith("data:"):
+                    continue
+                chunk = line[5:].strip()
+                if not chunk:
+                    continue
+                if chunk == "[DONE]":
+                    return
+                try:
+                    data = json.loads(chunk)
+                except Exception:
+                    continue
+                usage = parse_usage(data)
+                if usage:
+                    # usually only on the last event (if the backend reports it)
+                    meta["usage"] = usage
+                delta = self._parse_sse_event(target["use_responses"], data)
+                if delta:
+                    yield delta
+
+    async def _stream_routed(self, primary: Dict[str, Any], *, site: str = "unknown", **kw: Any) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of _complete_routed(): fails over only before
+        the first chunk; once text has been yielded errors propagate.
+        """
+        last: Optional[_UpstreamError] = None
+        failed: List[str] = []
+        for attempt in range(self.router.max_retries + 1):
+            targets = self._candidates(primary, failed)
+            if not targets:
+                break
+            target = targets[0]
+            base = target["base"]
+            health = self.router.health(base)
+            health.on_dispatch()
+            meta: Dict[str, Any] = {}
+            started = time.monotonic()
+            yielded = False
+            try:
+                async for part in self._stream_upstream(target, meta=meta, **kw):
+                    yielded = True
+                    yield part
+            except _UpstreamError as e:
+                elapsed = time.monotonic() - started
+                self.metrics.observe(site, base, e.status, elapsed)
+                if e.retryable:
+                    self.router.record(base, False, elapsed)
+                else:
+                    health.probing = False
+                if yielded or not e.retryable:
+                    raise
+                last = e
+            except httpx.TransportError as e:
+                elapsed = time.monotonic() - started
+                self.metrics.observe(site, base, "error", elapsed)
+                self.router.record(base, False, elapsed)
+                err = _UpstreamError(f"LLM connection error: {type(e).__name__}")
+                if yielded:
+                    raise err from e
+                last = err
+            except LLMBusy:
+                self.metrics.observe(site, base, "shed")
+                health.probing = False
+                raise
+            except BaseException:
+                health.probing = False
+                raise
+            else:
+                elapsed = time.monotonic() - started
+                self.metrics.observe(site, base, meta.get("status", 200), elapsed, meta.get("usage"))
+                self.router.record(base, True, elapsed)
+                return
+
+            failed.append(base)
+            log.warning("LLM stream failed on %s (attempt %d): %s", base, attempt + 1, str(last)[:120])
+            if attempt < self.router.max_retries:
+                await self._retry_pause(attempt, primary, failed, last)
+
+        raise LLMUnavailable(retry_after=(last.retry_after if last and last.retry_after else 10.0))
+
+    async def ask(
+        self,
+        api_key: str,
+        prompt: str,
+        system: str = "You are a helpful study assistant.",
+        model: Optional[str] = None,
+        max_tokens: int = 400,
+        temperature: float = 0.2,
+        *,
+        cache: bool = False,
+        cache_ttl: Optional[float] = None,
+        cache_if: Optional[Callable[[str], bool]] = None,
+        coalesce: Optional[bool] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        hedge: Optional[bool] = None,
+        site: str = "unknown",
+        schema: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        """
+        cache=True opts this call site into the response cache (only useful
+        for low-temperature, repeatable prompts). cache_if, when given, must
+        accept the reply for it to be stored (e.g. it parses), so one bad
+        reply is not served again for the whole TTL.
+        coalesce=True shares one upstream request between concurrent identical
+        calls; it defaults to the value of `cache`.
+        priority is the scheduler class ("interactive", "generation",
+        "background"). Raises LLMBusy when the request is shed, and
+        LLMUnavailable (a LLMBusy) when every retry/backend failed.
+        hedge=True races a second backend after the primary's p95 latency;
+        it defaults to on for interactive calls when LLM_HEDGE is enabled.
+        site labels the call for metrics (e.g. "quiz.phase1").
+        schema (a JSON Schema, see llm_schemas) requests constrained JSON
+        output where the backend supports it; the reply is still a string.
+        deadline (see llm_deadline) caps the call, retries included, at the
+        operation's remaining budget; DeadlineExceeded when it runs out.
+        """
+        prompt = f"Answer in English only.\n\n{prompt or ''}"
+        system = system or "You are a helpful study assistant."
+        coalesce = cache if coalesce is None else bool(coalesce)
+        if hedge is None:
+            hedge = self.router.hedge and priority == PRIORITY_INTERACTIVE
+
+        target = self._resolve(api_key, model)
+        if not target["base"]:
+            return "LLM misconfigured: missing base_url."
+
+        use_cache = bool(cache and self.cache is not None)
+        key = None
+        if use_cache or coalesce:
+            key = self._cache_key(
+                target,
+                prompt=prompt,
+                system=system,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                schema=schema,
+            )
+
+        if use_cache:
+            hit = self.cache.get(key)
+            if hit is not None:
+                self.metrics.cache_hit(site)
+                return hit
+
+        async def _fetch() -> str:
+            try:
+                text = await self._complete_routed(
+                    target,
+                    hedge=bool(hedge),
+                    site=site,
+                    prompt=prompt,
+                    system=system,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    priority=priority,
+                    schema=schema,
+                    deadline=deadline,
+                )
+            except _UpstreamError as e:
+                return str(e)
+            if use_cache and text and (cache_if is None or cache_if(text)):
+                self.cache.set(key, text, ttl_s=cache_ttl)
+            return text
+
+        if coalesce:
+            return await self.inflight.do(key, _fetch)
+        return await _fetch()
+
+    async def ask_choices(
+        self,
+        api_key: str,
+        prompt: str,
+        system: str = "You are a helpful study assistant.",
+        model: Optional[str] = None,
+        max_tokens: int = 400,
+        temperature: float = 0.2,
+        *,
+        n: int = 2,
+        priority: str = PRIORITY_INTERACTIVE,
+        site: str = "unknown",
+        schema: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[str]:
+        """
+        n independent samples of the same prompt. One request with the `n`
+        parameter when the backend supports it (see supports_n), otherwise
+        n concurrent ask() calls. Never cached or coalesced. An error comes
+        back as a single-item list holding the ask() error text.
+        """
+        n = max(1, int(n))
+        target = self._resolve(api_key, model)
+        if n == 1 or not self.supports_n or target["use_responses"]:
+            return list(
+                await asyncio.gather(
+                    *(
+                        self.ask(
+                            api_key,
+                            prompt,
+                            system,
+                            model,
+                            max_tokens,
+                            temperature,
+                            coalesce=False,
+                            priority=priority,
+                            site=site,
+                            schema=schema,
+                            deadline=deadline,
+                        )
+                        for _ in range(n)
+                    )
+                )
+            )
+
+        if not target["base"]:
+            return ["LLM misconfigured: missing base_url."]
+
+        try:
+            out = await self._complete_routed(
+                target,
+                hedge=False,
+                site=site,
+                prompt=f"Answer in English only.\n\n{prompt or ''}",
+                system=system or "You are a helpful study assistant.",
+                max_tokens=max_tokens,
+                temperature=temperature,
+                priority=priority,
+                choices=n,
+                schema=schema,
+                deadline=deadline,
+            )
+        except _UpstreamError as e:
+            return [str(e)]
+        return list(out) if isinstance(out, list) else [out]
+
+    async def ask_stream(
+        self,
+        api_key: str,
+        prompt: str,
+        system: str = "You are a helpful study assistant.",
+        model: Optional[str] = None,
+        max_tokens: int = 400,
+        temperature: float = 0.2,
+        *,
+        cache: bool = False,
+        cache_ttl: Optional[float] = None,
+        coalesce: Optional[bool] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        site: str = "unknown",
+    ) -> AsyncIterator[str]:
+        """
+        Same as ask(), but yields text deltas as the backend streams them (SSE).
+        Errors are yielded as a single chunk with the same text ask() returns.
+        A cache hit is yielded as one chunk; coalesced readers get every chunk
+        of the shared stream from the start. Raises LLMBusy when shed and
+        LLMUnavailable when every backend failed before the first chunk.
+        """
+        prompt = f"Answer in English only.\n\n{prompt or ''}"
+        system = system or "You are a helpful study assistant."
+        coalesce = cache if coalesce is None else bool(coalesce)
+
+        target = self._resolve(api_key, model)
+        if not target["base"]:
+            yield "LLM misconfigured: missing base_url."
+            return
+
+        use_cache = bool(cache and self.cache is not None)
+        key = None
+        if use_cache or coalesce:
+            key = self._cache_key(
+                target, prompt=prompt, system=system, max_tokens=max_tokens, temperature=temperature
+            )
+
+        if use_cache:
+            hit = self.cache.get(key)
+            if hit is not None:
+                self.metrics.cache_hit(site)
+                yield hit
+                return
+
+        async def _upstream() -> AsyncIterator[str]:
+            parts: list[str] = []
+            async for part in self._stream_routed(
+                target,
+                site=site,
+                prompt=prompt,
+                system=system,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                priority=priority,
+            ):
+                parts.append(part)
+                yield part
+            if use_cache:
+                self.cache.set(key, "".join(parts), ttl_s=cache_ttl)
+
+        source = self.inflight.stream(key, _upstream) if coalesce else _upstream()
+        try:
+            async for part in source:
+                yield part
+        except _UpstreamError as e:
+            yield str(e)
+        finally:
+            await source.aclose()
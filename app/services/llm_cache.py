@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger("MentraAI")
+
+
+class LLMCache:
+    """
+    Two-tier response cache for deterministic LLM calls:
+    - L1: in-process LRU (OrderedDict), bounded by max_items
+    - L2: SQLite table `llm_cache`, bounded by max_rows
+
+    Entries expire after their TTL. Only successful responses are stored
+    (LLMClient never caches error strings).
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str],
+        *,
+        max_items: int = 512,
+        max_rows: int = 5000,
+        ttl_s: float = 24 * 3600,
+    ):
+        self.db_path = db_path
+        self.max_items = max(1, int(max_items))
+        self.max_rows = max(1, int(max_rows))
+        self.ttl_s = float(ttl_s)
+
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._writes = 0
+
+        self.hits_mem = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        if self.db_path:
+            self._init_db()
+
+    # -------------------------
+    # Keys
+    # -------------------------
+    @staticmethod
+    def make_key(
+        *,
+        backend: str,
+        model: str,
+        system: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        extra: Any = None,
+    ) -> str:
+        raw = json.dumps(
+            [backend, model, system, prompt, round(float(temperature), 4), int(max_tokens), extra],
+            ensure_ascii=False,
+            separators=(",", ":"),
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # -------------------------
+    # SQLite
+    # -------------------------
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_hit REAL NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache(expires_at)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache(last_hit)")
+            con.commit()
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        try:
+            with self._connect() as con:
+                row = con.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key=? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if not row:
+                    return None
+                con.execute("UPDATE llm_cache SET last_hit=? WHERE key=?", (now, key))
+                con.commit()
+                return float(row["expires_at"]), str(row["value"])
+        except Exception:
+            log.warning("LLM cache read failed", exc_info=True)
+            return None
+
+    def _disk_set(self, key: str, value: str, now: float, expires_at: float) -> None:
+        try:
+            with self._connect() as con:
+                con.execute(
+                    """
+                    INSERT INTO llm_cache(key, value, created_at, expires_at, last_hit)
+                    VALUES (?,?,?,?,?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        value=excluded.value,
+                        created_at=excluded.created_at,
+                        expires_at=excluded.expires_at,
+                        last_hit=excluded.last_hit
+                    """,
+                    (key, value, now, expires_at, now),
+                )
+
+                # prune every ~50 writes: expired first, then least recently hit
+                self._writes += 1
+                if self._writes % 50 == 1:
+                    con.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+                    n = int(con.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] or 0)
+                    if n > self.max_rows:
+                        cur = con.execute(
+                            """
+                            DELETE FROM llm_cache WHERE key IN (
+                                SELECT key FROM llm_cache ORDER BY last_hit ASC LIMIT ?
+                            )
+                            """,
+                            (n - self.max_rows,),
+                        )
+                        self.evictions += int(cur.rowcount or 0)
+                con.commit()
+        except Exception:
+            log.warning("LLM cache write failed", exc_info=True)
+
+    # -------------------------
+    # Public API
+    # -------------------------
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+
+        hit = self._mem.get(key)
+        if hit is not None:
+            expires_at, value = hit
+            if expires_at > now:
+                self._mem.move_to_end(key)
+                self.hits_mem += 1
+                return value
+            self._mem.pop(key, None)
+
+        if self.db_path:
+            disk = self._disk_get(key, now)
+            if disk is not None:
+                self._mem_put(key, disk[1], disk[0])
+                self.hits_disk += 1
+                return disk[1]
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str, *, ttl_s: Optional[float] = None) -> None:
+        value = (value or "").strip()
+        if not value:
+            return
+
+        now = time.time()
+        expires_at = now + float(ttl_s if ttl_s is not None else self.ttl_s)
+
+        self._mem_put(key, value, expires_at)
+        if self.db_path:
+            self._disk_set(key, value, now, expires_at)
+        self.stores += 1
+
+    def _mem_put(self, key: str, value: str, expires_at: float) -> None:
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._mem.clear()
+        if self.db_path:
+            with self._connect() as con:
+                con.execute("DELETE FROM llm_cache")
+                con.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits_mem + self.hits_disk + self.misses
+        hits = self.hits_mem + self.hits_disk
+        return {
+            "hits_mem": self.hits_mem,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "mem_items": len(self._mem),
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+        }
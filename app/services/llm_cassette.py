@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+log = logging.getLogger("MentraAI")
+
+# Only these response headers are kept in the cassette
+_KEEP_HEADERS = ("content-type", "retry-after")
+
+
+class CassetteMiss(Exception):
+    """Replay mode got a request that was never recorded."""
+
+
+def request_key(request: httpx.Request) -> str:
+    """
+    Stable key for an LLM request: path + canonical JSON body. Host and
+    auth headers are ignored, so a cassette recorded against one backend
+    replays against another with the same API flavour.
+    """
+    try:
+        body: Any = json.loads(request.content or b"{}")
+        body_s = json.dumps(body, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    except Exception:
+        body_s = (request.content or b"").decode("utf-8", errors="replace")
+
+    path = request.url.path.rstrip("/")
+    # ".../v1/chat/completions" and ".../openai/v1/chat/completions" match
+    for suffix in ("/chat/completions", "/responses"):
+        if path.endswith(suffix):
+            path = suffix
+            break
+
+    raw = f"{request.method} {path}\n{body_s}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCassette:
+    """
+    Record / replay LLM HTTP traffic.
+
+    The cassette is gzip-compressed JSONL, one interaction per line:
+    {"key", "status", "headers", "body"}. Recording appends (a new gzip
+    member per write). Identical requests recorded several times (e.g.
+    high-temperature quiz prompts) are replayed in recorded order, then
+    cycle.
+    """
+
+    def __init__(self, path: str, mode: str = "replay"):
+        mode = (mode or "").strip().lower()
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode!r}")
+
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+        if self.mode == "replay":
+            self._load()
+
+    # -------------------------
+    # Storage
+    # -------------------------
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            log.warning("LLM cassette not found: %s (every request will miss)", self.path)
+            return
+        n = 0
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except Exception:
+                    continue
+                self._entries.setdefault(item["key"], []).append(item)
+                n += 1
+        log.info("LLM cassette loaded: %s (%d interactions)", self.path, n)
+
+    def _append(self, item: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        line = json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            self._entries.setdefault(item["key"], []).append(item)
+            self.recorded += 1
+
+    def _next(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            items = self._entries.get(key)
+            if not items:
+                return None
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+            return items[i % len(items)]
+
+    # -------------------------
+    # httpx integration
+    # -------------------------
+    def transport(self, inner: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncBaseTransport:
+        return _CassetteTransport(self, inner)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "keys": len(self._entries),
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+        }
+
+
+class _CassetteTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: LLMCassette, inner: Optional[httpx.AsyncBaseTransport]):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+
+        if self.cassette.mode == "replay":
+            item = self.cassette._next(key)
+            if item is None:
+                self.cassette.misses += 1
+                raise CassetteMiss(f"No recorded LLM response for {request.method} {request.url.path}")
+            self.cassette.replayed += 1
+            return httpx.Response(
+                status_code=int(item["status"]),
+                headers=item.get("headers") or {},
+                content=str(item.get("body") or "").encode("utf-8"),
+                request=request,
+            )
+
+        # record: forward, buffer the full body (SSE included), store it
+        if self.inner is None:
+            raise RuntimeError("Cassette in record mode needs an inner transport")
+        response = await self.inner.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+
+        headers = {k: response.headers[k] for k in _KEEP_HEADERS if k in response.headers}
+        self.cassette._append(
+            {
+                "key": key,
+                "status": response.status_code,
+                "headers": headers,
+                "body": body.decode("utf-8", errors="replace"),
+            }
+        )
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=body,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        if self.inner is not None:
+            await self.inner.aclose()
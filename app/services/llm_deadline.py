@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from app.services.llm_scheduler import LLMBusy
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(LLMBusy):
+    """
+    The operation's time budget ran out before the LLM answered.
+    Subclasses LLMBusy so callers without partial results show the same
+    "try again" message.
+    """
+
+    def __init__(self, message: str = "This took longer than its time budget. Try again in a moment.", *, retry_after: float = 5.0):
+        super().__init__(message, retry_after=retry_after)
+
+
+class Deadline:
+    """
+    Absolute time budget for one user-facing operation (a command), passed
+    down to every LLM call it makes. Each call gets at most the time left,
+    so a slow backend ends the operation at its SLA instead of after
+    several full client timeouts.
+    """
+
+    def __init__(self, seconds: float):
+        self.budget = max(0.0, float(seconds))
+        self.expires_at = time.monotonic() + self.budget
+
+    @classmethod
+    def after(cls, seconds: Optional[float]) -> Optional["Deadline"]:
+        """
+        Deadline `seconds` from now; None (no deadline) for seconds <= 0.
+        """
+        if not seconds or seconds <= 0:
+            return None
+        return cls(seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def cap(self, timeout: float) -> float:
+        """
+        `timeout` shortened to the time left.
+        """
+        return min(float(timeout), self.remaining())
+
+    async def run(self, aw: Awaitable[T]) -> T:
+        """
+        Await `aw` for at most the time left; DeadlineExceeded after that.
+        """
+        if self.expired:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            raise DeadlineExceeded()
+        try:
+            return await asyncio.wait_for(aw, self.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded() from None
+
+
+def expired(deadline: Optional[Deadline]) -> bool:
+    return deadline is not None and deadline.expired
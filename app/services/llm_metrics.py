@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets (seconds): LLM calls range from sub-second cache-warm
+# local calls to 30s+ plan chunks.
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+
+def _esc(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: Any) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_esc(v)}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def parse_usage(data: Any) -> Dict[str, int]:
+    """
+    Token counts from an OpenAI-style `usage` block (chat or /responses),
+    Groq's x_groq.usage, or Ollama's native counters. Missing -> {}.
+    """
+    if not isinstance(data, dict):
+        return {}
+
+    usage = data.get("usage")
+    if not isinstance(usage, dict):
+        usage = (data.get("x_groq") or {}).get("usage") if isinstance(data.get("x_groq"), dict) else None
+    if not isinstance(usage, dict):
+        resp = data.get("response")
+        usage = resp.get("usage") if isinstance(resp, dict) else None
+    if not isinstance(usage, dict):
+        if "prompt_eval_count" in data or "eval_count" in data:
+            usage = {"prompt_tokens": data.get("prompt_eval_count"), "completion_tokens": data.get("eval_count")}
+        else:
+            return {}
+
+    out: Dict[str, int] = {}
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens"))
+    completion = usage.get("completion_tokens", usage.get("output_tokens"))
+    try:
+        if prompt is not None:
+            out["prompt"] = int(prompt)
+        if completion is not None:
+            out["completion"] = int(completion)
+    except (TypeError, ValueError):
+        return {}
+    return out
+
+
+def render_gauges(gauges: Optional[List[Tuple[str, str, List[Tuple[Dict[str, Any], float]]]]]) -> List[str]:
+    """
+    Prometheus lines for (name, help, [(labels, value), ...]) gauges.
+    """
+    lines: List[str] = []
+    for name, help_text, samples in gauges or []:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(**labels)} {_num(value)}")
+    return lines
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, v: float) -> None:
+        self.total += 1
+        self.sum += v
+        for i, b in enumerate(self.buckets):
+            if v <= b:
+                self.counts[i] += 1
+
+
+class LLMMetrics:
+    """
+    In-process LLM metrics, labelled by call site and backend:
+    - requests by HTTP status (or "error" / "shed")
+    - latency histogram
+    - prompt / completion tokens from the usage block
+    - cache hits
+
+    render() emits Prometheus text exposition format (0.0.4).
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, str], int] = {}
+        self._latency: Dict[Tuple[str, str], _Histogram] = {}
+        self._tokens: Dict[Tuple[str, str, str], int] = {}
+        self._cache_hits: Dict[str, int] = {}
+
+    def observe(
+        self,
+        site: str,
+        backend: str,
+        status: Any,
+        latency_s: Optional[float] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> None:
+        site = site or "unknown"
+        with self._lock:
+            k = (site, backend, str(status))
+            self._requests[k] = self._requests.get(k, 0) + 1
+
+            if latency_s is not None:
+                h = self._latency.get((site, backend))
+                if h is None:
+                    h = self._latency[(site, backend)] = _Histogram(self.buckets)
+                h.observe(float(latency_s))
+
+            for kind, n in (usage or {}).items():
+                tk = (site, backend, kind)
+                self._tokens[tk] = self._tokens.get(tk, 0) + int(n)
+
+    def cache_hit(self, site: str) -> None:
+        site = site or "unknown"
+        with self._lock:
+            self._cache_hits[site] = self._cache_hits.get(site, 0) + 1
+
+    def by_site(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per call site totals: calls, seconds, tokens (for logs / admin views).
+        """
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for (site, _backend), h in self._latency.items():
+                row = out.setdefault(site, {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+                row["calls"] += h.total
+                row["seconds"] += h.sum
+            for (site, _backend, kind), n in self._tokens.items():
+                row = out.setdefault(site, {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+                row[f"{kind}_tokens"] = row.get(f"{kind}_tokens", 0) + n
+        return out
+
+    def render(self, gauges: Optional[List[Tuple[str, str, List[Tuple[Dict[str, Any], float]]]]] = None) -> str:
+        lines: List[str] = []
+        with self._lock:
+            lines.append("# HELP mentra_llm_requests_total LLM upstream requests by call site, backend and status.")
+            lines.append("# TYPE mentra_llm_requests_total counter")
+            for (site, backend, status), n in sorted(self._requests.items()):
+                lines.append(f"mentra_llm_requests_total{_labels(site=site, backend=backend, status=status)} {n}")
+
+            lines.append("# HELP mentra_llm_request_duration_seconds LLM upstream request latency.")
+            lines.append("# TYPE mentra_llm_request_duration_seconds histogram")
+            for (site, backend), h in sorted(self._latency.items()):
+                for b, c in zip(h.buckets, h.counts):
+                    lines.append(
+                        "mentra_llm_request_duration_seconds_bucket"
+                        f"{_labels(site=site, backend=backend, le=_num(b))} {c}"
+                    )
+                lines.append(
+                    "mentra_llm_request_duration_seconds_bucket"
+                    f"{_labels(site=site, backend=backend, le='+Inf')} {h.total}"
+                )
+                lines.append(f"mentra_llm_request_duration_seconds_sum{_labels(site=site, backend=backend)} {_num(h.sum)}")
+                lines.append(f"mentra_llm_request_duration_seconds_count{_labels(site=site, backend=backend)} {h.total}")
+
+            lines.append("# HELP mentra_llm_tokens_total Tokens reported by the backend usage block.")
+            lines.append("# TYPE mentra_llm_tokens_total counter")
+            for (site, backend, kind), n in sorted(self._tokens.items()):
+                lines.append(f"mentra_llm_tokens_total{_labels(site=site, backend=backend, kind=kind)} {n}")
+
+            lines.append("# HELP mentra_llm_cache_hits_total Responses served from the LLM cache.")
+            lines.append("# TYPE mentra_llm_cache_hits_total counter")
+            for site, n in sorted(self._cache_hits.items()):
+                lines.append(f"mentra_llm_cache_hits_total{_labels(site=site)} {n}")
+
+        lines.extend(render_gauges(gauges))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.services.llm_scheduler import LLMBusy
+
+log = logging.getLogger("MentraAI")
+
+# Statuses worth retrying (possibly on another backend)
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(LLMBusy):
+    """
+    Every retry / fallback backend failed (or all circuits are open).
+    Subclasses LLMBusy so callers show the same "try again" message.
+    """
+
+    def __init__(self, message: str = "LLM backends are unavailable right now. Try again shortly.", *, retry_after: float = 10.0):
+        super().__init__(message, retry_after=retry_after)
+
+
+@dataclass
+class LLMBackend:
+    """
+    One OpenAI-compatible backend the router may fail over to.
+    """
+
+    name: str
+    base_url: str
+    model: str
+    api_key: str = ""
+    use_responses: bool = False
+
+    def target(self) -> Dict[str, Any]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return {
+            "name": self.name,
+            "base": self.base_url.rstrip("/"),
+            "model": self.model,
+            "headers": headers,
+            "use_responses": self.use_responses,
+        }
+
+
+def backends_from_env(names: str) -> List[LLMBackend]:
+    """
+    Build fallback backends from a comma-separated list of presets:
+    local, groq, openai. Remote presets without an API key are skipped.
+    """
+    out: List[LLMBackend] = []
+    for raw in (names or "").split(","):
+        name = raw.strip().lower()
+        if not name:
+            continue
+
+        if name == "local":
+            out.append(
+                LLMBackend(
+                    name="local",
+                    base_url=os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:11434/v1"),
+                    model=os.getenv("DEFAULT_MODEL", "llama3.1"),
+                )
+            )
+        elif name == "groq":
+            key = os.getenv("GROQ_API_KEY", "").strip()
+            if not key:
+                log.warning("LLM fallback 'groq' skipped: GROQ_API_KEY not set")
+                continue
+            out.append(
+                LLMBackend(
+                    name="groq",
+                    base_url=os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1"),
+                    model=os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"),
+                    api_key=key,
+                )
+            )
+        elif name == "openai":
+            key = os.getenv("OPENAI_API_KEY", "").strip()
+            if not key:
+                log.warning("LLM fallback 'openai' skipped: OPENAI_API_KEY not set")
+                continue
+            out.append(
+                LLMBackend(
+                    name="openai",
+                    base_url=os.getenv("OPENAI_REMOTE_BASE_URL", "").strip() or "https://api.openai.com/v1",
+                    model=os.getenv("OPENAI_REMOTE_MODEL", "").strip() or "gpt-4.1",
+                    api_key=key,
+                    use_responses=True,
+                )
+            )
+        else:
+            log.warning("Unknown LLM fallback backend: %s", name)
+    return out
+
+
+class BackendHealth:
+    """
+    Rolling latency / error window for one backend plus a circuit breaker:
+    closed -> open (after repeated failures) -> half-open (one probe) -> closed.
+    """
+
+    def __init__(self, *, window: int = 20, failures_to_open: int = 5, cooldown_s: float = 30.0):
+        self.samples: Deque[Tuple[bool, float]] = deque(maxlen=max(4, int(window)))
+        self.failures_to_open = max(1, int(failures_to_open))
+        self.base_cooldown_s = float(cooldown_s)
+        self.cooldown_s = float(cooldown_s)
+
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.open_until <= 0:
+            return "closed"
+        if time.monotonic() < self.open_until:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        st = self.state
+        if st == "closed":
+            return True
+        if st == "half_open" and not self.probing:
+            return True
+        return False
+
+    def on_dispatch(self) -> None:
+        if self.state == "half_open":
+            self.probing = True
+
+    def record(self, ok: bool, latency_s: float) -> None:
+        self.samples.append((bool(ok), float(latency_s)))
+
+        if ok:
+            self.consecutive_failures = 0
+            if self.open_until:
+                log.info("LLM backend circuit closed after successful probe")
+            self.open_until = 0.0
+            self.probing = False
+            self.cooldown_s = self.base_cooldown_s
+            return
+
+        self.consecutive_failures += 1
+        half_open = self.state == "half_open"
+        too_many = self.consecutive_failures >= self.failures_to_open
+        bad_window = len(self.samples) >= self.samples.maxlen // 2 and self.error_rate() >= 0.5
+
+        if half_open or too_many or bad_window:
+            if half_open:
+                # failed probe: back off harder
+                self.cooldown_s = min(300.0, self.cooldown_s * 2)
+            self.open_until = time.monotonic() + self.cooldown_s
+            self.probing = False
+            self.opened += 1
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for ok, _ in self.samples if not ok) / len(self.samples)
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        lat = sorted(l for ok, l in self.samples if ok)
+        if not lat:
+            return None
+        i = min(len(lat) - 1, max(0, int(round(q * (len(lat) - 1)))))
+        return lat[i]
+
+    def score(self) -> float:
+        """
+        Lower is better: median latency inflated by the error rate.
+        """
+        p50 = self.latency_quantile(0.5)
+        return (p50 if p50 is not None else 1.0) * (1.0 + 4.0 * self.error_rate())
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.latency_quantile(0.5)
+        p95 = self.latency_quantile(0.95)
+        return {
+            "state": self.state,
+            "samples": len(self.samples),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_s": round(p50, 3) if p50 is not None else None,
+            "p95_s": round(p95, 3) if p95 is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+        }
+
+
+class LLMRouter:
+    """
+    Orders candidate backends by health, decides retry backoff and hedge
+    delays. LLMClient does the actual HTTP calls.
+    """
+
+    def __init__(
+        self,
+        fallbacks: Optional[List[LLMBackend]] = None,
+        *,
+        max_retries: int = 2,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 8.0,
+        breaker_failures: int = 5,
+        breaker_cooldown_s: float = 30.0,
+        hedge: bool = False,
+        hedge_min_delay_s: float = 1.5,
+        hedge_max_delay_s: float = 8.0,
+    ):
+        self.fallbacks = list(fallbacks or [])
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base_s = float(backoff_base_s)
+        self.backoff_max_s = float(backoff_max_s)
+        self.breaker_failures = int(breaker_failures)
+        self.breaker_cooldown_s = float(breaker_cooldown_s)
+        self.hedge = bool(hedge)
+        self.hedge_min_delay_s = float(hedge_min_delay_s)
+        self.hedge_max_delay_s = float(hedge_max_delay_s)
+
+        self._health: Dict[str, BackendHealth] = {}
+        self.retries = 0
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def health(self, base: str) -> BackendHealth:
+        h = self._health.get(base)
+        if h is None:
+            h = BackendHealth(
+                failures_to_open=self.breaker_failures,
+                cooldown_s=self.breaker_cooldown_s,
+            )
+            self._health[base] = h
+        return h
+
+    def candidates(self, primary: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Primary target first (if its circuit allows), then healthy fallbacks
+        sorted by score. Empty when every circuit is open.
+        """
+        out: List[Dict[str, Any]] = []
+        if self.health(primary["base"]).available():
+            out.append(primary)
+
+        extra = [
+            b.target()
+            for b in self.fallbacks
+            if b.base_url.rstrip("/") != primary["base"]
+        ]
+        extra = [t for t in extra if self.health(t["base"]).available()]
+        extra.sort(key=lambda t: self.health(t["base"]).score())
+        return out + extra
+
+    def record(self, base: str, ok: bool, latency_s: float) -> None:
+        h = self.health(base)
+        was_open = h.state != "closed"
+        h.record(ok, latency_s)
+        if not ok and h.state == "open" and not was_open:
+            log.warning("LLM backend circuit opened: %s (%s)", base, h.snapshot())
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Full-jitter exponential backoff; Retry-After wins when it is longer.
+        """
+        cap = min(self.backoff_max_s, self.backoff_base_s * (2 ** max(0, attempt)))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, min(float(retry_after), self.backoff_max_s * 4))
+        return delay
+
+    def hedge_delay(self, base: str) -> float:
+        p95 = self.health(base).latency_quantile(0.95)
+        if p95 is None:
+            return self.hedge_max_delay_s
+        return max(self.hedge_min_delay_s, min(self.hedge_max_delay_s, p95))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "backends": {base: h.snapshot() for base, h in self._health.items()},
+        }
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+log = logging.getLogger("MentraAI")
+
+# -----------------------------
+# Priority classes
+# -----------------------------
+PRIORITY_INTERACTIVE = "interactive"  # /ask, chat answers, intent routing, web agent
+PRIORITY_GENERATION = "generation"    # quiz / flashcards generation
+PRIORITY_BACKGROUND = "background"    # long multi-chunk jobs (/plan)
+PRIORITY_SPECULATIVE = "speculative"  # prefetch of a likely next command (see Prefetcher)
+
+_PRIORITY_RANK = {
+    PRIORITY_INTERACTIVE: 0,
+    PRIORITY_GENERATION: 1,
+    PRIORITY_BACKGROUND: 2,
+    PRIORITY_SPECULATIVE: 3,
+}
+
+# How long a request may wait for a slot before it is shed
+_MAX_WAIT_S = {
+    PRIORITY_INTERACTIVE: 20.0,
+    PRIORITY_GENERATION: 60.0,
+    PRIORITY_BACKGROUND: 180.0,
+    # a prefetch that has to queue is better dropped than served late
+    PRIORITY_SPECULATIVE: 15.0,
+}
+
+# Statuses that mean "back off"
+_OVERLOAD_STATUSES = {429, 502, 503, 504}
+
+
+class LLMBusy(Exception):
+    """
+    Raised when the scheduler sheds a request (queue full or waited too long).
+    """
+
+    def __init__(self, message: str = "LLM backend is busy. Try again in a moment.", *, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = float(retry_after)
+
+
+def _rank(priority: str) -> int:
+    return _PRIORITY_RANK.get(priority, _PRIORITY_RANK[PRIORITY_INTERACTIVE])
+
+
+class TokenBucket:
+    """
+    Request-rate limiter sized to provider limits (requests per minute).
+    rpm <= 0 disables it.
+    """
+
+    def __init__(self, rpm: float, *, burst: Optional[float] = None):
+        self.rate = max(0.0, float(rpm)) / 60.0
+        self.capacity = float(burst if burst is not None else max(1.0, float(rpm) / 6.0))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float) -> None:
+        if not self.enabled:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """
+        Seconds until one token is available (0 = now).
+        """
+        now = time.monotonic() if now is None else now
+        if now < self.paused_until:
+            return self.paused_until - now
+        if not self.enabled:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if self.enabled:
+            self._refill(time.monotonic())
+            self.tokens = max(0.0, self.tokens - 1.0)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + max(0.0, float(seconds)))
+
+
+class Slot:
+    """
+    Handed to the caller while it holds a backend slot; report() feeds the
+    outcome back into the AIMD controller.
+    """
+
+    def __init__(self, gate: "BackendGate", priority: str, waited_s: float):
+        self.gate = gate
+        self.priority = priority
+        self.waited_s = waited_s
+        self.started = time.monotonic()
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+
+    def report(self, status: int, *, retry_after: Optional[float] = None) -> None:
+        self.status = int(status)
+        self.retry_after = retry_after
+
+
+class BackendGate:
+    """
+    Per-backend admission control:
+    - priority queue (interactive > generation > background, FIFO within a class)
+    - AIMD concurrency limit driven by latency and 429/5xx
+    - token bucket for provider request limits
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        min_limit: int = 1,
+        max_limit: int = 8,
+        initial_limit: Optional[int] = None,
+        rpm: float = 0,
+        target_latency_s: float = 20.0,
+        max_queue: int = 64,
+    ):
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(initial_limit if initial_limit is not None else self.max_limit)
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), self.limit))
+        self.target_latency_s = float(target_latency_s)
+        self.max_queue = max(1, int(max_queue))
+
+        self.bucket = TokenBucket(rpm)
+        self.active = 0
+
+        self._queue: List[Tuple[int, int, "asyncio.Future[None]", str]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        # observability
+        self.wait_ewma_s = 0.0
+        self.latency_ewma_s = 0.0
+        self.served = 0
+        self.shed = 0
+        self.overloads = 0
+
+    # -----------------------------
+    # Queue helpers
+    # -----------------------------
+    def depth(self, priority: Optional[str] = None) -> int:
+        if priority is None:
+            return sum(1 for _, _, fut, _ in self._queue if not fut.done())
+        r = _rank(priority)
+        return sum(1 for rk, _, fut, _ in self._queue if rk == r and not fut.done())
+
+    def ahead_of(self, priority: str) -> int:
+        """
+        Requests a new call of this priority would wait behind.
+        """
+        r = _rank(priority)
+        return sum(1 for rk, _, fut, _ in self._queue if rk <= r and not fut.done())
+
+    def _pump(self) -> None:
+        self._wakeup = None
+        while self._queue and self.active < int(self.limit):
+            rk, seq, fut, prio = self._queue[0]
+            if fut.done():
+                heapq.heappop(self._queue)
+                continue
+
+            delay = self.bucket.delay()
+            if delay > 0:
+                loop = asyncio.get_running_loop()
+                self._wakeup = loop.call_later(delay, self._pump)
+                return
+
+            heapq.heappop(self._queue)
+            self.bucket.take()
+            self.active += 1
+            fut.set_result(None)
+
+    # -----------------------------
+    # Acquire / release
+    # -----------------------------
+    async def acquire(self, priority: str, *, max_wait: Optional[float] = None) -> Slot:
+        queued_at = time.monotonic()
+
+        if (
+            not self._queue
+            and self.active < int(self.limit)
+            and self.bucket.delay() <= 0
+        ):
+            self.bucket.take()
+            self.active += 1
+            return Slot(self, priority, 0.0)
+
+        if self.depth() >= self.max_queue and _rank(priority) > 0:
+            self.shed += 1
+            raise LLMBusy(retry_after=max(1.0, self.wait_ewma_s))
+
+        loop = asyncio.get_running_loop()
+        fut: "asyncio.Future[None]" = loop.create_future()
+        heapq.heappush(self._queue, (_rank(priority), next(self._seq), fut, priority))
+        self._pump()
+
+        wait_cap = _MAX_WAIT_S.get(priority, 30.0) if max_wait is None else float(max_wait)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=wait_cap)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # granted right at the deadline: give the slot back
+                self._release_slot()
+            else:
+                fut.cancel()
+            self.shed += 1
+            raise LLMBusy(retry_after=max(1.0, self.wait_ewma_s))
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release_slot()
+            else:
+                fut.cancel()
+            raise
+
+        waited = time.monotonic() - queued_at
+        self.wait_ewma_s = 0.8 * self.wait_ewma_s + 0.2 * waited
+        return Slot(self, priority, waited)
+
+    def _release_slot(self) -> None:
+        self.active = max(0, self.active - 1)
+        self._pump()
+
+    def release(self, slot: Slot, *, failed: bool = False) -> None:
+        latency = time.monotonic() - slot.started
+        status = slot.status
+
+        if status in _OVERLOAD_STATUSES or failed:
+            # multiplicative decrease
+            self.overloads += 1
+            self.limit = max(float(self.min_limit), self.limit * 0.5)
+            if slot.retry_after:
+                self.bucket.pause(slot.retry_after)
+        elif status is not None and status < 400:
+            self.served += 1
+            self.latency_ewma_s = (
+                latency if self.latency_ewma_s <= 0 else 0.8 * self.latency_ewma_s + 0.2 * latency
+            )
+            if latency > self.target_latency_s:
+                self.limit = max(float(self.min_limit), self.limit * 0.9)
+            else:
+                # additive increase: ~+1 per "window" of successful calls
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / max(1.0, self.limit))
+
+        self._release_slot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "limit": round(self.limit, 2),
+            "active": self.active,
+            "queued": self.depth(),
+            "queued_by_priority": {p: self.depth(p) for p in _PRIORITY_RANK},
+            "wait_ewma_s": round(self.wait_ewma_s, 3),
+            "latency_ewma_s": round(self.latency_ewma_s, 3),
+            "served": self.served,
+            "shed": self.shed,
+            "overloads": self.overloads,
+        }
+
+
+class LLMScheduler:
+    """
+    Holds one BackendGate per backend (keyed by base URL).
+    """
+
+    def __init__(
+        self,
+        *,
+        min_concurrency: int = 1,
+        max_concurrency: int = 8,
+        rpm: float = 0,
+        target_latency_s: float = 20.0,
+        max_queue: int = 64,
+        rpm_by_backend: Optional[Dict[str, float]] = None,
+    ):
+        self.min_concurrency = int(min_concurrency)
+        self.max_concurrency = int(max_concurrency)
+        self.rpm = float(rpm)
+        self.target_latency_s = float(target_latency_s)
+        self.max_queue = int(max_queue)
+        self.rpm_by_backend = dict(rpm_by_backend or {})
+        self._gates: Dict[str, BackendGate] = {}
+
+    def gate(self, backend: str) -> BackendGate:
+        g = self._gates.get(backend)
+        if g is None:
+            g = BackendGate(
+                backend,
+                min_limit=self.min_concurrency,
+                max_limit=self.max_concurrency,
+                rpm=self.rpm_by_backend.get(backend, self.rpm),
+                target_latency_s=self.target_latency_s,
+                max_queue=self.max_queue,
+            )
+            self._gates[backend] = g
+        return g
+
+    @asynccontextmanager
+    async def slot(self, backend: str, priority: str = PRIORITY_INTERACTIVE) -> AsyncIterator[Slot]:
+        gate = self.gate(backend)
+        s = await gate.acquire(priority)
+        failed = False
+        try:
+            yield s
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            failed = s.status is None
+            raise
+        finally:
+            gate.release(s, failed=failed)
+
+    def queue_depth(self) -> int:
+        return sum(g.depth() for g in self._gates.values())
+
+    def position(self, priority: str = PRIORITY_INTERACTIVE) -> int:
+        return sum(g.ahead_of(priority) for g in self._gates.values())
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [g.snapshot() for g in self._gates.values()]
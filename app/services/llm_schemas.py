@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Optional
+
+# JSON Schemas for schema-constrained decoding (LLMClient.ask(schema=...)).
+# Written for OpenAI strict mode: every property required, no extra keys.
+# The "title" becomes the json_schema name sent to the backend.
+
+_STR: Dict[str, Any] = {"type": "string"}
+_NULLABLE_STR: Dict[str, Any] = {"type": ["string", "null"]}
+
+
+def _obj(title: Optional[str] = None, **props: Dict[str, Any]) -> Dict[str, Any]:
+    schema: Dict[str, Any] = {
+        "type": "object",
+        "properties": props,
+        "required": list(props),
+        "additionalProperties": False,
+    }
+    if title:
+        schema["title"] = title
+    return schema
+
+
+QUIZ_SCHEMA = _obj(
+    "quiz",
+    questions={
+        "type": "array",
+        "items": _obj(
+            question=_STR,
+            choices={"type": "array", "items": _STR},
+            answer={"type": "string", "enum": ["A", "B", "C", "D"]},
+            explanation=_STR,
+        ),
+    },
+)
+
+# QUIZ_LAZY_EXPLAIN: same questions without the explanation (added on demand)
+QUIZ_LEAN_SCHEMA = _obj(
+    "quiz",
+    questions={
+        "type": "array",
+        "items": _obj(
+            question=_STR,
+            choices={"type": "array", "items": _STR},
+            answer={"type": "string", "enum": ["A", "B", "C", "D"]},
+        ),
+    },
+)
+
+FLASHCARDS_SCHEMA = _obj(
+    "flashcards",
+    cards={"type": "array", "items": _obj(q=_STR, a=_STR)},
+)
+
+MENTRASCAN_SCHEMA = _obj(
+    "study_plan",
+    days={
+        "type": "array",
+        "items": _obj(
+            day={"type": "integer"},
+            timebox=_STR,
+            goal=_STR,
+            tasks={"type": "array", "items": _STR},
+            quiz={"type": "array", "items": _STR},
+        ),
+    },
+)
+
+INTENT_SCHEMA = _obj(
+    "intent",
+    intent={
+        "type": "string",
+        "enum": ["quiz", "ask", "flashcards", "plan", "stats", "rank", "topics", "resources", "unknown"],
+    },
+    topic=_NULLABLE_STR,
+    question=_NULLABLE_STR,
+    plan_request=_NULLABLE_STR,
+)
+
+
+def fast_json(raw: str) -> Optional[Dict[str, Any]]:
+    """
+    Fast path for structured replies: a plain json.loads of the whole text
+    (optionally inside one ``` fence). Returns the object, or None so the
+    caller can fall back to its tolerant parser.
+    """
+    s = (raw or "").strip()
+    if s.startswith("```"):
+        s = s.strip("`").strip()
+        if s[:4].lower() == "json":
+            s = s[4:].lstrip()
+    if not s.startswith("{"):
+        return None
+    try:
+        data = json.loads(s)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+log = logging.getLogger("MentraAI")
+
+
+class _Flight:
+    def __init__(self, task: "asyncio.Future[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class _SharedStream:
+    """
+    One upstream stream fanned out to several readers. Each reader gets every
+    chunk from the beginning, even if it joined late.
+    """
+
+    def __init__(self, source: AsyncIterator[str]):
+        self.parts: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0
+        self._cond = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for part in source:
+                async with self._cond:
+                    self.parts.append(part)
+                    self._cond.notify_all()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+            async with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    async def read(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            async with self._cond:
+                while i >= len(self.parts) and not self.done:
+                    await self._cond.wait()
+                chunk = self.parts[i:]
+                finished = self.done
+            for part in chunk:
+                yield part
+            i += len(chunk)
+            if finished and i >= len(self.parts):
+                if self.error is not None and not isinstance(self.error, asyncio.CancelledError):
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical LLM calls: the first caller starts the
+    upstream request, later callers with the same key await the same result.
+
+    Cancelling one waiter never cancels the shared request; it is cancelled
+    only when every waiter has gone away.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def inflight(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._calls[key] = flight
+            self.leaders += 1
+
+            def _forget(_task, key=key, flight=flight) -> None:
+                if self._calls.get(key) is flight:
+                    self._calls.pop(key, None)
+
+            flight.task.add_done_callback(_forget)
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters <= 0 and not flight.task.done():
+                # nobody is waiting anymore: drop the upstream request
+                if self._calls.get(key) is flight:
+                    self._calls.pop(key, None)
+                flight.task.cancel()
+
+    async def stream(
+        self, key: str, factory: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream(factory())
+            self._streams[key] = shared
+            self.leaders += 1
+
+            def _forget(_task, key=key, shared=shared) -> None:
+                if self._streams.get(key) is shared:
+                    self._streams.pop(key, None)
+
+            shared.task.add_done_callback(_forget)
+        else:
+            self.coalesced += 1
+
+        shared.readers += 1
+        try:
+            async for part in shared.read():
+                yield part
+        finally:
+            shared.readers -= 1
+            if shared.readers <= 0 and not shared.task.done():
+                if self._streams.get(key) is shared:
+                    self._streams.pop(key, None)
+                shared.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "inflight": self.inflight(),
+        }
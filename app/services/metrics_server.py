@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import hmac
+import logging
+from typing import Callable, List, Optional
+
+from aiohttp import web
+
+log = logging.getLogger("MentraAI")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def token_ok(header: Optional[str], token: str) -> bool:
+    """
+    Bearer check for the metrics endpoints. An empty token disables auth.
+    """
+    if not token:
+        return True
+    value = (header or "").strip()
+    if not value.lower().startswith("bearer "):
+        return False
+    return hmac.compare_digest(value[7:].strip(), token)
+
+
+async def start_metrics_server(
+    llm,
+    *,
+    host: str,
+    port: int,
+    token: str = "",
+    extra: Optional[List[Callable[[], str]]] = None,
+) -> web.AppRunner:
+    """
+    Bot-side HTTP listener serving GET /metrics (Prometheus text format).
+    `extra` callables append their own exposition text (e.g. quiz bank).
+    """
+
+    async def _metrics(request: web.Request) -> web.Response:
+        if not token_ok(request.headers.get("Authorization"), token):
+            return web.Response(status=401, text="Unauthorized")
+        text = llm.metrics_text() + "".join(fn() for fn in extra or [])
+        return web.Response(
+            body=text.encode("utf-8"),
+            headers={"Content-Type": PROMETHEUS_CONTENT_TYPE},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Metrics listener on http://%s:%d/metrics", host, port)
+    return runner
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+from app.utils.text import _tokens
+
+# Mersenne prime for the universal hash family (a*x + b) mod p
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SEED = 0x4D454E54  # fixed: signatures are persisted and must stay comparable
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    """
+    MinHash signatures over the same word tokens jaccard_sim() uses, plus
+    LSH banding: num_perm = bands * rows. Two texts share at least one band
+    bucket with probability 1 - (1 - J^rows)^bands, so with the default
+    16 x 4 a pair at Jaccard 0.6 collides ~89% of the time and one at 0.3
+    ~12% of the time; candidates are then checked against `threshold`.
+    """
+
+    def __init__(self, *, bands: int = 16, rows: int = 4, threshold: float = 0.6):
+        self.bands = int(bands)
+        self.rows = int(rows)
+        self.num_perm = self.bands * self.rows
+        self.threshold = float(threshold)
+        rng = random.Random(_SEED)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(self.num_perm)]
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        """
+        None for texts without any content token (they can't be compared).
+        """
+        hashes = [_token_hash(t) for t in _tokens(text)]
+        if not hashes:
+            return None
+        return tuple(min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in self._perms)
+
+    def buckets(self, sig: Sequence[int]) -> List[int]:
+        """
+        One bucket id per band (63-bit, so it fits a SQLite INTEGER).
+        """
+        out = []
+        for band in range(self.bands):
+            chunk = sig[band * self.rows : (band + 1) * self.rows]
+            raw = struct.pack(f"<H{self.rows}I", band, *chunk)
+            out.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little") >> 1)
+        return out
+
+    @staticmethod
+    def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+        """
+        Estimated Jaccard similarity of two signatures.
+        """
+        if not a or len(a) != len(b):
+            return 0.0
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+    def pack(self, sig: Sequence[int]) -> bytes:
+        return struct.pack(f"<{len(sig)}I", *sig)
+
+    def unpack(self, blob: Optional[bytes]) -> Optional[Tuple[int, ...]]:
+        if not blob or len(blob) != 4 * self.num_perm:
+            return None
+        return struct.unpack(f"<{self.num_perm}I", blob)
+
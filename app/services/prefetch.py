@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+from app.models.cards import Flashcard
+from app.models.quiz import QuizQuestion
+from app.services.flashcards_gen import generate_flashcards
+from app.services.llm_metrics import render_gauges
+from app.services.llm_scheduler import PRIORITY_SPECULATIVE
+from app.services.quiz_gen import (
+    _normalize_topic,
+    _signature,
+    _starter3,
+    generate_quiz_questions,
+)
+from app.services.quiz_seen import QuizSeenIndex
+
+log = logging.getLogger("MentraAI")
+
+KIND_QUIZ = "quiz"
+KIND_FLASHCARDS = "flashcards"
+
+
+class _Slot:
+    __slots__ = ("topic", "n", "task", "expires_at")
+
+    def __init__(self, topic: str, n: int, task: asyncio.Task, expires_at: float):
+        self.topic = topic
+        self.n = n
+        self.task = task
+        self.expires_at = expires_at
+
+
+class Prefetcher:
+    """
+    Speculative generation of a user's likely next command: after a quiz,
+    another quiz and flashcards on the same topic; after flashcards, a
+    quiz (what the flashcards intro suggests).
+
+    Each user has one slot per kind. The next matching command consumes
+    it; a slot that isn't used within `ttl_s` is dropped (its task
+    cancelled if still running). Speculation runs at PRIORITY_SPECULATIVE,
+    below every user-facing class, and only starts when the LLM queue is
+    empty and fewer than `max_inflight` speculative jobs are running, so
+    it never makes a real command wait.
+    """
+
+    def __init__(self, *, ttl_s: float = 600.0, max_inflight: int = 2, max_slots: int = 200):
+        self.ttl_s = float(ttl_s)
+        self.max_inflight = max(1, int(max_inflight))
+        self.max_slots = max(1, int(max_slots))
+        self._slots: Dict[Tuple[int, str], _Slot] = {}
+
+        # observability
+        self.started = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.failed = 0
+
+    # -----------------------------
+    # Slots
+    # -----------------------------
+    def inflight(self) -> int:
+        return sum(1 for s in self._slots.values() if not s.task.done())
+
+    def _drop(self, key: Tuple[int, str]) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is not None and not slot.task.done():
+            slot.task.cancel()
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, s in self._slots.items() if s.expires_at <= now]:
+            self._drop(key)
+            self.expired += 1
+
+    def _idle(self, llm) -> bool:
+        stats = getattr(llm, "queue_stats", None)
+        return not callable(stats) or int(stats().get("queued", 0) or 0) == 0
+
+    def _start(self, llm, key: Tuple[int, str], topic: str, n: int, coro: Awaitable[List[Any]]) -> bool:
+        self._purge()
+        slot = self._slots.get(key)
+        if slot is not None and slot.topic == topic and slot.n >= n:
+            coro.close()
+            return False  # already speculating this
+        if self.inflight() >= self.max_inflight or len(self._slots) >= self.max_slots or not self._idle(llm):
+            coro.close()
+            self.skipped += 1
+            return False
+
+        self._drop(key)
+        self._slots[key] = _Slot(topic, n, asyncio.ensure_future(self._run(key, coro)), time.monotonic() + self.ttl_s)
+        self.started += 1
+        return True
+
+    async def _run(self, key: Tuple[int, str], coro: Awaitable[List[Any]]) -> List[Any]:
+        try:
+            return list(await coro)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # LLMBusy included: the scheduler shed it, which is the point
+            self.failed += 1
+            log.info("Prefetch %s for user %s dropped: %s: %s", key[1], key[0], type(e).__name__, e)
+            return []
+
+    def _take(self, user_id: int, kind: str, topic: str) -> List[Any]:
+        """
+        The finished result for this user/kind/topic, removing the slot;
+        [] if there is none. A slot for another topic or still running is
+        left alone.
+        """
+        self._purge()
+        key = (int(user_id), kind)
+        slot = self._slots.get(key)
+        if slot is None or slot.topic != _normalize_topic(topic) or not slot.task.done():
+            self.misses += 1
+            return []
+        del self._slots[key]
+        if slot.task.cancelled():
+            self.misses += 1
+            return []
+        got = slot.task.result()
+        if got:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return got
+
+    # -----------------------------
+    # Speculation
+    # -----------------------------
+    def speculate_quiz(
+        self,
+        llm,
+        *,
+        api_key: str,
+        topic: str,
+        n: int,
+        store=None,
+        guild_id: Optional[int] = None,
+        user_id: int,
+        avoid: Optional[List[str]] = None,
+    ) -> bool:
+        """
+        Start generating a quiz on `topic` for this user. Questions are
+        filtered against the user's history but not recorded as seen
+        until take_quiz() hands them out.
+        """
+        topic_norm = _normalize_topic(topic)
+        return self._start(
+            llm,
+            (int(user_id), KIND_QUIZ),
+            topic_norm,
+            int(n),
+            generate_quiz_questions(
+                llm,
+                api_key=api_key,
+                topic=topic,
+                n=n,
+                store=store,
+                guild_id=guild_id,
+                user_id=user_id,
+                avoid=avoid,
+                priority=PRIORITY_SPECULATIVE,
+                record_seen=False,
+            ),
+        )
+
+    def speculate_flashcards(self, llm, *, api_key: str, topic: str, n: int, user_id: int) -> bool:
+        return self._start(
+            llm,
+            (int(user_id), KIND_FLASHCARDS),
+            _normalize_topic(topic),
+            int(n),
+            generate_flashcards(llm, api_key=api_key, topic=topic, n=n, priority=PRIORITY_SPECULATIVE),
+        )
+
+    # -----------------------------
+    # Consumption
+    # -----------------------------
+    def take_quiz(
+        self,
+        user_id: int,
+        topic: str,
+        n: int,
+        *,
+        store=None,
+        guild_id: Optional[int] = None,
+    ) -> List[QuizQuestion]:
+        """
+        Up to n prefetched questions the user still hasn't seen, recorded
+        as seen now.
+        """
+        got: List[QuizQuestion] = self._take(user_id, KIND_QUIZ, topic)
+        if not got:
+            return []
+
+        topic_norm = _normalize_topic(topic)
+        history = QuizSeenIndex.open(store, guild_id, user_id, topic_norm)
+        if history is not None:
+            # the user may have seen some since (another quiz, the bank)
+            got = [q for q in got if not history.seen(q.question, _signature(q.question, q.choices))][: max(0, n)]
+            history.record((_signature(q.question, q.choices), _starter3(q.question), q.question) for q in got)
+            return got
+
+        got = got[: max(0, n)]
+        if store is not None and guild_id is not None and hasattr(store, "add_quiz_seen"):
+            for q in got:
+                try:
+                    store.add_quiz_seen(
+                        guild_id, user_id, topic_norm, _signature(q.question, q.choices), _starter3(q.question), q.question
+                    )
+                except Exception:
+                    pass
+        return got
+
+    def take_flashcards(self, user_id: int, topic: str, n: int) -> List[Flashcard]:
+        """
+        The prefetched deck if it has at least n cards, else [].
+        """
+        got: List[Flashcard] = self._take(user_id, KIND_FLASHCARDS, topic)
+        return got[:n] if len(got) >= n else []
+
+    # -----------------------------
+    # Observability
+    # -----------------------------
+    def metrics_text(self) -> str:
+        counters = (
+            ("started", self.started),
+            ("skipped", self.skipped),
+            ("hits", self.hits),
+            ("misses", self.misses),
+            ("expired", self.expired),
+            ("failed", self.failed),
+        )
+        gauges = [
+            ("mentra_prefetch_slots", "Speculative results held or in progress.", [({}, len(self._slots))]),
+            ("mentra_prefetch_inflight", "Speculative generations running.", [({}, self.inflight())]),
+            (
+                "mentra_prefetch_events",
+                "Prefetch counters since start (started, hits, expired, ...).",
+                [({"event": k}, v) for k, v in counters],
+            ),
+        ]
+        return "\n".join(render_gauges(gauges)) + "\n"
+
+    async def stop(self) -> None:
+        tasks = [s.task for s in self._slots.values() if not s.task.done()]
+        for key in list(self._slots):
+            self._drop(key)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def after_quiz(
+    prefetch: Optional[Prefetcher],
+    llm,
+    bank=None,
+    *,
+    api_key: str,
+    topic: str,
+    n: int,
+    store=None,
+    guild_id: Optional[int] = None,
+    user_id: int,
+    flashcards_n: int = 10,
+) -> None:
+    """
+    Quiz finished: speculate another quiz (unless the bank already serves
+    this topic instantly) and flashcards on the same topic.
+    """
+    if prefetch is None:
+        return
+    if bank is None or not bank.stocks(topic):
+        prefetch.speculate_quiz(llm, api_key=api_key, topic=topic, n=n, store=store, guild_id=guild_id, user_id=user_id)
+    prefetch.speculate_flashcards(llm, api_key=api_key, topic=topic, n=flashcards_n, user_id=user_id)
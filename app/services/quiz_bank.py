@@ -0,0 +1,482 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Collection, Dict, Iterable, List, Optional
+
+from app.models.quiz import QuizQuestion
+from app.services.llm_deadline import Deadline
+from app.services.llm_metrics import render_gauges
+from app.services.llm_scheduler import LLMBusy, PRIORITY_BACKGROUND
+from app.services.quiz_seen import QuizSeenIndex
+from app.services.quiz_gen import (
+    QuizFeed,
+    _normalize_topic,
+    _q_only_signature,
+    _signature,
+    _starter3,
+    generate_quiz_questions,
+)
+
+log = logging.getLogger("MentraAI")
+
+
+class QuizBank:
+    """
+    Persistent per-topic pool of validated quiz questions (SQLite table
+    `quiz_bank`), kept between low_water and target by a background
+    refill loop. /quiz draws from it and only falls back to live
+    generation for custom or exhausted topics.
+
+    Questions are evicted after max_age_days or once served max_serves
+    times, so the pool keeps rotating.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        topics: Iterable[str],
+        *,
+        target: int = 30,
+        low_water: int = 10,
+        max_age_days: float = 14.0,
+        max_serves: int = 500,
+    ):
+        self.db_path = db_path
+        self.topics = [t.strip() for t in topics if (t or "").strip()]
+        self._stocked = {_normalize_topic(t) for t in self.topics}
+        self.target = max(1, int(target))
+        self.low_water = max(0, min(int(low_water), self.target))
+        self.max_age_s = float(max_age_days) * 86400
+        self.max_serves = max(1, int(max_serves))
+
+        self._task: Optional[asyncio.Task] = None
+        self._refilling: Optional[str] = None
+
+        self.draws = 0
+        self.served = 0
+        self.short_draws = 0
+        self.added = 0
+        self.evicted = 0
+        self.refills = 0
+        self.refill_failures = 0
+
+        self._init_db()
+
+    # -------------------------
+    # SQLite
+    # -------------------------
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quiz_bank (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT NOT NULL,
+                    sig TEXT NOT NULL,
+                    qsig TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    choices TEXT NOT NULL,
+                    answer_index INTEGER NOT NULL,
+                    explanation TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    served INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            con.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_quiz_bank_qsig ON quiz_bank(topic, qsig)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_quiz_bank_topic_served ON quiz_bank(topic, served)")
+            con.commit()
+
+    @staticmethod
+    def _row_to_question(row: sqlite3.Row) -> Optional[QuizQuestion]:
+        try:
+            return QuizQuestion(
+                question=row["question"],
+                choices=list(json.loads(row["choices"])),
+                answer_index=int(row["answer_index"]),
+                explanation=row["explanation"],
+            )
+        except Exception:
+            return None
+
+    # -------------------------
+    # Pool
+    # -------------------------
+    def stocks(self, topic: str) -> bool:
+        """
+        True for the configured topics the refill loop keeps stocked.
+        """
+        return _normalize_topic(topic) in self._stocked
+
+    def add(self, topic: str, questions: Iterable[QuizQuestion]) -> int:
+        """
+        Store validated questions; duplicates (same question text) are ignored.
+        """
+        topic_norm = _normalize_topic(topic)
+        now = time.time()
+        rows = [
+            (
+                topic_norm,
+                _signature(q.question, q.choices),
+                _q_only_signature(q.question),
+                q.question,
+                json.dumps(q.choices, ensure_ascii=False),
+                int(q.answer_index),
+                q.explanation,
+                now,
+            )
+            for q in questions
+        ]
+        if not rows:
+            return 0
+        with self._connect() as con:
+            before = con.total_changes
+            con.executemany(
+                """
+                INSERT OR IGNORE INTO quiz_bank
+                    (topic, sig, qsig, question, choices, answer_index, explanation, created_at)
+                VALUES (?,?,?,?,?,?,?,?)
+                """,
+                rows,
+            )
+            con.commit()
+            added = con.total_changes - before
+        self.added += added
+        return added
+
+    def draw(self, topic: str, n: int, *, exclude_sigs: Collection[str] = ()) -> List[QuizQuestion]:
+        """
+        Up to n pooled questions for a topic, least-served first, skipping
+        signatures the user has already seen (a set or a BloomFilter).
+        """
+        topic_norm = _normalize_topic(topic)
+        exclude = exclude_sigs
+        n = max(0, int(n))
+        self.draws += 1
+
+        with self._connect() as con:
+            rows = con.execute(
+                """
+                SELECT id, sig, question, choices, answer_index, explanation
+                FROM quiz_bank
+                WHERE topic=? AND created_at >= ? AND served < ?
+                ORDER BY served ASC, RANDOM()
+                LIMIT ?
+                """,
+                (topic_norm, time.time() - self.max_age_s, self.max_serves, n + min(len(exclude), 500)),
+            ).fetchall()
+
+            out: List[QuizQuestion] = []
+            ids: List[int] = []
+            starters: set[str] = set()
+            for r in rows:
+                if len(out) >= n:
+                    break
+                if r["sig"] in exclude:
+                    continue
+                q = self._row_to_question(r)
+                if q is None:
+                    continue
+                # same opening words read like duplicates inside one quiz
+                s3 = _starter3(q.question)
+                if s3 and s3 in starters:
+                    continue
+                starters.add(s3)
+                out.append(q)
+                ids.append(int(r["id"]))
+
+            if ids:
+                con.executemany("UPDATE quiz_bank SET served = served + 1 WHERE id=?", [(i,) for i in ids])
+                con.commit()
+
+        self.served += len(out)
+        if len(out) < n:
+            self.short_draws += 1
+        return out
+
+    def count(self, topic: str) -> int:
+        with self._connect() as con:
+            row = con.execute(
+                "SELECT COUNT(*) AS c FROM quiz_bank WHERE topic=? AND created_at >= ? AND served < ?",
+                (_normalize_topic(topic), time.time() - self.max_age_s, self.max_serves),
+            ).fetchone()
+        return int(row["c"] if row else 0)
+
+    def levels(self) -> Dict[str, int]:
+        with self._connect() as con:
+            rows = con.execute(
+                """
+                SELECT topic, COUNT(*) AS c FROM quiz_bank
+                WHERE created_at >= ? AND served < ?
+                GROUP BY topic
+                """,
+                (time.time() - self.max_age_s, self.max_serves),
+            ).fetchall()
+        return {r["topic"]: int(r["c"]) for r in rows}
+
+    def recent_questions(self, topic: str, limit: int = 40) -> List[str]:
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT question FROM quiz_bank WHERE topic=? ORDER BY id DESC LIMIT ?",
+                (_normalize_topic(topic), int(limit)),
+            ).fetchall()
+        return [r["question"] for r in rows]
+
+    def evict(self) -> int:
+        """
+        Drop stale (older than max_age_days) and worn-out (served max_serves
+        times) questions.
+        """
+        with self._connect() as con:
+            cur = con.execute(
+                "DELETE FROM quiz_bank WHERE created_at < ? OR served >= ?",
+                (time.time() - self.max_age_s, self.max_serves),
+            )
+            con.commit()
+            n = int(cur.rowcount or 0)
+        self.evicted += n
+        return n
+
+    # -------------------------
+    # Refill loop
+    # -------------------------
+    async def refill_once(self, llm, *, api_key: str = "") -> int:
+        """
+        Top up every topic below low_water to target (background priority).
+        Returns how many questions were added.
+        """
+        evicted = self.evict()
+        if evicted:
+            log.info("Quiz bank evicted %d stale questions", evicted)
+
+        total = 0
+        for topic in self.topics:
+            have = self.count(topic)
+            if have >= self.low_water:
+                continue
+
+            self._refilling = _normalize_topic(topic)
+            try:
+                while have < self.target:
+                    want = min(10, self.target - have)
+                    qs = await generate_quiz_questions(
+                        llm,
+                        api_key=api_key,
+                        topic=topic,
+                        n=want,
+                        avoid=self.recent_questions(topic),
+                        priority=PRIORITY_BACKGROUND,
+                        # banked questions are generated off the hot path:
+                        # keep their explanations
+                        explain=True,
+                    )
+                    added = self.add(topic, qs)
+                    total += added
+                    self.refills += 1
+                    if added == 0:
+                        break
+                    have += added
+            except LLMBusy as e:
+                # the bot is busy with users: try again next cycle
+                log.info("Quiz bank refill paused (%s)", e)
+                break
+            except Exception:
+                self.refill_failures += 1
+                log.exception("Quiz bank refill failed for %r", topic)
+            finally:
+                self._refilling = None
+
+            log.info("Quiz bank topic %r: %d/%d", topic, self.count(topic), self.target)
+
+        return total
+
+    def start(self, llm, *, interval_s: float = 300.0, api_key: str = "") -> None:
+        if self._task is not None and not self._task.done():
+            return
+
+        async def _loop() -> None:
+            while True:
+                try:
+                    added = await self.refill_once(llm, api_key=api_key)
+                    if added:
+                        log.info("Quiz bank refill added %d questions (%s)", added, self.levels())
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception("Quiz bank refill cycle failed")
+                await asyncio.sleep(max(5.0, float(interval_s)))
+
+        self._task = asyncio.create_task(_loop())
+        log.info(
+            "Quiz bank refill started: topics=%d target=%d low_water=%d every %.0fs",
+            len(self.topics),
+            self.target,
+            self.low_water,
+            interval_s,
+        )
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    # -------------------------
+    # Observability
+    # -------------------------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "levels": self.levels(),
+            "target": self.target,
+            "low_water": self.low_water,
+            "refilling": self._refilling,
+            "draws": self.draws,
+            "served": self.served,
+            "short_draws": self.short_draws,
+            "added": self.added,
+            "evicted": self.evicted,
+            "refills": self.refills,
+            "refill_failures": self.refill_failures,
+        }
+
+    def metrics_text(self) -> str:
+        levels = self.levels()
+        counters = (
+            ("draws", self.draws),
+            ("served", self.served),
+            ("short_draws", self.short_draws),
+            ("added", self.added),
+            ("evicted", self.evicted),
+            ("refills", self.refills),
+            ("refill_failures", self.refill_failures),
+        )
+        gauges = [
+            (
+                "mentra_quiz_bank_questions",
+                "Servable questions in the quiz bank per topic.",
+                [({"topic": t}, c) for t, c in sorted(levels.items())],
+            ),
+            (
+                "mentra_quiz_bank_events",
+                "Quiz bank counters since start (draws, served, refills, ...).",
+                [({"event": k}, v) for k, v in counters],
+            ),
+        ]
+        return "\n".join(render_gauges(gauges)) + "\n"
+
+
+def _draw_for_user(
+    bank: QuizBank,
+    topic: str,
+    n: int,
+    *,
+    store=None,
+    guild_id: int | None = None,
+    user_id: int | None = None,
+) -> List[QuizQuestion]:
+    """
+    Draw up to n banked questions the user hasn't seen (exact signature or
+    near-duplicate) and record them in quiz_seen.
+    """
+    topic_norm = _normalize_topic(topic)
+    history = QuizSeenIndex.open(store, guild_id, user_id, topic_norm)
+    if history is not None:
+        drawn = [q for q in bank.draw(topic, n, exclude_sigs=history.sigs) if not history.seen(q.question)]
+        history.record((_signature(q.question, q.choices), _starter3(q.question), q.question) for q in drawn)
+        return drawn
+
+    seen_sigs: set[str] = set()
+    if store is not None and guild_id is not None and user_id is not None and hasattr(store, "get_recent_quiz_seen"):
+        try:
+            seen_sigs, _, _ = store.get_recent_quiz_seen(guild_id, user_id, topic_norm, limit=500, ttl_days=30)
+        except Exception as e:
+            log.warning("quiz_seen load failed: %s", e)
+
+    drawn = bank.draw(topic, n, exclude_sigs=seen_sigs)
+
+    if drawn and store is not None and guild_id is not None and user_id is not None and hasattr(store, "add_quiz_seen"):
+        for q in drawn:
+            try:
+                store.add_quiz_seen(
+                    guild_id, user_id, topic_norm, _signature(q.question, q.choices), _starter3(q.question), q.question
+                )
+            except Exception:
+                pass
+    return drawn
+
+
+def start_quiz_feed(
+    llm,
+    bank: Optional[QuizBank],
+    *,
+    api_key: str,
+    topic: str,
+    n: int,
+    store=None,
+    guild_id: int | None = None,
+    user_id: int | None = None,
+    deadline: Optional[Deadline] = None,
+    prefetch=None,
+) -> QuizFeed:
+    """
+    Serve a quiz from the bank when the topic is stocked, filtered by the
+    user's quiz_seen history; generate only what the bank can't cover.
+    Banked questions are available at once, the rest are generated in the
+    background and pushed into the feed as each one is accepted. Must be
+    called from a running event loop. Generation stops at `deadline`,
+    leaving a shorter quiz.
+    For topics the bank doesn't stock, a quiz the Prefetcher speculated
+    for this user takes the bank's place.
+    """
+    feed = QuizFeed(n)
+    drawn: List[QuizQuestion] = []
+    stocked = bank is not None and bank.stocks(topic)
+    if stocked:
+        drawn = _draw_for_user(bank, topic, n, store=store, guild_id=guild_id, user_id=user_id)
+    elif prefetch is not None and user_id is not None:
+        drawn = prefetch.take_quiz(user_id, topic, n, store=store, guild_id=guild_id)
+    for q in drawn:
+        feed.push(q)
+    if len(drawn) >= n:
+        return feed
+
+    qsigs = {_q_only_signature(q.question) for q in drawn}
+
+    def _push(q: QuizQuestion) -> None:
+        if _q_only_signature(q.question) not in qsigs:
+            feed.push(q)
+
+    async def _live() -> None:
+        live = await generate_quiz_questions(
+            llm,
+            api_key=api_key,
+            topic=topic,
+            n=n - len(drawn),
+            store=store,
+            guild_id=guild_id,
+            user_id=user_id,
+            avoid=[q.question for q in drawn],
+            on_question=_push,
+            deadline=deadline,
+        )
+        if stocked:
+            # exhausted stocked topic: keep the fresh questions for the next user
+            bank.add(topic, live)
+
+    feed.run(_live())
+    return feed
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from app.models.quiz import QuizQuestion
+from app.services.llm import LLMClient
+from app.services.llm_deadline import Deadline, DeadlineExceeded
+from app.services.llm_scheduler import PRIORITY_INTERACTIVE
+from app.services.quiz_gen import MAX_EXPL_LEN, _clean_text, _one_sentence_max, _signature
+
+log = logging.getLogger("MentraAI")
+
+_LINE_RE = re.compile(r"^\s*(?:Q\s*)?(\d+)\s*[:\.\)\-—]\s*(.+?)\s*$", re.IGNORECASE)
+
+_SYSTEM = (
+    "You explain cybersecurity quiz answers.\n"
+    "For each numbered question, write ONE short sentence saying why the correct answer is right.\n"
+    "Output one line per question: <number>: <sentence>\n"
+    "No other text."
+)
+
+
+def _prompt(questions: Sequence[QuizQuestion]) -> str:
+    blocks = []
+    for i, q in enumerate(questions, start=1):
+        choices = " | ".join(f"{'ABCD'[j]}) {c}" for j, c in enumerate(q.choices))
+        blocks.append(f"{i}. {q.question}\n   {choices}\n   Correct: {'ABCD'[q.answer_index]}) {q.choices[q.answer_index]}")
+    return "\n".join(blocks) + f"\n\nExplain all {len(questions)} now (max {MAX_EXPL_LEN} chars each)."
+
+
+def _parse(raw: str, count: int) -> Dict[int, str]:
+    out: Dict[int, str] = {}
+    for ln in (raw or "").replace("\r", "\n").split("\n"):
+        m = _LINE_RE.match(ln)
+        if not m:
+            continue
+        idx = int(m.group(1)) - 1
+        text = _clean_text(_one_sentence_max(m.group(2)))[:MAX_EXPL_LEN]
+        if 0 <= idx < count and text and idx not in out:
+            out[idx] = text
+    return out
+
+
+class QuizExplainer:
+    """
+    Explanations for questions generated without one (QUIZ_LAZY_EXPLAIN),
+    fetched only when the quiz view shows them.
+
+    explain() fills `explanation` in place: questions already explained
+    elsewhere come from an LRU cache keyed by question signature, the
+    rest go out as one batched request, and a question already being
+    explained by another call waits for that call instead of asking twice.
+    """
+
+    def __init__(self, *, cache_size: int = 2048):
+        self.cache_size = int(cache_size)
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.requests = 0
+        self.hits = 0
+
+    def _remember(self, sig: str, text: str) -> None:
+        self._cache[sig] = text
+        self._cache.move_to_end(sig)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def cached(self, q: QuizQuestion) -> str:
+        sig = _signature(q.question, q.choices)
+        text = self._cache.get(sig, "")
+        if text:
+            self._cache.move_to_end(sig)
+        return text
+
+    async def explain(
+        self,
+        llm,
+        *,
+        api_key: str,
+        questions: Sequence[QuizQuestion],
+        priority: str = PRIORITY_INTERACTIVE,
+        deadline: Optional[Deadline] = None,
+    ) -> int:
+        """
+        Fill missing explanations; returns how many are still missing.
+        Best-effort: LLM errors are logged, never raised.
+        """
+        todo: List[QuizQuestion] = []
+        waits: List[asyncio.Future] = []
+        for q in questions:
+            if (q.explanation or "").strip():
+                continue
+            sig = _signature(q.question, q.choices)
+            text = self._cache.get(sig)
+            if text:
+                q.explanation = text
+                self.hits += 1
+            elif sig in self._inflight:
+                waits.append(self._inflight[sig])
+            elif all(_signature(t.question, t.choices) != sig for t in todo):
+                todo.append(q)
+
+        if todo:
+            done = asyncio.get_running_loop().create_future()
+            sigs = [_signature(q.question, q.choices) for q in todo]
+            for sig in sigs:
+                self._inflight[sig] = done
+            try:
+                await self._ask(llm, api_key=api_key, questions=todo, priority=priority, deadline=deadline)
+            finally:
+                for sig in sigs:
+                    self._inflight.pop(sig, None)
+                done.set_result(None)
+
+        if waits:
+            pending = asyncio.gather(*(asyncio.shield(w) for w in waits), return_exceptions=True)
+            try:
+                await (deadline.run(pending) if deadline else pending)
+            except DeadlineExceeded:
+                pass
+
+        missing = 0
+        for q in questions:
+            if not (q.explanation or "").strip():
+                q.explanation = self.cached(q)
+                missing += not q.explanation
+        return missing
+
+    async def _ask(
+        self,
+        llm,
+        *,
+        api_key: str,
+        questions: List[QuizQuestion],
+        priority: str,
+        deadline: Optional[Deadline],
+    ) -> None:
+        self.requests += 1
+        try:
+            raw = await llm.ask(
+                api_key=api_key,
+                prompt=_prompt(questions),
+                system=_SYSTEM,
+                max_tokens=80 + 70 * len(questions),
+                temperature=0.2,
+                priority=priority,
+                site="quiz.explain",
+                **({"deadline": deadline} if deadline else {}),
+            )
+        except Exception as e:
+            log.warning("Quiz explanations failed (%d question(s)): %s", len(questions), e)
+            return
+        if LLMClient.is_error_text(raw):
+            log.warning("Quiz explanations failed: %s", (raw or "")[:200])
+            return
+
+        got = _parse(raw, len(questions))
+        for i, text in got.items():
+            q = questions[i]
+            q.explanation = text
+            self._remember(_signature(q.question, q.choices), text)
+        if len(got) < len(questions):
+            log.info("Quiz explanations: %d/%d parsed", len(got), len(questions))
+
+
+# Shared across quizzes: the same banked or repeated question is explained once
+EXPLAINER = QuizExplainer()
@@ -1,14 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import logging
+import math
 import re
-from typing import Dict, List, Optional, Tuple
-from config import LLM_PROVIDER
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+from config import LLM_PROVIDER, QUIZ_FANOUT, QUIZ_LAZY_EXPLAIN, QUIZ_PROMPT_AVOID
 from app.models.quiz import QuizQuestion
-from app.services.exam_rules import rule_check
+from app.services.exam_rules import rule_check, rule_check_batch
+from app.services.gen_yield import YIELD, model_of
+from app.services.llm import LLMClient
+from app.services.llm_deadline import Deadline, DeadlineExceeded, expired
+from app.services.llm_schemas import QUIZ_LEAN_SCHEMA, QUIZ_SCHEMA, fast_json
+from app.services.llm_scheduler import PRIORITY_GENERATION
+from app.services.quiz_seen import QuizSeenIndex
+from app.services.similarity import SIMILARITY
 from app.utils.perms import clamp
-from app.utils.text import jaccard_sim
 
 log = logging.getLogger("MentraAI")
 
@@ -20,7 +30,10 @@ MAX_EXPL_LEN = 200
 
 CHOICE_TOTAL_MAX = 60
 CHOICE_COUNT = 4
-JACCARD_Q_SIM = 0.82
+# cosine (SimilarityService) at which two questions / two choices are duplicates;
+# question thresholds come from the calibration in benchmarks/similarity.py
+QUESTION_COS_SIM = 0.85
+CHOICE_COS_SIM = 0.75
 TEMPERATURE = 0.75
 _CONTROL_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
 
@@ -121,14 +134,6 @@ def _tokset(s: str) -> set[str]:
     return set(toks)
 
 
-def _opt_overlap(a: str, b: str) -> float:
-    ta = _tokset(a)
-    tb = _tokset(b)
-    if not ta or not tb:
-        return 0.0
-    return len(ta & tb) / len(ta | tb)
-
-
 def _normalize_question(text: str) -> Optional[str]:
     t = _clean_text(text)
     if not t:
@@ -197,6 +202,14 @@ def _normalize_choice_for_discord(s: str) -> str:
     return _wrap_two_lines_choice(s)
 
 
+def _drop(funnel: Optional[Counter], reason: str) -> None:
+    """
+    Count one rejected candidate under `reason` (generation funnel).
+    """
+    if funnel is not None:
+        funnel[reason] += 1
+
+
 def _accept_question(
     built: QuizQuestion,
     *,
@@ -205,25 +218,27 @@ def _accept_question(
     seen_starters: set[str],
     seen_q_sigs: set[str],
     seen_q_texts: set[str],
+    funnel: Optional[Counter] = None,
 ) -> bool:
     sig = _signature(built.question, built.choices)
     if sig in seen_sigs:
+        _drop(funnel, "dup_signature")
         return False
 
     qsig = _q_only_signature(built.question)
-    if qsig in seen_q_sigs:
-        return False
-
     qn = _clean_text(built.question).lower()
-    if qn in seen_q_texts:
+    if qsig in seen_q_sigs or qn in seen_q_texts:
+        _drop(funnel, "dup_question")
         return False
 
     # near-duplicate question text vs already accepted in this run
-    if any(jaccard_sim(built.question, prev.question) >= JACCARD_Q_SIM for prev in out):
+    if out and SIMILARITY.max_similarity(built.question, [prev.question for prev in out]) >= QUESTION_COS_SIM:
+        _drop(funnel, "similar_question")
         return False
 
     s3 = _starter3(built.question)
     if s3 and s3 in seen_starters:
+        _drop(funnel, "starter3")
         return False
 
     seen_sigs.add(sig)
@@ -237,7 +252,33 @@ def _accept_question(
 # -----------------------------
 # Prompting
 # -----------------------------
-def _system_prompt() -> str:
+def _structured(llm) -> bool:
+    """
+    True if the client sends schema-constrained requests (LLM_STRUCTURED_OUTPUT).
+    """
+    mode = str(getattr(llm, "structured_output", "off") or "off").lower()
+    return mode not in ("off", "0", "false", "no")
+
+
+def _system_prompt(structured: bool = False, explain: bool = True) -> str:
+    """
+    explain=False (QUIZ_LAZY_EXPLAIN) drops the explanation from the
+    format; see QuizExplainer.
+    """
+    if structured:
+        return (
+            "You write exam-style cybersecurity multiple-choice questions.\n"
+            "Output ONE JSON object ONLY, no markdown, no commentary.\n"
+            "ABSOLUTE RULES:\n"
+            "- Choices are SHORT LABELS (2-7 words), NOT sentences, without A)/B) prefixes.\n"
+            "- Exactly ONE correct option; `answer` is its letter (A-D).\n"
+            + ("- Explanation is ONE short sentence.\n" if explain else "")
+            + "\n"
+            "FORMAT:\n"
+            '{"questions": [{"question": "<one SHORT sentence>", '
+            '"choices": ["<label>", "<label>", "<label>", "<label>"], '
+            + ('"answer": "<A|B|C|D>", "explanation": "<one short sentence>"}]}\n' if explain else '"answer": "<A|B|C|D>"}]}\n')
+        )
     return (
         "You write exam-style cybersecurity multiple-choice questions.\n"
         "Output PLAIN TEXT ONLY.\n"
@@ -246,8 +287,8 @@ def _system_prompt() -> str:
         "- No extra lines, no commentary, no titles.\n"
         "- Choices are SHORT LABELS (2-7 words), NOT sentences.\n"
         "- Exactly ONE correct option.\n"
-        "- Explanation is ONE short sentence.\n"
-        "- Separate questions with a line containing only: ---\n"
+        + ("- Explanation is ONE short sentence.\n" if explain else "- No explanations.\n")
+        + "- Separate questions with a line containing only: ---\n"
         "\n"
         "FORMAT (repeat for each question):\n"
         "Q: <one SHORT sentence>\n"
@@ -256,8 +297,8 @@ def _system_prompt() -> str:
         "C) <short label>\n"
         "D) <short label>\n"
         "ANSWER: <A|B|C|D>\n"
-        "EXPLAIN: <one short sentence>\n"
-        "---\n"
+        + ("EXPLAIN: <one short sentence>\n" if explain else "")
+        + "---\n"
         "\n"
         "Now follow the same format.\n"
     )
@@ -269,10 +310,12 @@ def _make_prompt(
     *,
     avoid: Optional[List[str]] = None,
     hint: str = "",
+    avoid_max: int = 12,
+    explain: bool = True,
 ) -> str:
     avoid_block = ""
-    if avoid:
-        avoid_short = [a for a in avoid if a][:12]
+    if avoid and avoid_max > 0:
+        avoid_short = [a for a in avoid if a][:avoid_max]
         if avoid_short:
             avoid_block = (
                 "AVOID close paraphrases of these recent questions:\n"
@@ -286,7 +329,9 @@ def _make_prompt(
         "Style: OffSec / exam-style.\n"
         f"Generate EXACTLY {n} question(s).\n"
         f"Choices per question: {CHOICE_COUNT}.\n"
-        f"Limits: Q<={MAX_Q_LEN} chars, EXPLAIN<={MAX_EXPL_LEN} chars, CHOICE<={CHOICE_TOTAL_MAX} chars.\n"
+        f"Limits: Q<={MAX_Q_LEN} chars, "
+        + (f"EXPLAIN<={MAX_EXPL_LEN} chars, " if explain else "")
+        + f"CHOICE<={CHOICE_TOTAL_MAX} chars.\n"
         "Rules:\n"
         "- Exactly ONE correct option.\n"
         "- Choices must be short labels (2–7 words), not full sentences.\n"
@@ -297,8 +342,19 @@ def _make_prompt(
     )
 
 
-def _gen_params() -> dict:
-    return {"temperature": TEMPERATURE}
+# Different angles for concurrent requests, so parallel batches don't all
+# return the same questions
+_FANOUT_HINTS = (
+    "",
+    "Focus on enumeration and reconnaissance.",
+    "Focus on exploitation and attack techniques.",
+    "Focus on detection, hardening and remediation.",
+    "Focus on reading tool output and choosing the next step.",
+)
+
+
+def _gen_params(priority: str = PRIORITY_GENERATION) -> dict:
+    return {"temperature": TEMPERATURE, "priority": priority}
 
 
 def _strip_inline_sep(line: str) -> Tuple[str, bool]:
@@ -317,7 +373,46 @@ def _strip_inline_sep(line: str) -> Tuple[str, bool]:
 # -----------------------------
 # Parser for delimiter format
 # -----------------------------
-def _parse_quiz_blocks(text: str, *, expected_choices: int) -> List[Dict[str, object]]:
+def _parse_quiz_json(
+    text: str, *, expected_choices: int, funnel: Optional[Counter] = None
+) -> Optional[List[Dict[str, object]]]:
+    """
+    Fast path for structured output ({"questions": [...]}, see QUIZ_SCHEMA).
+    Returns None when the text is not that JSON, so the caller falls back
+    to _parse_quiz_blocks().
+    """
+    data = fast_json(_remove_control_chars(text or ""))
+    if data is None or not isinstance(data.get("questions"), list):
+        return None
+
+    order = ["A", "B", "C", "D"][:expected_choices]
+    items: List[Dict[str, object]] = []
+    for q in data["questions"]:
+        if not isinstance(q, dict):
+            _drop(funnel, "malformed")
+            continue
+        choices = q.get("choices")
+        ans = str(q.get("answer", "") or "").strip().upper()[:1]
+        if not isinstance(choices, list) or len(choices) != expected_choices:
+            _drop(funnel, "choice_count")
+            continue
+        if ans not in order:
+            _drop(funnel, "answer_letter")
+            continue
+        items.append(
+            {
+                "question": str(q.get("question", "") or "").strip(),
+                "choices": [str(c).strip() for c in choices],
+                "answer_index": order.index(ans),
+                "explanation": str(q.get("explanation", "") or "").strip(),
+            }
+        )
+    return items
+
+
+def _parse_quiz_blocks(
+    text: str, *, expected_choices: int, funnel: Optional[Counter] = None
+) -> List[Dict[str, object]]:
     s = _remove_control_chars(text or "")
     s = s.replace("\r\n", "\n").replace("\r", "\n").strip()
     if not s:
@@ -347,10 +442,12 @@ def _parse_quiz_blocks(text: str, *, expected_choices: int) -> List[Dict[str, ob
             return
 
         if any(k not in cur_choices for k in order):
+            _drop(funnel, "choice_count")
             reset()
             return
 
         if not cur_ans or cur_ans.upper() not in order:
+            _drop(funnel, "answer_letter")
             reset()
             return
 
@@ -431,10 +528,23 @@ def _parse_quiz_blocks(text: str, *, expected_choices: int) -> List[Dict[str, ob
 
 
 def _validate_and_build(
-    item: Dict[str, object], *, expected_choices: int
+    item: Dict[str, object],
+    *,
+    expected_choices: int,
+    funnel: Optional[Counter] = None,
+    explain: bool = True,
+    check_rules: bool = True,
 ) -> Optional[QuizQuestion]:
+    """
+    Normalise one parsed item into a QuizQuestion, or None if it fails a
+    check; the failing check is counted in `funnel`. With explain=False a
+    missing explanation stays empty (filled later by QuizExplainer).
+    check_rules=False leaves the exam rules to the caller (batched, see
+    _Collector.take).
+    """
     q = _normalize_question(str(item.get("question", "") or ""))
     if not q:
+        _drop(funnel, "malformed")
         return None
 
     # Ensure compact stem
@@ -444,47 +554,53 @@ def _validate_and_build(
     explanation = _one_sentence_max(explanation)
     explanation = _clean_text(explanation)
 
-    if not explanation:
+    if not explanation and explain:
         explanation = (
             "Prefer safe verification and clear evidence before concluding impact."
         )
 
     choices_raw = item.get("choices", [])
     if not isinstance(choices_raw, list) or len(choices_raw) != expected_choices:
+        _drop(funnel, "choice_count")
         return None
 
     choices: List[str] = []
     for c in choices_raw:
         s = _normalize_choice_for_discord(str(c))
         if not s:
+            _drop(funnel, "malformed")
             return None
 
         s = _short_label(s, max_words=7)  # (NOTE: only once)
         if not s:
+            _drop(funnel, "malformed")
             return None
 
         choices.append(s)
 
     # duplicates check (ignore case)
     if len({c.lower() for c in choices}) != expected_choices:
+        _drop(funnel, "duplicate_choices")
         return None
 
     # parse answer index
     try:
         ai = int(item.get("answer_index", -1))
     except Exception:
+        _drop(funnel, "answer_letter")
         return None
     if ai < 0 or ai >= expected_choices:
+        _drop(funnel, "answer_letter")
         return None
 
-    for i in range(expected_choices):
-        for j in range(i + 1, expected_choices):
-            if _opt_overlap(choices[i], choices[j]) >= 0.72:
-                return None
+    if SIMILARITY.max_pairwise(choices[:expected_choices]) >= CHOICE_COS_SIM:
+        _drop(funnel, "choice_overlap")
+        return None
 
     lens = [len(c) for c in choices]
     avg_other = (sum(lens) - lens[ai]) / max(1, (expected_choices - 1))
     if avg_other > 0 and lens[ai] > 1.6 * avg_other:
+        _drop(funnel, "answer_length")
         return None
 
     exp_tok = _tokset(explanation)
@@ -494,11 +610,14 @@ def _validate_and_build(
         if overlap < 0.05:
             pass
 
-    rr = rule_check(q, choices, ai, explanation)
-    if not rr.ok:
-        return None
+    if check_rules:
+        rr = rule_check(q, choices, ai, explanation)
+        if not rr.ok:
+            _drop(funnel, f"rule:{rr.rule or 'other'}")
+            return None
 
     if any("(correct)" in c.lower() for c in choices):
+        _drop(funnel, "correct_tag")
         return None
 
     return QuizQuestion(
@@ -509,6 +628,297 @@ def _validate_and_build(
 # -----------------------------
 # Main generator (guarantee fill-to-N)
 # -----------------------------
+class _Collector:
+    """
+    Accepted questions plus the dedupe state shared by every concurrent
+    request of one generate_quiz_questions() call.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        avoid: List[str],
+        on_accept: Optional[Callable[[QuizQuestion], None]] = None,
+        history: Optional[QuizSeenIndex] = None,
+        explain: bool = True,
+    ):
+        self.n = n
+        self.explain = explain
+        # lean (explanation-less) output is shorter: learned separately
+        self.kind = "quiz" if explain else "quiz.lean"
+        self.on_accept = on_accept
+        self.history = history
+        self.out: List[QuizQuestion] = []
+        self.seen_sigs: set[str] = set()
+        self.seen_q_sigs: set[str] = set()
+        self.seen_q_texts: set[str] = set()
+        self.seen_starters: set[str] = set()
+        self.avoid = avoid
+        self.responses = 0
+        self.unparsed = 0
+        self.llm_error = False
+        self.timed_out = False
+        # why candidates were dropped (reason -> count) and what it cost
+        self.funnel: Counter = Counter()
+        self.rounds = 0
+        self.calls = 0
+        # items asked for in the responses received, and the raw output
+        # size of the parsed ones (feeds YIELD)
+        self.asked = 0
+        self.parsed = 0
+        self.out_chars = 0
+        self._observed = (0, 0, 0, 0, 0)
+
+    @property
+    def full(self) -> bool:
+        return len(self.out) >= self.n
+
+    def take(self, raw: str, *, phase: str, avoid_max: int, asked: int = 0) -> int:
+        """
+        Parse, validate and dedupe one raw LLM output (the answer to a
+        request for `asked` questions). Returns how many were accepted.
+        """
+        self.responses += 1
+
+        if LLMClient.is_error_text(raw):
+            # don't burn rounds parsing an error message
+            log.warning("Quiz generation stopped: %s", (raw or "")[:200])
+            self.llm_error = True
+            return 0
+        self.asked += asked
+
+        parsed = _parse_quiz_json(raw, expected_choices=CHOICE_COUNT, funnel=self.funnel)
+        if parsed is None:
+            parsed = _parse_quiz_blocks(raw or "", expected_choices=CHOICE_COUNT, funnel=self.funnel)
+        if not parsed:
+            self.unparsed += 1
+            self.funnel["parse_failed"] += 1
+            log.warning("Quiz parse failed (%s, response %d): 0 blocks", phase, self.responses)
+            log.warning("RAW (first 1200): %r", (raw or "")[:1200])
+            return 0
+        self.parsed += len(parsed)
+        self.out_chars += len(raw or "")
+
+        # normalise every item, then run the exam rules over the whole
+        # response in one pass; drop reasons are counted only for the items
+        # actually considered below (not the surplus)
+        prepared: List[Tuple[Optional[QuizQuestion], Counter]] = []
+        for item in parsed:
+            drops: Counter = Counter()
+            built = _validate_and_build(
+                item, expected_choices=CHOICE_COUNT, funnel=drops, explain=self.explain, check_rules=False
+            )
+            prepared.append((built, drops))
+        checks = iter(
+            rule_check_batch([(b.question, b.choices, b.answer_index, b.explanation) for b, _ in prepared if b])
+        )
+        verdicts = [next(checks) if b else None for b, _ in prepared]
+
+        built_any = 0
+        accepted = 0
+        for i, ((built, drops), rr) in enumerate(zip(prepared, verdicts)):
+            if self.full:
+                # valid or not, these were generated for nothing
+                self.funnel["surplus"] += len(parsed) - i
+                break
+
+            self.funnel.update(drops)
+            if built is not None and not rr.ok:
+                _drop(self.funnel, f"rule:{rr.rule or 'other'}")
+                built = None
+            if not built:
+                continue
+            built_any += 1
+
+            if self.history is not None and self.history.seen(
+                built.question, _signature(built.question, built.choices)
+            ):
+                _drop(self.funnel, "history")
+                continue
+
+            if not _accept_question(
+                built,
+                out=self.out,
+                seen_sigs=self.seen_sigs,
+                seen_starters=self.seen_starters,
+                seen_q_sigs=self.seen_q_sigs,
+                seen_q_texts=self.seen_q_texts,
+                funnel=self.funnel,
+            ):
+                continue
+
+            self.out.append(built)
+            accepted += 1
+            if self.on_accept is not None:
+                self.on_accept(built)
+
+            self.avoid.append(built.question)
+            if len(self.avoid) > avoid_max:
+                del self.avoid[:-avoid_max]
+
+        log.info(
+            "Quiz %s response %d | parsed=%d | built=%d | accepted=%d | total=%d/%d",
+            phase,
+            self.responses,
+            len(parsed),
+            built_any,
+            accepted,
+            len(self.out),
+            self.n,
+        )
+        return accepted
+
+    def observe_yield(self, model: str, topic_norm: str) -> None:
+        """
+        Feed what arrived since the last call to the request-size estimator.
+        """
+        now = (self.asked, self.funnel["surplus"], len(self.out), self.out_chars, self.parsed)
+        asked, surplus, accepted, chars, parsed = (x - y for x, y in zip(now, self._observed))
+        self._observed = now
+        YIELD.observe(self.kind, model, topic_norm, asked=asked - surplus, accepted=accepted, chars=chars, parsed=parsed)
+
+    def record(self, store, *, model: str, topic_norm: str, guild_id, user_id, outcome: str, wall_s: float) -> None:
+        """
+        Log the rejection funnel and persist it as one quiz_gen_ledger row.
+        """
+        log.info(
+            "Quiz funnel | %s | model=%s | accepted=%d/%d | rounds=%d | calls=%d | %.1fs | %s",
+            outcome,
+            model,
+            len(self.out),
+            self.n,
+            self.rounds,
+            self.calls,
+            wall_s,
+            " ".join(f"{k}={v}" for k, v in self.funnel.most_common()) or "no rejections",
+        )
+        if store is None or not hasattr(store, "add_quiz_gen_ledger"):
+            return
+        try:
+            store.add_quiz_gen_ledger(
+                guild_id=guild_id,
+                user_id=user_id,
+                model=model,
+                topic=topic_norm,
+                requested=self.n,
+                accepted=len(self.out),
+                rounds=self.rounds,
+                llm_calls=self.calls,
+                responses=self.responses,
+                wall_ms=int(wall_s * 1000),
+                outcome=outcome,
+                funnel=dict(self.funnel),
+                asked=self.asked,
+                parsed=self.parsed,
+                out_chars=self.out_chars,
+                kind=self.kind,
+            )
+        except Exception as e:
+            log.warning("Quiz ledger write failed: %s", e)
+
+
+async def _ask_quiz(
+    llm,
+    *,
+    api_key: str,
+    prompt: str,
+    system: str,
+    max_tokens: int,
+    site: str,
+    priority: str,
+    schema: Optional[dict] = None,
+    deadline: Optional[Deadline] = None,
+) -> List[str]:
+    raw = await llm.ask(
+        api_key=api_key,
+        prompt=prompt,
+        system=system,
+        max_tokens=max_tokens,
+        site=site,
+        **_gen_params(priority),
+        **({"schema": schema} if schema else {}),
+        **({"deadline": deadline} if deadline else {}),
+    )
+    return [raw]
+
+
+def _launch(
+    llm,
+    *,
+    api_key: str,
+    prompts: List[str],
+    system: str,
+    max_tokens: int,
+    site: str,
+    priority: str = PRIORITY_GENERATION,
+    schema: Optional[dict] = None,
+    deadline: Optional[Deadline] = None,
+) -> List[asyncio.Task]:
+    """
+    Start one request per prompt. A backend that supports `n` gets a single
+    request for len(prompts) samples of the first prompt instead.
+    """
+    if len(prompts) > 1 and getattr(llm, "supports_n", False) and hasattr(llm, "ask_choices"):
+        return [
+            asyncio.ensure_future(
+                llm.ask_choices(
+                    api_key=api_key,
+                    prompt=prompts[0],
+                    system=system,
+                    max_tokens=max_tokens,
+                    n=len(prompts),
+                    site=site,
+                    schema=schema,
+                    **_gen_params(priority),
+                    **({"deadline": deadline} if deadline else {}),
+                )
+            )
+        ]
+    return [
+        asyncio.ensure_future(
+            _ask_quiz(
+                llm,
+                api_key=api_key,
+                prompt=p,
+                system=system,
+                max_tokens=max_tokens,
+                site=site,
+                priority=priority,
+                schema=schema,
+                deadline=deadline,
+            )
+        )
+        for p in prompts
+    ]
+
+
+async def _merge(
+    tasks: List[asyncio.Task],
+    take: Callable[[str, int], None],
+    done_when: Callable[[], bool],
+    sizes: Optional[Dict[asyncio.Task, int]] = None,
+) -> None:
+    """
+    Feed raw outputs to `take` (with the question count `sizes` says the
+    task asked for) as requests finish; cancel the rest once done_when()
+    is true. Errors (e.g. LLMBusy) propagate after cleanup.
+    """
+    pending = set(tasks)
+    try:
+        while pending and not done_when():
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in finished:
+                for raw in t.result():
+                    if done_when():
+                        break
+                    take(raw, (sizes or {}).get(t, 0))
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def generate_quiz_questions(
     llm,
     *,
@@ -518,21 +928,49 @@ async def generate_quiz_questions(
     store=None,
     guild_id: int | None = None,
     user_id: int | None = None,
+    avoid: Optional[List[str]] = None,
+    priority: str = PRIORITY_GENERATION,
+    on_question: Optional[Callable[[QuizQuestion], None]] = None,
+    deadline: Optional[Deadline] = None,
+    explain: Optional[bool] = None,
+    record_seen: bool = True,
 ) -> List[QuizQuestion]:
+    """
+    Generate n validated, deduplicated questions live. `avoid` adds
+    questions the model should not paraphrase (e.g. already drawn from the
+    question bank); priority is the LLM scheduler class.
+    on_question is called with each question as soon as it is accepted
+    (see QuizFeed); the first wave then also races a one-question request
+    so the first question lands after roughly one question's worth of tokens.
+    deadline bounds the whole generation: no new round starts after it,
+    and if it cuts generation short the questions accepted so far are
+    returned (a 4-question quiz instead of an error); DeadlineExceeded if
+    there are none.
+    explain=False leaves explanations out of the request (fewer output
+    tokens per question; QuizExplainer adds them when shown); None
+    follows QUIZ_LAZY_EXPLAIN.
+    record_seen=False skips marking the questions as seen by the user
+    (speculative generation: the consumer records what it shows).
+    """
     topic = (topic or "").strip() or "general cybersecurity"
     topic_norm = _normalize_topic(topic)
 
     n = clamp(int(n), 1, 10)
-    expected_choices = CHOICE_COUNT
+    fanout = max(1, int(QUIZ_FANOUT))
+
+    if explain is None:
+        explain = not QUIZ_LAZY_EXPLAIN
+    structured = _structured(llm)
+    system = _system_prompt(structured, explain)
+    schema = (QUIZ_SCHEMA if explain else QUIZ_LEAN_SCHEMA) if structured else None
 
-    system = _system_prompt()
+    avoid_texts: List[str] = [a for a in (avoid or []) if a][:40]
 
-    out: List[QuizQuestion] = []
-    seen_sigs: set[str] = set()
-    seen_q_sigs: set[str] = set()
-    seen_q_texts: set[str] = set()
-    seen_starters: set[str] = set()
-    avoid_texts: List[str] = []
+    # Near-duplicates of the user's history are rejected after generation
+    # (MinHash LSH), so the prompt only needs a few recent examples
+    history = QuizSeenIndex.open(store, guild_id, user_id, topic_norm)
+    prompt_avoid = QUIZ_PROMPT_AVOID if history is not None else 12
+    history_max = prompt_avoid if history is not None else 40
 
     # Persistent memory
     if store is not None and guild_id is not None and user_id is not None:
@@ -540,175 +978,299 @@ async def generate_quiz_questions(
             if hasattr(store, "get_recent_quiz_avoid"):
                 avoid_texts.extend(
                     store.get_recent_quiz_avoid(
-                        guild_id, user_id, topic_norm, limit=120, ttl_days=30
-                    )[:40]
+                        guild_id, user_id, topic_norm, limit=history_max, ttl_days=30
+                    )
                 )
         except Exception as e:
             log.warning("Persistent quiz_seen load failed: %s", e)
 
-    topic_hint = ""
-    max_rounds = 10
-
-    # -----------------------------
-    # Phase 1: batch collection
-    # -----------------------------
-    for round_i in range(max_rounds):
-        remaining = n - len(out)
-        if remaining <= 0:
-            break
-
-        request_n = min(max(remaining + 2, 3), 8)
-        prompt = _make_prompt(topic, request_n, avoid=avoid_texts, hint=topic_hint)
+    c = _Collector(n, avoid_texts, on_question, history, explain)
+    kind = c.kind
+    model = model_of(llm, api_key)
+    YIELD.seed(store)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
 
-        max_tokens = min(2000, 750 + int(request_n * 260))
+        # -----------------------------
+        # Phase 1: concurrent batches (up to max_rounds requests in total)
+        # -----------------------------
+        topic_hint = ""
+        max_rounds = 10
+        requests_left = max_rounds
+        wave = 0
+        starved = False
+
+        while requests_left > 0 and not c.full and not c.llm_error and not (c.timed_out or expired(deadline)):
+            remaining = n - len(c.out)
+            width = fanout if starved else math.ceil(remaining / 4)
+            width = max(1, min(width, fanout, requests_left))
+            # ask for enough that `remaining` likely pass at the learned
+            # acceptance rate for this model/topic
+            wanted = YIELD.request_size(kind, model, topic_norm, remaining, cap=8 * width)
+            request_n = min(max(math.ceil(wanted / width), 1), 8)
+            per_item = 260 if explain else 210
+            max_tokens = YIELD.max_tokens(kind, model, request_n, default=min(2000, 750 + int(request_n * per_item)))
+
+            prompts = [
+                _make_prompt(
+                    topic,
+                    request_n,
+                    avoid=avoid_texts,
+                    avoid_max=prompt_avoid,
+                    hint=" ".join(h for h in (topic_hint, _FANOUT_HINTS[(wave + i) % len(_FANOUT_HINTS)]) if h),
+                    explain=explain,
+                )
+                for i in range(width)
+            ]
+            requests_left -= width
 
-        try:
-            raw = await llm.ask(
-                api_key=api_key,
-                prompt=prompt,
-                system=system,
-                max_tokens=max_tokens,
-                **_gen_params(),
-            )
-        except TypeError:
-            # Fallback if llm.ask doesn't accept temperature kwarg
-            raw = await llm.ask(
+            tasks = _launch(
+                llm,
                 api_key=api_key,
-                prompt=prompt,
+                prompts=prompts,
                 system=system,
                 max_tokens=max_tokens,
+                site="quiz.phase1",
+                priority=priority,
+                schema=schema,
+                deadline=deadline,
             )
+            sizes = {t: request_n for t in tasks}
+            if on_question is not None and wave == 0 and n > 1 and requests_left > 0:
+                requests_left -= 1
+                first = asyncio.ensure_future(
+                    _ask_quiz(
+                        llm,
+                        api_key=api_key,
+                        prompt=_make_prompt(
+                            topic,
+                            1,
+                            avoid=avoid_texts,
+                            avoid_max=prompt_avoid,
+                            hint="Output exactly ONE question only.",
+                            explain=explain,
+                        ),
+                        system=system,
+                        max_tokens=YIELD.max_tokens(kind, model, 1, default=900),
+                        site="quiz.first",
+                        priority=priority,
+                        schema=schema,
+                        deadline=deadline,
+                    )
+                )
+                tasks.append(first)
+                sizes[first] = 1
+            wave += 1
+            c.rounds += 1
+            c.calls += len(tasks)
+
+            before = len(c.out)
+            unparsed = c.unparsed
+            try:
+                await _merge(
+                    tasks,
+                    lambda raw, asked: c.take(raw, phase="phase1", avoid_max=40, asked=asked),
+                    lambda: c.full or c.llm_error,
+                    sizes,
+                )
+            except DeadlineExceeded:
+                c.timed_out = True
+            c.observe_yield(model, topic_norm)
+
+            starved = len(c.out) == before
+            if c.unparsed > unparsed and starved:
+                topic_hint = "Follow the exact format."
+            elif starved:
+                topic_hint = (
+                    "Keep the question clear and specific. "
+                    "All options must be plausible and in the same technical context."
+                )
 
-        parsed = _parse_quiz_blocks(raw or "", expected_choices=expected_choices)
-
-        if not parsed:
-            log.warning("Quiz parse failed (round %d): 0 blocks", round_i + 1)
-            log.warning("RAW (first 1200): %r", (raw or "")[:1200])
-            topic_hint = "Follow the exact format."
-            continue
-
-        built_any = 0
-        accepted_any = 0
-
-        for item in parsed:
-            built = _validate_and_build(item, expected_choices=expected_choices)
-            if not built:
-                continue
-            built_any += 1
-
-            if not _accept_question(
-                built,
-                out=out,
-                seen_sigs=seen_sigs,
-                seen_starters=seen_starters,
-                seen_q_sigs=seen_q_sigs,
-                seen_q_texts=seen_q_texts,
-            ):
-                continue
-
-            out.append(built)
-            accepted_any += 1
-
-            avoid_texts.append(built.question)
-            if len(avoid_texts) > 40:
-                avoid_texts = avoid_texts[-40:]
-
-            if len(out) >= n:
-                break
-
-        log.info(
-            "Quiz round %d | parsed=%d | built=%d | accepted=%d | total=%d/%d",
-            round_i + 1,
-            len(parsed),
-            built_any,
-            accepted_any,
-            len(out),
-            n,
-        )
-
-        if accepted_any == 0:
-            topic_hint = (
-                "Keep the question clear and specific. "
-                "All options must be plausible and in the same technical context."
-            )
-
-    # -----------------------------
-    # Phase 2: one-by-one fill
-    # -----------------------------
-    tries = 0
-    while len(out) < n and tries < 40:
-        prompt = _make_prompt(
-            topic,
-            1,
-            avoid=avoid_texts,
-            hint="Output exactly ONE question only. Follow the exact format.",
-        )
+        # -----------------------------
+        # Phase 2: parallel single-question fill
+        # -----------------------------
+        tries = 0
+        while not c.full and tries < 40 and not c.llm_error and not (c.timed_out or expired(deadline)):
+            # one question per request: enough requests that the missing
+            # ones likely pass
+            wanted = YIELD.request_size(kind, model, topic_norm, n - len(c.out), cap=fanout)
+            width = max(1, min(fanout, wanted, 40 - tries))
+            prompts = [
+                _make_prompt(
+                    topic,
+                    1,
+                    avoid=avoid_texts,
+                    avoid_max=prompt_avoid,
+                    hint=" ".join(
+                        h
+                        for h in (
+                            "Output exactly ONE question only. Follow the exact format.",
+                            _FANOUT_HINTS[(tries + i) % len(_FANOUT_HINTS)],
+                        )
+                        if h
+                    ),
+                    explain=explain,
+                )
+                for i in range(width)
+            ]
+            tries += width
 
-        try:
-            raw = await llm.ask(
-                api_key=api_key,
-                prompt=prompt,
-                system=system,
-                max_tokens=900,
-                **_gen_params(),
-            )
-        except TypeError:
-            raw = await llm.ask(
+            tasks = _launch(
+                llm,
                 api_key=api_key,
-                prompt=prompt,
+                prompts=prompts,
                 system=system,
-                max_tokens=900,
+                max_tokens=YIELD.max_tokens(kind, model, 1, default=900),
+                site="quiz.phase2_fill",
+                priority=priority,
+                schema=schema,
+                deadline=deadline,
             )
+            c.rounds += 1
+            c.calls += len(tasks)
 
-        parsed = _parse_quiz_blocks(raw or "", expected_choices=expected_choices)
-        added = False
-
-        for item in parsed:
-            built = _validate_and_build(item, expected_choices=expected_choices)
-            if not built:
-                continue
-
-            if not _accept_question(
-                built,
-                out=out,
-                seen_sigs=seen_sigs,
-                seen_starters=seen_starters,
-                seen_q_sigs=seen_q_sigs,
-                seen_q_texts=seen_q_texts,
-            ):
-                continue
-
-            out.append(built)
-            avoid_texts.append(built.question)
-            if len(avoid_texts) > 60:
-                avoid_texts = avoid_texts[-60:]
-            added = True
-            break
-
-        if not added:
-            log.warning(
-                "One-by-one fill failed (try %d). RAW (first 900): %r",
-                tries + 1,
-                (raw or "")[:900],
-            )
+            before = len(c.out)
+            try:
+                await _merge(
+                    tasks,
+                    lambda raw, asked: c.take(raw, phase="phase2_fill", avoid_max=60, asked=asked),
+                    lambda: c.full or c.llm_error,
+                    {t: 1 for t in tasks},
+                )
+            except DeadlineExceeded:
+                c.timed_out = True
+            c.observe_yield(model, topic_norm)
+            if len(c.out) == before:
+                log.warning("Parallel fill added nothing (tries %d/40)", tries)
+
+        if history is not None and history.hits:
+            log.info("Quiz: rejected %d near-duplicate(s) of the user's history", history.hits)
+
+        out = c.out
+        short = f"Quiz generation failed: only {len(out)}/{n} questions produced."
+        c.timed_out = c.timed_out or (len(out) < n and expired(deadline))
+        # out of time with some questions: a shorter quiz beats an error
+        partial = c.timed_out and bool(out)
+        if len(out) >= n:
+            outcome = "ok"
+        else:
+            outcome = "llm_error" if c.llm_error else ("deadline" if c.timed_out else "short")
+
+        if len(out) < n and on_question is None and not partial:
+            raise DeadlineExceeded() if c.timed_out else ValueError(short)
+
+        if not record_seen:
+            pass
+        elif history is not None:
+            history.record((_signature(q.question, q.choices), _starter3(q.question), q.question) for q in out)
+        elif store is not None and guild_id is not None and user_id is not None:
+            for q in out:
+                try:
+                    sig = _signature(q.question, q.choices)
+                    s3 = _starter3(q.question)
+                    if hasattr(store, "add_quiz_seen"):
+                        store.add_quiz_seen(
+                            guild_id, user_id, topic_norm, sig, s3, q.question
+                        )
+                except Exception:
+                    pass
+
+        if len(out) < n:
+            if partial:
+                log.warning("Quiz deadline reached: returning %d/%d question(s)", len(out), n)
+                return out
+            # streamed questions were already shown, so they are recorded above
+            raise DeadlineExceeded() if c.timed_out else ValueError(short)
+
+        return out[:n]
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        c.record(
+            store,
+            model=model,
+            topic_norm=topic_norm,
+            guild_id=guild_id,
+            user_id=user_id,
+            outcome=outcome,
+            wall_s=time.perf_counter() - started,
+        )
 
-        tries += 1
 
-    if len(out) < n:
-        raise ValueError(
-            f"Quiz generation failed: only {len(out)}/{n} questions produced."
-        )
+class QuizFeed:
+    """
+    Questions of one quiz in arrival order. The quiz can start on the first
+    question while `task` keeps generating the rest into `questions`;
+    consumers wait_for() the index they need next.
+    """
 
-    if store is not None and guild_id is not None and user_id is not None:
-        for q in out:
+    def __init__(self, expected: int):
+        self.expected = max(1, int(expected))
+        self.questions: List[QuizQuestion] = []
+        self.task: Optional[asyncio.Task] = None
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def push(self, q: QuizQuestion) -> None:
+        if len(self.questions) < self.expected:
+            self.questions.append(q)
+            self._changed.set()
+
+    @property
+    def done(self) -> bool:
+        return self.task is None or self.task.done()
+
+    @property
+    def total(self) -> int:
+        """
+        Questions this quiz will have: `expected` while generating, the
+        actual count once generation ended (possibly short).
+        """
+        return len(self.questions) if self.done else self.expected
+
+    def run(self, coro) -> None:
+        """
+        Start the background generation; errors end the feed early.
+        """
+
+        async def _runner() -> None:
             try:
-                sig = _signature(q.question, q.choices)
-                s3 = _starter3(q.question)
-                if hasattr(store, "add_quiz_seen"):
-                    store.add_quiz_seen(
-                        guild_id, user_id, topic_norm, sig, s3, q.question
-                    )
-            except Exception:
-                pass
-
-    return out[:n]
+                await coro
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error = e
+                if isinstance(e, ValueError):
+                    log.warning("Quiz feed ended short: %s", e)
+                else:
+                    log.warning("Quiz feed stopped: %s: %s", type(e).__name__, e)
+            finally:
+                self._changed.set()
+
+        self.task = asyncio.ensure_future(_runner())
+
+    async def wait_for(self, count: int, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until at least `count` questions exist. False if generation
+        ended (or timed out) first.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while len(self.questions) < count:
+            if self.done:
+                return False
+            self._changed.clear()
+            left = None if deadline is None else deadline - loop.time()
+            if left is not None and left <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), left)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def cancel(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from config import QUIZ_NEAR_DUP_THRESHOLD
+from app.services.bloom import BloomFilter
+from app.services.minhash import MinHasher
+
+log = logging.getLogger("MentraAI")
+
+HASHER = MinHasher(threshold=QUIZ_NEAR_DUP_THRESHOLD)
+
+
+class QuizSeenIndex:
+    """
+    One user's quiz_seen history for a topic:
+    - exact signatures in a Bloom filter blob (quiz_seen_filter), loaded
+      with one small read and written back with each batch of new questions;
+    - near-duplicates via the MinHash LSH buckets stored next to quiz_seen.
+      A lookup only reads the rows sharing a bucket with the candidate, so
+      paraphrases of thousands of past questions are caught without listing
+      them in the prompt.
+    The quiz_seen rows themselves are kept for audit and TTL pruning; the
+    filter is rebuilt from them every ttl_days / 2 so expired signatures
+    drop out.
+    """
+
+    def __init__(self, store, guild_id: int, user_id: int, topic_norm: str, *, ttl_days: int = 30):
+        self.store = store
+        self.guild_id = int(guild_id)
+        self.user_id = int(user_id)
+        self.topic = topic_norm
+        self.ttl_days = int(ttl_days)
+        self.sigs = BloomFilter()
+        self.hits = 0
+
+    @classmethod
+    def open(cls, store, guild_id: Optional[int], user_id: Optional[int], topic_norm: str) -> Optional["QuizSeenIndex"]:
+        """
+        Index for this user/topic, or None when there is no store or it
+        predates these tables.
+        """
+        if store is None or guild_id is None or user_id is None or not hasattr(store, "get_quiz_seen_filter"):
+            return None
+        index = cls(store, guild_id, user_id, topic_norm)
+        try:
+            index._load()
+        except Exception as e:
+            log.warning("quiz_seen filter load failed: %s", e)
+        return index
+
+    def _load(self) -> None:
+        row = self.store.get_quiz_seen_filter(self.guild_id, self.user_id, self.topic)
+        if row is not None:
+            bits, items, age_days = row
+            self.sigs = BloomFilter(data=bits, count=items)
+            if age_days < self.ttl_days / 2 and items <= self.sigs.capacity:
+                return
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        """
+        New filter from the unexpired quiz_seen rows; also hashes rows that
+        predate MinHash indexing.
+        """
+        self._backfill()
+        sigs = self.store.get_quiz_seen_sigs(self.guild_id, self.user_id, self.topic, ttl_days=self.ttl_days)
+        self.sigs = BloomFilter(capacity=max(2048, 2 * len(sigs)))
+        for sig in sigs:
+            self.sigs.add(sig)
+        self.store.reset_quiz_seen_filter(
+            self.guild_id, self.user_id, self.topic, self.sigs.to_bytes(), len(self.sigs)
+        )
+
+    def _backfill(self) -> None:
+        rows = self.store.get_quiz_seen_unhashed(self.guild_id, self.user_id, self.topic)
+        for seen_id, question in rows:
+            sig = HASHER.signature(question)
+            if sig is None:
+                self.store.set_quiz_seen_minhash(seen_id, self.guild_id, self.user_id, self.topic, b"", [])
+                continue
+            self.store.set_quiz_seen_minhash(
+                seen_id, self.guild_id, self.user_id, self.topic, HASHER.pack(sig), HASHER.buckets(sig)
+            )
+        if rows:
+            log.info("quiz_seen: indexed %d older question(s) for user %s", len(rows), self.user_id)
+
+    def seen(self, question: str, sig: Optional[str] = None) -> bool:
+        """
+        True if the user already saw this exact question (`sig`, checked in
+        the Bloom filter) or one with estimated Jaccard >= threshold.
+        """
+        if sig and sig in self.sigs:
+            self.hits += 1
+            return True
+        mh = HASHER.signature(question)
+        if mh is None:
+            return False
+        try:
+            rows = self.store.find_quiz_seen_near(
+                self.guild_id, self.user_id, self.topic, HASHER.buckets(mh), ttl_days=self.ttl_days
+            )
+        except Exception as e:
+            log.warning("quiz_seen near-duplicate lookup failed: %s", e)
+            return False
+        for _question, blob in rows:
+            other = HASHER.unpack(blob)
+            if other is not None and HASHER.similarity(mh, other) >= HASHER.threshold:
+                self.hits += 1
+                return True
+        return False
+
+    @staticmethod
+    def _minhash_fields(question: str) -> Dict[str, Any]:
+        sig = HASHER.signature(question)
+        if sig is None:
+            return {}
+        return {"minhash": HASHER.pack(sig), "buckets": HASHER.buckets(sig)}
+
+    def record(self, items: Iterable[Tuple[str, str, str]]) -> None:
+        """
+        Mark (sig, starter3, question) items as seen: audit rows, LSH
+        buckets and the updated filter in one write.
+        """
+        rows = []
+        for sig, starter3, question in items:
+            self.sigs.add(sig)
+            rows.append({"sig": sig, "starter3": starter3, "question": question, **self._minhash_fields(question)})
+        if not rows:
+            return
+        try:
+            self.store.add_quiz_seen_batch(
+                self.guild_id,
+                self.user_id,
+                self.topic,
+                rows,
+                filter_bits=self.sigs.to_bytes(),
+                filter_items=len(self.sigs),
+            )
+        except Exception as e:
+            log.warning("quiz_seen write failed: %s", e)
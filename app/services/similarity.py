@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.text import STOP_WORDS
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+# Question framing shared by questions on any subject ("which tool is
+# commonly used to ..."): dropped like stop words so the subject decides
+_FRAMING = frozenset(
+    {
+        "do", "does", "did", "can", "could", "you", "your", "it", "its", "s",
+        "use", "used", "using", "let", "lets", "allow", "allows",
+        "most", "best", "main", "key", "primary", "purpose", "one", "following",
+        "common", "commonly", "often", "typically", "usually",
+        "attack", "vulnerability",
+    }
+)
+# Acronyms and product names (SMB, LDAP, DCSync) name the subject
+_TERM_WEIGHT = 1.5
+_SUFFIXES = (("ing", 4), ("ed", 4), ("es", 4), ("s", 3))
+
+
+def _stem(word: str) -> str:
+    """
+    Light suffix stripping so "enumerates", "enumerated" and "enumerate"
+    share a token; character n-grams cover the rest.
+    """
+    for suf, keep in _SUFFIXES:
+        if word.endswith(suf) and len(word) - len(suf) >= keep:
+            word = word[: -len(suf)]
+            break
+    if len(word) > 4 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+class SimilarityService:
+    """
+    Local text similarity without a model or network: hashed n-gram
+    vectors (word unigrams, word bigrams and character 4-grams) in a fixed
+    `dim`-sized space, compared by cosine in batches with NumPy.
+
+    Weights are fixed, so a score depends only on the two texts, never on
+    what the process has seen before: stop words and question framing are
+    dropped, words are lightly stemmed, and acronyms / product names weigh
+    more than ordinary words. Character n-grams make inflections and
+    reordered wording score close ("enumerate SMB shares" vs "SMB share
+    enumeration"), which token Jaccard misses. Thresholds are calibrated
+    on the paraphrase set in benchmarks/similarity.py.
+
+    Vectors are computed once per text (LRU cache).
+    """
+
+    def __init__(self, *, dim: int = 4096, cache_size: int = 8192):
+        self.dim = int(dim)
+        self.cache_size = int(cache_size)
+        self._cache: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # -----------------------------
+    # Vectors
+    # -----------------------------
+    @staticmethod
+    def _words(text: str) -> List[Tuple[str, float]]:
+        out: List[Tuple[str, float]] = []
+        for raw in _WORD_RE.findall(text or ""):
+            w = raw.lower()
+            if w in STOP_WORDS or w in _FRAMING:
+                continue
+            term = len(raw) >= 2 and sum(ch.isupper() for ch in raw) >= 2
+            out.append((_stem(w), _TERM_WEIGHT if term else 1.0))
+        return out
+
+    def _features(self, text: str) -> Dict[int, float]:
+        words = self._words(text)
+        counts: Dict[int, float] = {}
+
+        def _add(feature: str, weight: float) -> None:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            # sign bit halves the cost of hash collisions
+            idx, sign = h % self.dim, (1.0 if (h >> 63) & 1 else -1.0)
+            counts[idx] = counts.get(idx, 0.0) + sign * weight
+
+        for w, weight in words:
+            _add("w:" + w, weight)
+            padded = f" {w} "
+            for i in range(max(1, len(padded) - 3)):
+                _add("c:" + padded[i : i + 4], 0.35 * weight)
+        for (a, _), (b, _) in zip(words, words[1:]):
+            _add(f"b:{a} {b}", 0.5)
+        return counts
+
+    def _tf(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cached sublinear-TF vector in sparse form (indices, values).
+        """
+        key = text or ""
+        vec = self._cache.get(key)
+        if vec is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vec
+
+        self.misses += 1
+        feats = {i: v for i, v in self._features(key).items() if v}
+        idx = np.fromiter(feats.keys(), dtype=np.int64, count=len(feats))
+        val = np.fromiter(
+            (math.copysign(math.log1p(abs(v)), v) for v in feats.values()), dtype=np.float32, count=len(feats)
+        )
+
+        vec = (idx, val)
+        self._cache[key] = vec
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return vec
+
+    def matrix(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Vectors for `texts`, L2-normalised (so cosine is a dot product).
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        m = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, t in enumerate(texts):
+            idx, val = self._tf(t)
+            m[row, idx] = val
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        return m / np.where(norms > 0, norms, 1.0)
+
+    def vector(self, text: str) -> np.ndarray:
+        return self.matrix([text])[0]
+
+    # -----------------------------
+    # Comparisons
+    # -----------------------------
+    def cosine(self, a: str, b: str) -> float:
+        m = self.matrix([a, b])
+        return float(m[0] @ m[1])
+
+    def max_similarity(self, text: str, others: Sequence[str]) -> float:
+        """
+        Highest cosine between `text` and any of `others` (0.0 if none).
+        """
+        if not others:
+            return 0.0
+        m = self.matrix([text, *others])
+        return float((m[1:] @ m[0]).max())
+
+    def max_similarities(self, texts: Sequence[str], others: Sequence[str]) -> np.ndarray:
+        """
+        For each of `texts`, its highest cosine against `others`, in one
+        matrix product.
+        """
+        if not texts or not others:
+            return np.zeros(len(texts), dtype=np.float32)
+        m = self.matrix([*texts, *others])
+        return (m[: len(texts)] @ m[len(texts) :].T).max(axis=1)
+
+    def max_pairwise(self, texts: Sequence[str]) -> float:
+        """
+        Highest cosine between two different items of `texts`.
+        """
+        if len(texts) < 2:
+            return 0.0
+        m = self.matrix(texts)
+        sims = m @ m.T
+        iu = np.triu_indices(len(texts), k=1)
+        return float(sims[iu].max())
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+# Shared instance: the vector cache is reused by every caller
+SIMILARITY = SimilarityService()
+
@@ -2,7 +2,10 @@ from __future__ import annotations
 
 import asyncio
 import re
-from typing import List
+from typing import List, Optional
+
+from app.services.llm_deadline import Deadline, DeadlineExceeded, expired
+from app.services.llm_scheduler import PRIORITY_BACKGROUND
 
 
 def _normalize_plan_text(text: str) -> str:
@@ -90,6 +93,7 @@ async def _extract_key_points(
     api_key: str,
     notes: str,
     timeout_sec: int,
+    deadline: Optional[Deadline] = None,
 ) -> str:
     """
     Step 1: compress notes into key points (reduces hallucination, improves alignment).
@@ -119,6 +123,10 @@ async def _extract_key_points(
             system=system,
             max_tokens=340,
             temperature=0.2,
+            cache=True,
+            priority=PRIORITY_BACKGROUND,
+            site="notes.key_points",
+            **({"deadline": deadline} if deadline else {}),
         ),
         timeout=timeout_sec,
     )
@@ -141,6 +149,7 @@ async def generate_plan_from_notes(
     days: int = 7,
     title: str = "Your Notes",
     timeout_sec: int = 35,
+    deadline: Optional[Deadline] = None,
 ) -> str:
     """
     Generates a 5–10 day plan from pasted notes.
@@ -149,6 +158,8 @@ async def generate_plan_from_notes(
       Learn (2 bullets)
       Do (1 safe study task)
       Check (3 questions)
+    Past `deadline` the missing-days retries stop and the plan so far is
+    returned.
     """
     days = clamp(days, 5, 10)
 
@@ -159,7 +170,7 @@ async def generate_plan_from_notes(
         notes = notes[:18000]
 
     # Step 1: key points
-    key_points = await _extract_key_points(llm, api_key, notes, timeout_sec=timeout_sec)
+    key_points = await _extract_key_points(llm, api_key, notes, timeout_sec=timeout_sec, deadline=deadline)
     if not key_points:
         key_points = "- (No key points extracted)"
 
@@ -233,18 +244,28 @@ async def generate_plan_from_notes(
         chunk = ""
 
         while attempts < 3:
+            if chunk and expired(deadline):
+                break
             attempts += 1
 
-            raw = await asyncio.wait_for(
-                llm.ask(
-                    api_key=api_key,
-                    prompt=prompt,
-                    system=system,
-                    max_tokens=1100,
-                    temperature=0.45,
-                ),
-                timeout=timeout_sec,
-            )
+            try:
+                raw = await asyncio.wait_for(
+                    llm.ask(
+                        api_key=api_key,
+                        prompt=prompt,
+                        system=system,
+                        max_tokens=1100,
+                        temperature=0.45,
+                        priority=PRIORITY_BACKGROUND,
+                        site="notes.plan_chunk" if attempts == 1 else "notes.missing_days",
+                        **({"deadline": deadline} if deadline else {}),
+                    ),
+                    timeout=timeout_sec,
+                )
+            except DeadlineExceeded:
+                if not chunk:
+                    raise
+                break
 
             chunk = (raw or "").strip()
             chunk = _sanitize_answer(chunk)
@@ -12,8 +12,20 @@ LOADING_TEXT = {
 }
 
 
-async def start_loading(interaction: discord.Interaction, kind: str = "default") -> discord.Message | None:
-    text = LOADING_TEXT.get(kind, LOADING_TEXT["default"])
+def queue_note(queue_ahead: int) -> str:
+    if queue_ahead <= 0:
+        return ""
+    return f"\n⏳ {queue_ahead} request(s) ahead of you in the queue."
+
+
+def busy_text(retry_after: float = 5.0) -> str:
+    return f"🚦 MentraAI is busy right now. Try again in ~{max(1, int(retry_after))}s."
+
+
+async def start_loading(
+    interaction: discord.Interaction, kind: str = "default", queue_ahead: int = 0
+) -> discord.Message | None:
+    text = LOADING_TEXT.get(kind, LOADING_TEXT["default"]) + queue_note(queue_ahead)
     try:
         return await interaction.followup.send(text, ephemeral=True)
     except Exception:
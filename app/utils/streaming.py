@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+log = logging.getLogger("MentraAI")
+
+# Discord allows ~5 message edits per 5s per channel: stay well below it.
+STREAM_EDIT_INTERVAL_S = 1.5
+STREAM_FIRST_TOKEN_TIMEOUT_S = 25
+STREAM_TOTAL_TIMEOUT_S = 90
+STREAM_CURSOR = " ▌"
+
+
+async def stream_with_edits(
+    chunks: AsyncIterator[str],
+    *,
+    edit: Callable[[str], Awaitable[None]],
+    first_token_timeout: float = STREAM_FIRST_TOKEN_TIMEOUT_S,
+    total_timeout: float = STREAM_TOTAL_TIMEOUT_S,
+    min_interval: float = STREAM_EDIT_INTERVAL_S,
+) -> str:
+    """
+    Consume a token stream and call `edit(partial_text)` at most once per
+    `min_interval` seconds. Returns the full text.
+
+    Raises asyncio.TimeoutError if the first token (or the whole stream)
+    takes too long.
+    """
+    it = chunks.__aiter__()
+    started = time.monotonic()
+    last_edit = 0.0
+    parts: list[str] = []
+
+    try:
+        while True:
+            if parts:
+                timeout = total_timeout - (time.monotonic() - started)
+                if timeout <= 0:
+                    raise asyncio.TimeoutError()
+            else:
+                timeout = first_token_timeout
+
+            try:
+                piece = await asyncio.wait_for(it.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+
+            if not piece:
+                continue
+            parts.append(piece)
+
+            now = time.monotonic()
+            if now - last_edit >= min_interval:
+                last_edit = now
+                try:
+                    await edit("".join(parts))
+                except Exception:
+                    # intermediate edits are best-effort; the final render wins
+                    log.debug("Stream edit failed", exc_info=True)
+    finally:
+        aclose = getattr(it, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
+
+    return "".join(parts)
@@ -140,7 +140,7 @@ def chunk_text(text: str, max_len: int) -> List[str]:
 # -----------------------------
 # Fuzzy dedupe helpers (Jaccard)
 # -----------------------------
-_STOP = {
+STOP_WORDS = {
     "the","a","an","and","or","to","of","in","on","for","with","by","at","from",
     "is","are","was","were","be","been","being","this","that","these","those",
     "what","which","who","when","where","why","how"
@@ -153,7 +153,7 @@ def _norm(s: str) -> str:
     return s
 
 def _tokens(s: str) -> Set[str]:
-    return {t for t in _norm(s).split() if len(t) >= 3 and t not in _STOP}
+    return {t for t in _norm(s).split() if len(t) >= 3 and t not in STOP_WORDS}
 
 def jaccard_sim(a: str, b: str) -> float:
     A, B = _tokens(a), _tokens(b)
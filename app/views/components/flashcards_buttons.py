@@ -33,6 +33,17 @@ class NextCardButton(discord.ui.Button):
         await view.next(interaction)
 
 
+class ForgotCardButton(discord.ui.Button):
+    def __init__(self):
+        super().__init__(label="Forgot ✖", style=discord.ButtonStyle.secondary)
+
+    async def callback(self, interaction: discord.Interaction):
+        view = self.view
+        if not view or not hasattr(view, "forgot"):
+            return await internal_error(interaction)
+        await view.forgot(interaction)
+
+
 class ShuffleButton(discord.ui.Button):
     def __init__(self):
         super().__init__(label="Shuffle 🔀", style=discord.ButtonStyle.secondary)
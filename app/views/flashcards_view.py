@@ -1,6 +1,6 @@
 import random
 import time
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 import discord
 
@@ -8,6 +8,7 @@ from app.models.cards import Flashcard
 from app.utils.discord_ui import pretty_bar, elapsed_s
 from app.views.components.flashcards_buttons import (
     BackCardButton,
+    ForgotCardButton,
     RevealButton,
     NextCardButton,
     ShuffleButton,
@@ -55,12 +56,26 @@ def flashcard_embed(
 
 
 class FlashcardsView(discord.ui.View):
-    def __init__(self, owner_id: int, topic: str, cards: List[Flashcard]):
+    def __init__(
+        self,
+        owner_id: int,
+        topic: str,
+        cards: List[Flashcard],
+        *,
+        on_grade: Optional[Callable[[Flashcard, bool], None]] = None,
+    ):
+        """
+        on_grade(card, remembered): spaced-repetition hook. When set, a
+        Forgot button sits next to Next (which then means "knew it") and
+        each card is graded once per session.
+        """
         super().__init__(timeout=900)
 
         self.owner_id = owner_id
         self.topic = topic
         self.cards = cards
+        self.on_grade = on_grade
+        self.graded: set[int] = set()  # ids of cards graded this session
 
         self.i = 0
         self.revealed_set: set[int] = set()  # per-card revealed
@@ -71,10 +86,14 @@ class FlashcardsView(discord.ui.View):
         self.btn_back = BackCardButton()
         self.btn_reveal = RevealButton()
         self.btn_next = NextCardButton()
+        self.btn_forgot = ForgotCardButton()
         self.btn_shuffle = ShuffleButton()
 
         self.add_item(self.btn_back)
         self.add_item(self.btn_reveal)
+        if on_grade is not None:
+            self.btn_next.label = "Knew it ✔"
+            self.add_item(self.btn_forgot)
         self.add_item(self.btn_next)
         self.add_item(self.btn_shuffle)
 
@@ -97,6 +116,7 @@ class FlashcardsView(discord.ui.View):
         self.btn_back.disabled = (self.i == 0)
         self.btn_reveal.disabled = revealed
         self.btn_next.disabled = (not revealed)
+        self.btn_forgot.disabled = (not revealed)
 
     def current_embed(self) -> discord.Embed:
         c = self.cards[self.i]
@@ -124,7 +144,24 @@ class FlashcardsView(discord.ui.View):
         self._refresh_buttons()
         await interaction.response.edit_message(embed=self.current_embed(), view=self)
 
+    def _grade(self, remembered: bool) -> None:
+        c = self.cards[self.i]
+        if self.on_grade is None or c.id is None or c.id in self.graded:
+            return
+        self.graded.add(c.id)
+        try:
+            self.on_grade(c, remembered)
+        except Exception:
+            # a lost review only changes when the card comes back
+            pass
+
     async def next(self, interaction: discord.Interaction):
+        await self._advance(interaction, remembered=True)
+
+    async def forgot(self, interaction: discord.Interaction):
+        await self._advance(interaction, remembered=False)
+
+    async def _advance(self, interaction: discord.Interaction, *, remembered: bool):
         if not self._owner_only(interaction):
             await interaction.response.send_message("❌ These flashcards are not yours.", ephemeral=True)
             return
@@ -133,6 +170,7 @@ class FlashcardsView(discord.ui.View):
             await interaction.response.send_message("🔒 Reveal the answer first.", ephemeral=True)
             return
 
+        self._grade(remembered)
         self.i += 1
         self._refresh_buttons()
 
@@ -153,6 +191,12 @@ class FlashcardsView(discord.ui.View):
                     f"**Time:** {elapsed}s"
                 ),
             )
+            if self.graded:
+                summary.add_field(
+                    name="Reviews",
+                    value=f"{len(self.graded)} card(s) scheduled; **/flashcards** on this topic brings them back when due.",
+                    inline=False,
+                )
             summary.add_field(
                 name="Next move",
                 value="Run **/flashcards** again or switch to **/quiz** to validate knowledge.",
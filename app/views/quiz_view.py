@@ -1,12 +1,15 @@
 import asyncio
 import logging
 import time
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
 import discord
 
 from app.constants import AI_FOOTER
 from app.models.quiz import QuizQuestion
+from app.services.llm_deadline import Deadline
+from app.services.quiz_explain import EXPLAINER
+from app.services.quiz_gen import QuizFeed
 from app.utils.discord_ui import pretty_bar
 from app.views.components.quiz_buttons import AnswerButton, NextButton
 
@@ -22,6 +25,12 @@ OPTIONS_FIELD_SOFT_MAX = 950
 REVIEW_MAX_ITEMS = 5
 REVIEW_EXPL_MAX = 120
 
+# How long "Next" waits for a question that is still being generated
+NEXT_WAIT_MAX_S = 90
+
+# How long the final review waits for missing explanations (QUIZ_LAZY_EXPLAIN)
+REVIEW_EXPLAIN_WAIT_S = 10
+
 
 def _ellipsize(s: str, max_len: int) -> str:
     s = (s or "").strip()
@@ -82,6 +91,11 @@ class QuizView(discord.ui.View):
     - Answer -> show Result + explanation
     - Next -> next question
     - Last question: Next becomes Finish, final summary is shown only when clicked
+    - With a QuizFeed, questions may still be generating: Next waits for
+      the next one, and a feed that ends short makes the quiz shorter
+    - Questions generated without an explanation (QUIZ_LAZY_EXPLAIN) get
+      one from `llm` only when answered wrong; the final review fetches
+      any still missing in one request
     """
 
     def __init__(
@@ -94,6 +108,10 @@ class QuizView(discord.ui.View):
         questions: List[QuizQuestion],
         timed: bool = True,
         seconds_per_question: int = 60,
+        feed: Optional[QuizFeed] = None,
+        llm=None,
+        api_key: str = "",
+        on_finish: Optional[Callable[[], None]] = None,
     ):
         super().__init__(timeout=1200)
 
@@ -101,7 +119,13 @@ class QuizView(discord.ui.View):
         self.owner_id = owner_id
         self.username = username
         self.topic = topic
-        self.questions = questions
+        self.feed = feed
+        self.questions = feed.questions if feed is not None else questions
+        self.llm = llm
+        self.api_key = api_key
+        self._explain_task: Optional[asyncio.Task] = None
+        # called once when the summary is shown (e.g. Prefetcher hooks)
+        self.on_finish = on_finish
 
         self.timed = timed
         self.seconds_per_question = max(5, int(seconds_per_question))
@@ -152,6 +176,12 @@ class QuizView(discord.ui.View):
         self._last_click_ts = now
         return False
 
+    def _total(self) -> int:
+        return self.feed.total if self.feed is not None else len(self.questions)
+
+    def _is_last(self) -> bool:
+        return self.current >= self._total() - 1
+
     def _labels_for(self, n: int) -> List[str]:
         n = max(2, min(4, int(n)))
         return ["A", "B", "C", "D"][:n]
@@ -217,6 +247,58 @@ class QuizView(discord.ui.View):
 
         self.next_button.disabled = not self.answered
 
+    # -----------------------------
+    # explanations
+    # -----------------------------
+    def _set_feedback(self, head: str, q: QuizQuestion, *, max_len: int, fetch: bool) -> None:
+        """
+        Result line plus the explanation. A question without one yet gets
+        it fetched in the background when `fetch` (wrong answers).
+        """
+        expl = _safe_explain(getattr(q, "explanation", "") or "", max_len=max_len)
+        if expl:
+            self.last_feedback = f"{head}\n📝 {expl}"
+            return
+        self.last_feedback = head
+        if fetch and self.llm is not None:
+            self.last_feedback += "\n📝 _Explaining…_"
+            self._explain_task = asyncio.create_task(self._explain_current(head, q, max_len))
+
+    async def _explain_current(self, head: str, q: QuizQuestion, max_len: int) -> None:
+        index = self.current
+        await EXPLAINER.explain(self.llm, api_key=self.api_key, questions=[q])
+        async with self._lock:
+            if self.current != index or not self.answered or not self._message:
+                return
+            expl = _safe_explain(getattr(q, "explanation", "") or "", max_len=max_len)
+            self.last_feedback = f"{head}\n📝 {expl}" if expl else head
+            try:
+                await self._message.edit(embed=self.build_embed(), view=self)
+            except Exception:
+                pass
+
+    async def _explain_wrong(self) -> None:
+        """
+        Fill the review's missing explanations with one batched request.
+        """
+        if self.llm is None:
+            return
+        pending = [
+            (w, self.questions[int(w["num"]) - 1])
+            for w in self.wrong_recap[:REVIEW_MAX_ITEMS]
+            if not w.get("explanation")
+        ]
+        if not pending:
+            return
+        await EXPLAINER.explain(
+            self.llm,
+            api_key=self.api_key,
+            questions=[q for _, q in pending],
+            deadline=Deadline.after(REVIEW_EXPLAIN_WAIT_S),
+        )
+        for w, q in pending:
+            w["explanation"] = str(getattr(q, "explanation", "") or "")
+
     # -----------------------------
     # attempt logging (NEW)
     # -----------------------------
@@ -321,7 +403,7 @@ class QuizView(discord.ui.View):
 
         e.description = (
             f"**Topic:** {self.topic}\n\n"
-            f"**Q{self.current + 1}/{len(self.questions)}**\n\n"
+            f"**Q{self.current + 1}/{self._total()}**\n\n"
             f"**{_ellipsize(q.question, 800)}**\n\n"
             f"{opt_value}"
         )
@@ -333,14 +415,15 @@ class QuizView(discord.ui.View):
 
         attempted = self.attempted_count()
         acc = self.accuracy_pct()
-        bar_w = min(12, max(6, len(self.questions)))
-        bar = pretty_bar(self.current + 1, len(self.questions), width=bar_w)
+        total = self._total()
+        bar_w = min(12, max(6, total))
+        bar = pretty_bar(self.current + 1, total, width=bar_w)
         timer_part = f"⏳ {self.seconds_left()}s left" if self.timed else "⏱ no limit"
 
         e.set_footer(
             text=(
                 f"Score {self.score}/{attempted} • Accuracy {acc:.0f}% • {timer_part}\n"
-                f"{self.current + 1}/{len(self.questions)} {bar}\n"
+                f"{self.current + 1}/{total} {bar}\n"
                 f"{AI_FOOTER}"
             )
         )
@@ -410,9 +493,11 @@ class QuizView(discord.ui.View):
             self.answered = True
             self.next_button.disabled = False
 
-            expl = _safe_explain(getattr(q, "explanation", "") or "", max_len=160)
-            self.last_feedback = (
-                f"⏱ **Time’s up!** Correct answer: **{labels[correct_idx]}**\n📝 {expl}"
+            self._set_feedback(
+                f"⏱ **Time’s up!** Correct answer: **{labels[correct_idx]}**",
+                q,
+                max_len=160,
+                fetch=True,
             )
 
             # NEW: log attempt (timeout => is_correct False, user_answer None)
@@ -428,7 +513,7 @@ class QuizView(discord.ui.View):
                 source="discord",
             )
 
-            if self.current >= len(self.questions) - 1:
+            if self._is_last():
                 self._finished_ready = True
                 try:
                     self.next_button.label = "Finish ✅"
@@ -508,13 +593,13 @@ class QuizView(discord.ui.View):
                 self.answered = True
                 self.next_button.disabled = False
 
-                expl_short = _safe_explain(
-                    getattr(q, "explanation", "") or "", max_len=180
-                )
-                self.last_feedback = (
-                    f"✅ **Correct**\n📝 {expl_short}"
+                self._set_feedback(
+                    "✅ **Correct**"
                     if picked_correct
-                    else f"❌ **Wrong** — Correct: **{labels[correct_idx]}**\n📝 {expl_short}"
+                    else f"❌ **Wrong** — Correct: **{labels[correct_idx]}**",
+                    q,
+                    max_len=180,
+                    fetch=not picked_correct,
                 )
 
                 # NEW: log attempt for this question
@@ -530,7 +615,7 @@ class QuizView(discord.ui.View):
                     source="discord",
                 )
 
-                if self.current >= len(self.questions) - 1:
+                if self._is_last():
                     self._finished_ready = True
                     try:
                         self.next_button.label = "Finish ✅"
@@ -566,7 +651,26 @@ class QuizView(discord.ui.View):
                     await self._edit(interaction, embed=self.build_embed())
                     return
 
+                if (
+                    self.feed is not None
+                    and not self._finished_ready
+                    and self.current + 1 >= len(self.questions)
+                ):
+                    # next question is still being generated
+                    if not self.feed.done:
+                        self.next_button.disabled = True
+                        self.last_feedback = (self.last_feedback + "\n⏳ Preparing the next question…").strip()
+                        await self._edit(interaction, embed=self.build_embed())
+                    await self.feed.wait_for(self.current + 2, timeout=NEXT_WAIT_MAX_S)
+                    if self.current + 1 >= len(self.questions):
+                        # generation ended short: this was the last question
+                        self.feed.cancel()
+                        self._finished_ready = True
+
                 if self.current >= len(self.questions) - 1 and self._finished_ready:
+                    if self.feed is not None:
+                        self.feed.cancel()
+
                     for item in self.children:
                         item.disabled = True
 
@@ -618,13 +722,15 @@ class QuizView(discord.ui.View):
 
                     # Review
                     if self.wrong_recap:
+                        await self._explain_wrong()
                         review_lines: List[str] = []
                         for w in self.wrong_recap[:REVIEW_MAX_ITEMS]:
                             expl = _safe_explain(
                                 w.get("explanation", ""), max_len=REVIEW_EXPL_MAX
                             )
                             review_lines.append(
-                                f"• Q{w['num']}: **{w['your']}** → **{w['correct']}** — {expl}"
+                                f"• Q{w['num']}: **{w['your']}** → **{w['correct']}**"
+                                + (f" — {expl}" if expl else "")
                             )
                         if len(self.wrong_recap) > REVIEW_MAX_ITEMS:
                             review_lines.append(
@@ -653,6 +759,11 @@ class QuizView(discord.ui.View):
                         await self._message.edit(embed=end, view=None)
                     else:
                         await interaction.response.edit_message(embed=end, view=None)
+                    if self.on_finish is not None:
+                        try:
+                            self.on_finish()
+                        except Exception:
+                            log.exception("Quiz on_finish hook failed")
                     return
 
                 self.current += 1
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 import secrets
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any, List
 
 from fastapi import Request
@@ -9,6 +10,10 @@ from fastapi.templating import Jinja2Templates
 
 from app.db import KeyStore
 from app.services.llm import LLMClient
+from app.services.llm_cache import LLMCache
+from app.services.llm_cassette import LLMCassette
+from app.services.llm_router import LLMRouter, backends_from_env
+from app.services.llm_scheduler import LLMScheduler
 
 # -----------------------------
 # Settings / env
@@ -20,6 +25,71 @@ except Exception:
     OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:11434/v1")
     DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "llama3.1")
 
+try:
+    from config import (
+        LLM_TIMEOUT_S,
+        LLM_POOL_MAX_CONNECTIONS,
+        LLM_POOL_MAX_KEEPALIVE,
+        LLM_POOL_KEEPALIVE_EXPIRY_S,
+        LLM_HTTP2,
+        LLM_CACHE_ENABLED,
+        LLM_CACHE_MAX_ITEMS,
+        LLM_CACHE_MAX_ROWS,
+        LLM_CACHE_TTL_S,
+        LLM_SCHED_MIN_CONCURRENCY,
+        LLM_SCHED_MAX_CONCURRENCY,
+        LLM_SCHED_RPM,
+        LLM_SCHED_TARGET_LATENCY_S,
+        LLM_SCHED_MAX_QUEUE,
+        LLM_FALLBACKS,
+        LLM_MAX_RETRIES,
+        LLM_BACKOFF_BASE_S,
+        LLM_BACKOFF_MAX_S,
+        LLM_BREAKER_FAILURES,
+        LLM_BREAKER_COOLDOWN_S,
+        LLM_HEDGE,
+        LLM_HEDGE_MIN_DELAY_S,
+        LLM_HEDGE_MAX_DELAY_S,
+        LLM_SUPPORTS_N,
+        LLM_STRUCTURED_OUTPUT,
+        LLM_CASSETTE_MODE,
+        LLM_CASSETTE_PATH,
+    )
+except Exception:
+    LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+    LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+    LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+    LLM_POOL_KEEPALIVE_EXPIRY_S = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY_S", "30"))
+    LLM_HTTP2 = os.getenv("LLM_HTTP2", "1").strip().lower() in ("1", "true", "yes", "on")
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+    LLM_CACHE_MAX_ITEMS = int(os.getenv("LLM_CACHE_MAX_ITEMS", "512"))
+    LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "5000"))
+    LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(24 * 3600)))
+    LLM_SCHED_MIN_CONCURRENCY = int(os.getenv("LLM_SCHED_MIN_CONCURRENCY", "1"))
+    LLM_SCHED_MAX_CONCURRENCY = int(os.getenv("LLM_SCHED_MAX_CONCURRENCY", "8"))
+    LLM_SCHED_RPM = float(os.getenv("LLM_SCHED_RPM", "0"))
+    LLM_SCHED_TARGET_LATENCY_S = float(os.getenv("LLM_SCHED_TARGET_LATENCY_S", "20"))
+    LLM_SCHED_MAX_QUEUE = int(os.getenv("LLM_SCHED_MAX_QUEUE", "64"))
+    LLM_FALLBACKS = os.getenv("LLM_FALLBACKS", "").strip()
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+    LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+    LLM_HEDGE = os.getenv("LLM_HEDGE", "0").strip().lower() in ("1", "true", "yes", "on")
+    LLM_HEDGE_MIN_DELAY_S = float(os.getenv("LLM_HEDGE_MIN_DELAY_S", "1.5"))
+    LLM_HEDGE_MAX_DELAY_S = float(os.getenv("LLM_HEDGE_MAX_DELAY_S", "8"))
+    LLM_SUPPORTS_N = os.getenv("LLM_SUPPORTS_N", "0").strip().lower() in ("1", "true", "yes", "on")
+    LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "auto").strip().lower()
+    LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "").strip().lower()
+    LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "./data/llm_cassette.jsonl.gz")
+
+try:
+    from config import METRICS_TOKEN, NOTES_PLAN_SLA_S
+except Exception:
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+    NOTES_PLAN_SLA_S = float(os.getenv("NOTES_PLAN_SLA_S", "120"))
+
 # ---- Discord OAuth env ----
 DISCORD_CLIENT_ID = os.getenv("DISCORD_CLIENT_ID", "")
 DISCORD_CLIENT_SECRET = os.getenv("DISCORD_CLIENT_SECRET", "")
@@ -47,6 +117,49 @@ store = KeyStore(DB_PATH)
 
 provider = os.getenv("LLM_PROVIDER", "").strip().lower()
 
+_llm_opts = dict(
+    timeout=LLM_TIMEOUT_S,
+    max_connections=LLM_POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY_S,
+    http2=LLM_HTTP2,
+    cache=(
+        LLMCache(
+            DB_PATH,
+            max_items=LLM_CACHE_MAX_ITEMS,
+            max_rows=LLM_CACHE_MAX_ROWS,
+            ttl_s=LLM_CACHE_TTL_S,
+        )
+        if LLM_CACHE_ENABLED
+        else None
+    ),
+    scheduler=LLMScheduler(
+        min_concurrency=LLM_SCHED_MIN_CONCURRENCY,
+        max_concurrency=LLM_SCHED_MAX_CONCURRENCY,
+        rpm=LLM_SCHED_RPM,
+        target_latency_s=LLM_SCHED_TARGET_LATENCY_S,
+        max_queue=LLM_SCHED_MAX_QUEUE,
+    ),
+    router=LLMRouter(
+        backends_from_env(LLM_FALLBACKS),
+        max_retries=LLM_MAX_RETRIES,
+        backoff_base_s=LLM_BACKOFF_BASE_S,
+        backoff_max_s=LLM_BACKOFF_MAX_S,
+        breaker_failures=LLM_BREAKER_FAILURES,
+        breaker_cooldown_s=LLM_BREAKER_COOLDOWN_S,
+        hedge=LLM_HEDGE,
+        hedge_min_delay_s=LLM_HEDGE_MIN_DELAY_S,
+        hedge_max_delay_s=LLM_HEDGE_MAX_DELAY_S,
+    ),
+    cassette=(
+        LLMCassette(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE)
+        if LLM_CASSETTE_MODE
+        else None
+    ),
+    supports_n=LLM_SUPPORTS_N,
+    structured_output=LLM_STRUCTURED_OUTPUT,
+)
+
 if provider == "groq":
     llm = LLMClient(
         base_url="https://api.groq.com/openai/v1",
@@ -55,6 +168,7 @@ if provider == "groq":
         openai_default_model=os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"),
         prefer_responses_api=False,   # Groq NON usa /responses
         force_chat_completions=True,
+        **_llm_opts,
     )
 else:
     llm = LLMClient(
@@ -63,9 +177,22 @@ else:
         openai_base_url=os.getenv("OPENAI_REMOTE_BASE_URL", "").strip() or None,
         openai_default_model=os.getenv("OPENAI_REMOTE_MODEL", "").strip() or None,
         prefer_responses_api=True,
+        **_llm_opts,
     )
 
 
+@asynccontextmanager
+async def lifespan(app):
+    """
+    FastAPI lifespan: open the pooled LLM clients on startup, close on shutdown.
+    """
+    await llm.open()
+    try:
+        yield
+    finally:
+        await llm.aclose()
+
+
 # -----------------------------
 # Session helpers
 # -----------------------------
@@ -19,6 +19,8 @@ from app.web.core.deps import (
     STATIC_DIR,
     templates,
     store,
+    lifespan,
+    METRICS_TOKEN,
 )
 
 from app.web.routes.notes import router as notes_router
@@ -27,12 +29,13 @@ from app.web.routes.pages import router as pages_router
 from app.web.routes.api import router as api_router
 from app.web.routes.agent_api import router as agent_router
 from app.web.routes.mentrascan import router as mentrascan_router
+from app.web.routes.metrics import router as metrics_router
 
 
 # -----------------------------
 # App
 # -----------------------------
-app = FastAPI(title="MentraAI Dashboard")
+app = FastAPI(title="MentraAI Dashboard", lifespan=lifespan)
 
 # -----------------------------
 # Rate limiting
@@ -133,4 +136,7 @@ app.include_router(pages_router)
 app.include_router(api_router)
 app.include_router(agent_router)
 app.include_router(notes_router)
-app.include_router(mentrascan_router)
\ No newline at end of file
+app.include_router(mentrascan_router)
+# /metrics only when a token protects it (the bot listener stays local)
+if METRICS_TOKEN:
+    app.include_router(metrics_router)
@@ -9,6 +9,7 @@ from fastapi.responses import JSONResponse
 from app.web.core.deps import llm, sid, agent_key, agent_hist_clear
 from app.web.core.ratelimit import limiter
 from app.prompts.agent_prompts import load_agent_prompt
+from app.services.llm_scheduler import LLMBusy
 
 router = APIRouter(prefix="/api/agent", tags=["agent"])
 
@@ -97,6 +98,13 @@ async def agent_chat(request: Request, payload: dict = Body(...)):
             system=system,
             max_tokens=1000,
             temperature=0.5,
+            site="agent",
+        )
+    except LLMBusy as e:
+        return JSONResponse(
+            {"error": str(e)},
+            status_code=503,
+            headers={"Retry-After": str(int(e.retry_after))},
         )
     except Exception as e:
         return JSONResponse({"error": f"Agent error: {e}"}, status_code=500)
@@ -12,6 +12,9 @@ from fastapi.responses import JSONResponse
 from slowapi import Limiter
 
 from app.web.core.ratelimit import limiter
+from app.services.json_repair import parse_json_object
+from app.services.llm_scheduler import LLMBusy, PRIORITY_GENERATION
+from app.services.llm_schemas import MENTRASCAN_SCHEMA
 from app.prompts.mentra_scan import MENTRASCAN_SYSTEM, build_mentrascan_prompt
 from app.web.core.deps import llm, sid
 
@@ -129,7 +132,8 @@ def _extract_any_json_object(raw: str) -> Tuple[Optional[Dict[str, Any]], str]:
         except Exception:
             pass
 
-    return None, "none"
+    # local repair: truncated output, single quotes, trailing commas, ...
+    return parse_json_object(raw)
 
 
 def _is_plan_shape(obj: Dict[str, Any]) -> bool:
@@ -153,10 +157,21 @@ async def _generate_raw(notes: str, days: int) -> str:
         system=MENTRASCAN_SYSTEM,
         max_tokens=1200,
         temperature=0.4,
+        priority=PRIORITY_GENERATION,
+        site="mentrascan",
+        schema=MENTRASCAN_SCHEMA,
     )
     return (out or "").strip()
 
 
+def _busy_response(e: LLMBusy) -> JSONResponse:
+    return JSONResponse(
+        {"ok": False, "error": str(e)},
+        status_code=503,
+        headers={"Retry-After": str(int(e.retry_after))},
+    )
+
+
 @router.post("/plan_text")
 @limiter.limit("10/minute")
 async def plan_text(request: Request, content: str = Form(""), days: int = Form(DEFAULT_DAYS)):
@@ -167,7 +182,10 @@ async def plan_text(request: Request, content: str = Form(""), days: int = Form(
     d = int(days) if str(days).isdigit() else DEFAULT_DAYS
     d = max(1, min(30, d))
 
-    raw = await _generate_raw(notes, d)
+    try:
+        raw = await _generate_raw(notes, d)
+    except LLMBusy as e:
+        return _busy_response(e)
     obj, mode = _extract_any_json_object(raw)
 
     if not obj:
@@ -202,7 +220,10 @@ async def plan_pdf(request: Request, file: UploadFile = File(...), days: int = F
     d = int(days) if str(days).isdigit() else DEFAULT_DAYS
     d = max(1, min(30, d))
 
-    raw = await _generate_raw(text, d)
+    try:
+        raw = await _generate_raw(text, d)
+    except LLMBusy as e:
+        return _busy_response(e)
     obj, mode = _extract_any_json_object(raw)
 
     if not obj:
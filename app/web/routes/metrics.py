@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse, Response
+
+from app.services.metrics_server import PROMETHEUS_CONTENT_TYPE, token_ok
+from app.web.core.deps import METRICS_TOKEN, llm
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def metrics(request: Request):
+    # the web app is public: no token configured means no metrics
+    if not METRICS_TOKEN or not token_ok(request.headers.get("authorization"), METRICS_TOKEN):
+        return PlainTextResponse("Unauthorized", status_code=401)
+    return Response(content=llm.metrics_text(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -6,7 +6,9 @@ from typing import Any
 from fastapi import APIRouter, File, Form, Request, UploadFile
 from fastapi.responses import JSONResponse
 
-from app.web.core.deps import llm, store, user_from_session
+from app.web.core.deps import NOTES_PLAN_SLA_S, llm, store, user_from_session
+from app.services.llm_deadline import Deadline
+from app.services.llm_scheduler import LLMBusy
 from app.services.study_planner import generate_plan_from_notes
 
 router = APIRouter(prefix="/api/notes", tags=["notes"])
@@ -24,6 +26,15 @@ def _clamp_days_5_10(v: Any, default: int = 7) -> int:
     return d
 
 
+def _busy_response(e: LLMBusy) -> JSONResponse:
+    # shed by the scheduler, or the notes SLA ran out before any plan text
+    return JSONResponse(
+        {"error": f"Plan error: {e}"},
+        status_code=503,
+        headers={"Retry-After": str(int(e.retry_after))},
+    )
+
+
 def _get_api_key(request: Request) -> str:
     api_key = ""
     u = user_from_session(request)
@@ -76,7 +87,10 @@ async def plan_text(
             days=d,
             title=title,
             timeout_sec=35,
+            deadline=Deadline.after(NOTES_PLAN_SLA_S),
         )
+    except LLMBusy as e:
+        return _busy_response(e)
     except Exception as e:
         return JSONResponse({"error": f"Plan error: {e}"}, status_code=500)
 
@@ -120,7 +134,10 @@ async def plan_pdf(
             days=d,
             title=title or fname or "Uploaded PDF",
             timeout_sec=35,
+            deadline=Deadline.after(NOTES_PLAN_SLA_S),
         )
+    except LLMBusy as e:
+        return _busy_response(e)
     except Exception as e:
         return JSONResponse({"error": f"Plan error: {e}"}, status_code=500)
 
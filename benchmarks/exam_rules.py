@@ -0,0 +1,144 @@
+"""
+Cost of the exam rules per candidate: the per-rule `_norm` + `term in t`
+scans used before against the compiled RuleEngine (normalise once, one
+regex pass for every rule's terms), single and batched.
+
+  term_loop      each rule re-normalises and scans every term itself
+  engine_single  rule_check() per candidate
+  engine_batch   rule_check_batch() per response of `--batch` candidates
+
+--rules pads the registry with synthetic term-list rules to show how
+each approach scales as rules are added.
+
+    python -m benchmarks.exam_rules --candidates 5000 --rules 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.devtools.fake_llm_server import _CHOICES, _QUIZ_TEMPLATES, _SUBJECTS
+from app.services.exam_rules import RuleEngine
+
+Item = Tuple[str, List[str], int, str]
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", " ", (s or "").strip()).lower()
+
+
+def _term_lists(rules: int) -> List[Tuple[str, List[str]]]:
+    lists = [("q", ["misconception", "myth"])]
+    for r in range(max(0, rules - len(lists))):
+        lists.append(("q" if r % 2 else "choices", [f"banned phrase {r} {k}" for k in range(6)]))
+    return lists
+
+
+def _items(n: int, rng: random.Random) -> List[Item]:
+    out = []
+    for _ in range(n):
+        q = rng.choice(_QUIZ_TEMPLATES).format(s=rng.choice(_SUBJECTS))
+        if rng.random() < 0.05:
+            q = f"Which common misconception about {rng.choice(_SUBJECTS)} is most dangerous?"
+        choices = list(rng.choice(_CHOICES))
+        out.append((q, choices, 0, f"{choices[0]} is the sound approach."))
+    return out
+
+
+def _time(fn: Callable[[], Any], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    items = _items(args.candidates, rng)
+    lists = _term_lists(args.rules)
+
+    def term_loop() -> int:
+        rejected = 0
+        for q, choices, _, _ in items:
+            for field, terms in lists:
+                texts = [_norm(q)] if field == "q" else [_norm(c) for c in choices]
+                if any(any(t in x for t in terms) for x in texts):
+                    rejected += 1
+                    break
+        return rejected
+
+    engine = RuleEngine()
+    for r, (field, terms) in enumerate(lists):
+        engine.banned(f"rule_{r}", terms=terms, field=field, reason="banned")
+
+    def engine_single() -> int:
+        return sum(1 for it in items if not engine.check_batch([it])[0].ok)
+
+    def engine_batch() -> int:
+        b = max(1, args.batch)
+        return sum(1 for i in range(0, len(items), b) for r in engine.check_batch(items[i : i + b]) if not r.ok)
+
+    results = []
+    for name, fn in (("term_loop", term_loop), ("engine_single", engine_single), ("engine_batch", engine_batch)):
+        rejected = fn()
+        seconds = _time(fn, args.repeats)
+        results.append(
+            {
+                "case": name,
+                "seconds": round(seconds, 6),
+                "us_per_candidate": round(seconds / len(items) * 1e6, 2) if items else None,
+                "rejected": rejected,
+            }
+        )
+
+    base = results[0]["seconds"]
+    for r in results:
+        r["speedup"] = round(base / r["seconds"], 1) if r["seconds"] > 0 else None
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+        "rule_stats": engine.stats(),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark per-rule term scans vs the compiled RuleEngine")
+    ap.add_argument("--candidates", type=int, default=5000)
+    ap.add_argument("--rules", type=int, default=20, help="rules in the registry (padded with synthetic ones)")
+    ap.add_argument("--batch", type=int, default=8, help="candidates per batched call (one LLM response)")
+    ap.add_argument("--repeats", type=int, default=3, help="best-of timing repeats")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+
+    report = run(args)
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+    cols = ("case", "seconds", "us_per_candidate", "speedup", "rejected")
+    print("  ".join(f"{c:>16}" for c in cols), file=sys.stderr)
+    for row in report["results"]:
+        print("  ".join(f"{row[c]!s:>16}" for c in cols), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Malformed-JSON corpus for the LLM reply parsers: how many broken replies
+each one recovers, and at what cost per document.
+
+  strict   json.loads
+  legacy   the flashcards tolerant parser used before json_repair (fence
+           strip, smart quotes, first balanced object, trailing commas);
+           what it could not parse went back to the LLM for repair
+  repair   app.services.json_repair.parse_json_object
+
+The built-in corpus covers the failure shapes seen from models
+(truncated, single / smart quotes, trailing commas, unquoted keys,
+concatenated objects, prose and fences around the JSON, Python literals),
+plus `--fake` seeded malformed flashcards / MentraScan / intent replies
+from the fake LLM server. `--corpus` adds real failures collected from
+logs or cassettes, one JSON object per line: {"text": ..., "expect": ...}
+(expect optional: the object the text should parse to).
+
+    python -m benchmarks.json_repair --fake 200
+    python -m benchmarks.json_repair --corpus failures.jsonl --out repair.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.devtools.fake_llm_server import _Canned
+from app.services.json_repair import parse_json_object
+
+Doc = Tuple[str, str, Optional[Dict[str, Any]]]  # (kind, text, expected object or None)
+
+_CARDS = {"cards": [{"q": "What does Kerberoasting target?", "a": "Service accounts with SPNs; tickets are cracked offline."}]}
+
+CORPUS: List[Doc] = [
+    ("fenced_trailing_comma", '```json\n{"cards": [{"q": "What does Kerberoasting target?", "a": "Service accounts with SPNs; tickets are cracked offline."},]}\n```', _CARDS),
+    ("prose_prefix", 'Here are your flashcards:\n{"cards": [{"q": "What does Kerberoasting target?", "a": "Service accounts with SPNs; tickets are cracked offline."}]}\nGood luck!', _CARDS),
+    ("single_quotes", "{'cards': [{'q': 'What does Kerberoasting target?', 'a': 'Service accounts with SPNs; tickets are cracked offline.'}]}", _CARDS),
+    ("single_quotes_apostrophe", "{'intent': 'ask', 'topic': null, 'question': 'what's a golden ticket?', 'plan_request': null}", {"intent": "ask", "topic": None, "question": "what's a golden ticket?", "plan_request": None}),
+    ("smart_quotes", "{“intent”: “quiz”, “topic”: “web security”, “question”: null, “plan_request”: null}", {"intent": "quiz", "topic": "web security", "question": None, "plan_request": None}),
+    ("unquoted_keys", '{cards: [{q: "What does Kerberoasting target?", a: "Service accounts with SPNs; tickets are cracked offline."}]}', _CARDS),
+    ("python_literals", "{'intent': 'stats', 'topic': None, 'question': None, 'plan_request': None}", {"intent": "stats", "topic": None, "question": None, "plan_request": None}),
+    ("missing_commas", '{"intent": "plan" "topic": "active directory" "question": null "plan_request": "7 days"}', {"intent": "plan", "topic": "active directory", "question": None, "plan_request": "7 days"}),
+    ("raw_newline_in_string", '{"cards": [{"q": "What does Kerberoasting target?", "a": "Service accounts with SPNs;\ntickets are cracked offline."}]}', {"cards": [{"q": "What does Kerberoasting target?", "a": "Service accounts with SPNs;\ntickets are cracked offline."}]}),
+    ("comments", '{\n  // intent router\n  "intent": "topics", "topic": null, "question": null, "plan_request": null\n}', {"intent": "topics", "topic": None, "question": None, "plan_request": None}),
+    ("concatenated_objects", '{"cards": [{"q": "What does Kerberoasting target?", "a": "Service accounts with SPNs; tickets are cracked offline."}]}\n{"cards": [{"q": "What is AS-REP roasting?", "a": "Cracking AS-REPs of accounts without pre-authentication."}]}', None),
+    ("truncated_string", '{"cards": [{"q": "What does Kerberoasting target?", "a": "Service accounts with SPNs; tickets are cracked offline."}, {"q": "What is AS-REP roasting?", "a": "Cracking AS-REPs of acc', None),
+    ("truncated_after_key", '{"days": [{"day": 1, "title": "Recon", "learn": ["LDAP basics"], "do": ["Enumerate users"]}, {"day": 2, "title"', None),
+    ("truncated_mid_literal", '{"intent": "rank", "topic": nu', {"intent": "rank", "topic": None}),
+]
+
+
+# -----------------------------
+# Parsers
+# -----------------------------
+def _strict(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        obj = json.loads(text)
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _legacy(text: str) -> Optional[Dict[str, Any]]:
+    s = (text or "").strip()
+    if s.startswith("```"):
+        parts = s.split("```")
+        if len(parts) >= 3:
+            s = parts[1].strip()
+            if s.lower().startswith("json"):
+                s = s[4:].strip()
+    s = s.replace("“", '"').replace("”", '"').replace("’", "'")
+    s = re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f]", "", s)
+    start = s.find("{")
+    if start < 0:
+        return None
+    depth, in_str, esc = 0, False, False
+    for i in range(start, len(s)):
+        ch = s[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return _strict(re.sub(r",\s*([}\]])", r"\1", s[start : i + 1]))
+    return None
+
+
+def _repair(text: str) -> Optional[Dict[str, Any]]:
+    return parse_json_object(text)[0]
+
+
+PARSERS: Dict[str, Callable[[str], Optional[Dict[str, Any]]]] = {
+    "strict": _strict,
+    "legacy": _legacy,
+    "repair": _repair,
+}
+
+
+# -----------------------------
+# Corpus
+# -----------------------------
+def _fake_docs(n: int, seed: int) -> List[Doc]:
+    canned = _Canned(random.Random(seed))
+    makers = (
+        ("flashcards", lambda: canned.flashcards("Generate EXACTLY 5 cybersecurity flashcards")),
+        ("mentrascan", lambda: canned.mentrascan("7 days")),
+        ("intent", lambda: canned.intent("MESSAGE: what's a golden ticket?")),
+    )
+    out: List[Doc] = []
+    for i in range(n):
+        kind, make = makers[i % len(makers)]
+        good = make()
+        bad = canned.malformed(kind, good)
+        # truncated replies have no single right answer
+        expect = None if len(bad) < len(good) and "```" not in bad else json.loads(good)
+        out.append((f"fake_{kind}", bad, expect))
+    return out
+
+
+def _load_corpus(path: str) -> List[Doc]:
+    out: List[Doc] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            out.append((str(item.get("kind") or "file"), str(item["text"]), item.get("expect")))
+    return out
+
+
+def _time(fn: Callable[[], Any], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    docs: List[Doc] = list(CORPUS) + _fake_docs(args.fake, args.seed)
+    if args.corpus:
+        docs += _load_corpus(args.corpus)
+
+    results = []
+    failures: Dict[str, List[str]] = {}
+    for name, parse in PARSERS.items():
+        parsed = exact = 0
+        missed: List[str] = []
+        for kind, text, expect in docs:
+            obj = parse(text)
+            if obj is None:
+                missed.append(kind)
+                continue
+            parsed += 1
+            exact += expect is not None and obj == expect
+        seconds = _time(lambda: [parse(t) for _, t, _ in docs], args.repeats)
+        with_expect = sum(1 for d in docs if d[2] is not None)
+        results.append(
+            {
+                "parser": name,
+                "parsed": parsed,
+                "parsed_pct": round(100.0 * parsed / len(docs), 1) if docs else None,
+                "exact": f"{exact}/{with_expect}",
+                "us_per_doc": round(seconds / len(docs) * 1e6, 2) if docs else None,
+            }
+        )
+        failures[name] = sorted(set(missed))
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "documents": len(docs),
+        },
+        "results": results,
+        "unparsed_kinds": failures,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark LLM JSON reply parsers on a malformed-output corpus")
+    ap.add_argument("--fake", type=int, default=120, help="seeded malformed replies from the fake LLM server")
+    ap.add_argument("--corpus", default="", help="JSONL of real failures: {\"text\": ..., \"expect\": ...}")
+    ap.add_argument("--repeats", type=int, default=5, help="best-of timing repeats")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+
+    report = run(args)
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+    cols = ("parser", "parsed", "parsed_pct", "exact", "us_per_doc")
+    print("  ".join(f"{c:>12}" for c in cols), file=sys.stderr)
+    for r in report["results"]:
+        print("  ".join(f"{str(r[c]):>12}" for c in cols), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
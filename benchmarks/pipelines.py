@@ -0,0 +1,340 @@
+"""
+Benchmarks for the LLM generation pipelines against a scripted fake LLM.
+
+Scenarios:
+  quiz        generate_quiz_questions (phase 1 batches + phase 2 fill)
+  flashcards  generate_flashcards (batches + JSON repair)
+  notes_plan  generate_plan_from_notes (key points + missing-days loop)
+  chat_plan   the /plan chunk loop (run_plan_from_chat)
+  mentrascan  MentraScan _generate_raw + JSON extraction
+
+Each scenario runs once per acceptance rate and reports LLM calls, wall
+time, tokens requested and CPU time spent in parsing / validation, as
+JSON (stdout or --out) so runs can be diffed.
+
+    python -m benchmarks.pipelines --acceptance 1.0,0.7,0.4 --latency 0.05
+    python -m benchmarks.pipelines --scenarios quiz --repeats 5 --out quiz.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.scripted_llm import ScriptedLLM
+
+SAMPLE_NOTES = """
+Active Directory attack path notes.
+- Enumerate users and groups over LDAP with a low-privileged account.
+- Kerberoasting: request TGS tickets for SPN accounts, crack offline.
+- AS-REP roasting targets accounts without pre-authentication.
+- BloodHound maps ACL abuse paths (GenericAll, WriteDACL, AddMember).
+- Pass-the-hash with NTLM hashes over SMB / WinRM.
+- DCSync needs replication rights; dump krbtgt for golden tickets.
+- Defenders: tiered admin model, LAPS, strong service account passwords.
+""".strip()
+
+
+# -----------------------------
+# Parse / validation CPU probes
+# -----------------------------
+class ParseTimer:
+    """
+    Wraps module-level helpers with a CPU timer (thread time) for the
+    duration of a scenario, then restores them.
+    """
+
+    def __init__(self, targets: List[Tuple[Any, str]]):
+        self.targets = targets
+        self.cpu_s = 0.0
+        self.calls = 0
+        self.by_func: Dict[str, float] = {}
+        self._saved: List[Tuple[Any, str, Any]] = []
+
+    def _wrap(self, label: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            t0 = time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dt = time.thread_time() - t0
+                self.cpu_s += dt
+                self.calls += 1
+                self.by_func[label] = self.by_func.get(label, 0.0) + dt
+
+        return timed
+
+    def __enter__(self) -> "ParseTimer":
+        for module, name in self.targets:
+            fn = getattr(module, name)
+            self._saved.append((module, name, fn))
+            setattr(module, name, self._wrap(f"{module.__name__.rsplit('.', 1)[-1]}.{name}", fn))
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        for module, name, fn in reversed(self._saved):
+            setattr(module, name, fn)
+        self._saved.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "parse_cpu_s": round(self.cpu_s, 6),
+            "parse_calls": self.calls,
+            "parse_cpu_by_func": {k: round(v, 6) for k, v in sorted(self.by_func.items())},
+        }
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+class _FakeMessage:
+    def __init__(self) -> None:
+        self.content: Optional[str] = None
+        self.embeds: List[Any] = []
+
+    async def edit(self, *, content: Optional[str] = None, embed: Any = None, **_kw: Any) -> None:
+        self.content = content
+        if embed is not None:
+            self.embeds.append(embed)
+
+
+class _FakeChannel:
+    def __init__(self) -> None:
+        self.messages: List[_FakeMessage] = []
+
+    async def send(self, content: Optional[str] = None, *, embed: Any = None, **_kw: Any) -> _FakeMessage:
+        msg = _FakeMessage()
+        await msg.edit(content=content, embed=embed)
+        self.messages.append(msg)
+        return msg
+
+
+class _FakeUser:
+    id = 1
+
+
+class _FakeStore:
+    def get_key(self, user_id: int) -> str:
+        return ""
+
+
+async def _run_quiz(llm: ScriptedLLM, args: argparse.Namespace) -> Dict[str, Any]:
+    from app.services.quiz_gen import generate_quiz_questions
+
+    qs = await generate_quiz_questions(llm, api_key="", topic="Active Directory", n=args.quiz_n)
+    return {"items": len(qs), "target": args.quiz_n}
+
+
+async def _run_flashcards(llm: ScriptedLLM, args: argparse.Namespace) -> Dict[str, Any]:
+    from app.services.flashcards_gen import generate_flashcards
+
+    cards = await generate_flashcards(llm, api_key="", topic="Active Directory", n=args.cards_n)
+    padded = sum(1 for c in cards if c.a.startswith("Regenerate to get"))
+    return {"items": len(cards) - padded, "target": args.cards_n, "padded": padded}
+
+
+async def _run_notes_plan(llm: ScriptedLLM, args: argparse.Namespace) -> Dict[str, Any]:
+    from app.services.study_planner import _missing_days, generate_plan_from_notes
+
+    days = max(5, min(10, args.plan_days))
+    text = await generate_plan_from_notes(llm, "", SAMPLE_NOTES, days=days, title="AD notes")
+    missing = _missing_days(text, 1, days)
+    return {"items": days - len(missing), "target": days}
+
+
+async def _run_chat_plan(llm: ScriptedLLM, args: argparse.Namespace) -> Dict[str, Any]:
+    from app.commands.study import _missing_days, run_plan_from_chat
+
+    channel = _FakeChannel()
+    await run_plan_from_chat(channel, _FakeUser(), _FakeStore(), llm, "Active Directory", days=args.plan_days)
+    text = "\n\n".join(e.description or "" for m in channel.messages for e in m.embeds)
+    missing = _missing_days(text, 1, args.plan_days)
+    return {"items": args.plan_days - len(missing), "target": args.plan_days}
+
+
+def _mentrascan_module() -> Any:
+    # the web deps refuse to import without a session secret
+    os.environ.setdefault("WEB_SESSION_SECRET", "benchmark")
+    from app.web.routes import mentrascan
+
+    return mentrascan
+
+
+async def _run_mentrascan(llm: ScriptedLLM, args: argparse.Namespace) -> Dict[str, Any]:
+    mentrascan = _mentrascan_module()
+
+    saved = mentrascan.llm
+    mentrascan.llm = llm
+    try:
+        raw = await mentrascan._generate_raw(SAMPLE_NOTES, args.plan_days)
+    finally:
+        mentrascan.llm = saved
+    obj, mode = mentrascan._extract_any_json_object(raw)
+    ok = bool(obj) and mentrascan._is_plan_shape(obj)
+    return {"items": len(obj["days"]) if ok else 0, "target": args.plan_days, "extract_mode": mode}
+
+
+def _probes(name: str) -> List[Tuple[Any, str]]:
+    if name == "quiz":
+        from app.services import quiz_gen as m
+
+        return [
+            (m, "_parse_quiz_json"),
+            (m, "_parse_quiz_blocks"),
+            (m, "_validate_and_build"),
+            (m, "_accept_question"),
+        ]
+    if name == "flashcards":
+        from app.services import flashcards_gen as m
+
+        return [(m, "_safe_json_loads"), (m, "_coerce_cards"), (m, "_accept_card")]
+    if name == "notes_plan":
+        from app.services import study_planner as m
+
+        return [(m, "_sanitize_answer"), (m, "_normalize_plan_text"), (m, "_missing_days")]
+    if name == "chat_plan":
+        from app.commands import study as m
+
+        return [(m, "clean_llm_text"), (m, "_normalize_plan_text"), (m, "_missing_days")]
+    if name == "mentrascan":
+        m = _mentrascan_module()
+
+        return [(m, "_extract_any_json_object"), (m, "_is_plan_shape")]
+    return []
+
+
+SCENARIOS: Dict[str, Callable[[ScriptedLLM, argparse.Namespace], Awaitable[Dict[str, Any]]]] = {
+    "quiz": _run_quiz,
+    "flashcards": _run_flashcards,
+    "notes_plan": _run_notes_plan,
+    "chat_plan": _run_chat_plan,
+    "mentrascan": _run_mentrascan,
+}
+
+
+async def run_scenario(name: str, acceptance: float, seed: int, args: argparse.Namespace) -> Dict[str, Any]:
+    llm = ScriptedLLM(
+        reject_rate=1.0 - acceptance,
+        malformed_rate=args.malformed,
+        latency_s=args.latency,
+        jitter_s=args.jitter,
+        seed=seed,
+    )
+
+    error: Optional[str] = None
+    result: Dict[str, Any] = {}
+    with ParseTimer(_probes(name)) as timer:
+        cpu0 = time.process_time()
+        t0 = time.perf_counter()
+        try:
+            result = await SCENARIOS[name](llm, args)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+
+    return {
+        "scenario": name,
+        "acceptance": acceptance,
+        "seed": seed,
+        "ok": error is None and result.get("items", 0) >= result.get("target", 0),
+        "error": error,
+        **result,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        **llm.stats(),
+        **timer.stats(),
+    }
+
+
+def _summary(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    n = len(runs)
+
+    def mean(key: str) -> float:
+        return round(sum(float(r.get(key) or 0) for r in runs) / n, 6) if n else 0.0
+
+    return {
+        "scenario": runs[0]["scenario"],
+        "acceptance": runs[0]["acceptance"],
+        "runs": n,
+        "success_rate": round(sum(1 for r in runs if r["ok"]) / n, 3) if n else 0.0,
+        "llm_calls_mean": mean("llm_calls"),
+        "llm_calls_max": max((r["llm_calls"] for r in runs), default=0),
+        "wall_s_mean": mean("wall_s"),
+        "tokens_requested_mean": mean("tokens_requested"),
+        "prompt_tokens_est_mean": mean("prompt_tokens_est"),
+        "parse_cpu_s_mean": mean("parse_cpu_s"),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in names if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    rates = [max(0.0, min(1.0, float(x))) for x in args.acceptance.split(",") if x.strip()]
+
+    runs: List[Dict[str, Any]] = []
+    summary: List[Dict[str, Any]] = []
+    for name in names:
+        for rate in rates:
+            group = [await run_scenario(name, rate, args.seed + i, args) for i in range(args.repeats)]
+            runs.extend(group)
+            summary.append(_summary(group))
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "summary": summary,
+        "runs": runs,
+    }
+
+
+def _print_table(report: Dict[str, Any]) -> None:
+    cols = ("scenario", "acceptance", "success_rate", "llm_calls_mean", "wall_s_mean", "tokens_requested_mean", "parse_cpu_s_mean")
+    print("  ".join(f"{c:>14}" for c in cols), file=sys.stderr)
+    for row in report["summary"]:
+        print("  ".join(f"{row[c]!s:>14}" for c in cols), file=sys.stderr)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark MentraAI generation pipelines against a scripted LLM")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: " + ", ".join(SCENARIOS))
+    ap.add_argument("--acceptance", default="1.0,0.7,0.4,0.2", help="per-item acceptance rates to sweep")
+    ap.add_argument("--malformed", type=float, default=0.0, help="probability of a malformed response")
+    ap.add_argument("--latency", type=float, default=0.02, help="simulated LLM latency (seconds)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra uniform latency (seconds)")
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--quiz-n", type=int, default=10)
+    ap.add_argument("--cards-n", type=int, default=10)
+    ap.add_argument("--plan-days", type=int, default=7)
+    ap.add_argument("--out", default="", help="write JSON here instead of stdout")
+    ap.add_argument("--verbose", action="store_true", help="keep pipeline logging")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    report = asyncio.run(run(args))
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    _print_table(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+In-process scripted LLM for the pipeline benchmarks.
+
+Duck-types LLMClient.ask() and answers from the fake server's canned
+generator, so acceptance rate, malformed rate and latency are fully
+controlled and reproducible (seeded). Every call is counted per site.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from app.devtools.fake_llm_server import _Canned
+from app.services.llm_scheduler import PRIORITY_INTERACTIVE
+
+
+class ScriptedLLM:
+    def __init__(
+        self,
+        *,
+        reject_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        latency_s: float = 0.0,
+        jitter_s: float = 0.0,
+        seed: Optional[int] = 0,
+    ):
+        self.rng = random.Random(seed)
+        self.canned = _Canned(self.rng, reject_rate)
+        self.malformed_rate = float(malformed_rate)
+        self.latency_s = float(latency_s)
+        self.jitter_s = float(jitter_s)
+
+        self.calls = 0
+        self.calls_by_site: Dict[str, int] = {}
+        self.tokens_requested = 0       # sum of max_tokens
+        self.prompt_tokens = 0          # ~4 chars per token
+        self.completion_tokens = 0
+        self.llm_wait_s = 0.0
+        self.log: List[Dict[str, Any]] = []
+
+    async def ask(
+        self,
+        api_key: str = "",
+        prompt: str = "",
+        system: str = "You are a helpful study assistant.",
+        model: Optional[str] = None,
+        max_tokens: int = 400,
+        temperature: float = 0.2,
+        *,
+        site: str = "unknown",
+        **_kw: Any,
+    ) -> str:
+        self.calls += 1
+        self.calls_by_site[site] = self.calls_by_site.get(site, 0) + 1
+        self.tokens_requested += int(max_tokens)
+        self.prompt_tokens += (len(system or "") + len(prompt or "")) // 4
+
+        t0 = time.perf_counter()
+        delay = self.latency_s + (self.rng.uniform(0, self.jitter_s) if self.jitter_s > 0 else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.llm_wait_s += time.perf_counter() - t0
+
+        malformed = self.malformed_rate > 0 and self.rng.random() < self.malformed_rate
+        kind, text = self.canned.respond(system or "", prompt or "", malformed)
+        self.completion_tokens += len(text) // 4
+        self.log.append({"site": site, "kind": kind, "malformed": malformed, "max_tokens": int(max_tokens)})
+        return text
+
+    def queue_position(self, priority: str = PRIORITY_INTERACTIVE) -> int:
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "llm_calls": self.calls,
+            "calls_by_site": dict(sorted(self.calls_by_site.items())),
+            "tokens_requested": self.tokens_requested,
+            "prompt_tokens_est": self.prompt_tokens,
+            "completion_tokens_est": self.completion_tokens,
+            "llm_wait_s": round(self.llm_wait_s, 4),
+        }
@@ -0,0 +1,230 @@
+"""
+Throughput of near-duplicate checks: the pairwise Python loops used
+before (token-set Jaccard recomputed for every pair) against the batched
+SimilarityService (cached hashed n-gram vectors, one NumPy matrix
+product per batch).
+
+Each case checks `candidates` new questions against `history` stored
+ones, i.e. candidates x history comparisons:
+  jaccard_loop   any(jaccard_sim(c, h) >= t for h in history) per candidate
+  batch_cold     SimilarityService on an empty cache (includes vectorising)
+  batch_warm     same texts again (vectors cached)
+
+The calibration section scores a labelled set: PARAPHRASES (same
+question reworded, should be caught) and DISTINCT (same subject area or
+same template, different question, must pass), plus every pair of fake
+server template questions that differ only in the subject. For each
+threshold it reports paraphrase recall and distinct pairs wrongly caught;
+the dedupe thresholds (COS_Q_SIM, QUESTION_COS_SIM) are picked from it.
+
+    python -m benchmarks.similarity --history 2000 --candidates 200
+    python -m benchmarks.similarity --thresholds 0.75,0.8,0.85,0.9
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from app.devtools.fake_llm_server import _QUIZ_TEMPLATES, _SUBJECTS
+from app.services.similarity import SimilarityService
+from app.utils.text import jaccard_sim
+
+_EXTRA = [
+    "on a Windows domain",
+    "in a web application",
+    "during an internal pentest",
+    "with low privileges",
+    "from an unauthenticated position",
+    "in a CTF lab",
+    "after initial access",
+    "on a Linux host",
+]
+
+PARAPHRASES: List[Tuple[str, str]] = [
+    ("Which tool enumerates SMB shares on a Windows host?", "What tool is used to enumerate SMB shares on Windows?"),
+    ("What does Kerberoasting target?", "Which accounts are targeted by Kerberoasting?"),
+    ("What is AS-REP roasting?", "What is an AS-REP roasting attack?"),
+    ("How does pass-the-hash work?", "How does a pass-the-hash attack work?"),
+    ("What is the purpose of DCSync?", "What is DCSync used for?"),
+    ("Which port does LDAP use by default?", "What is the default port for LDAP?"),
+    ("What does SSRF let an attacker do?", "What can an attacker do with SSRF?"),
+    ("How can you prevent SQL injection?", "How do you prevent SQL injection?"),
+    ("What is the best defense against CSRF?", "What is the most effective defense against CSRF?"),
+    ("Which header mitigates clickjacking?", "What HTTP header mitigates clickjacking?"),
+    ("What is an IDOR vulnerability?", "What is an IDOR (insecure direct object reference) vulnerability?"),
+    ("Why are SUID binaries dangerous?", "Why can SUID binaries be dangerous?"),
+    ("How do you detect password spraying?", "How can password spraying be detected?"),
+    ("What does a DNS zone transfer reveal?", "What information does a DNS zone transfer reveal?"),
+    ("What is the risk of writable cron jobs?", "What is the risk of a writable cron job?"),
+    ("Which tool dumps credentials from LSASS memory?", "What tool is used to dump credentials from LSASS memory?"),
+    ("What does the JWT 'none' algorithm attack exploit?", "What does the JWT none algorithm attack exploit?"),
+    ("How do you exploit an LFI vulnerability?", "How can an LFI vulnerability be exploited?"),
+    ("What is the difference between NTLM and Kerberos?", "What's the difference between Kerberos and NTLM?"),
+    ("Which command lists sudo privileges for the current user?", "What command lists the current user's sudo privileges?"),
+    ("What is XXE?", "What is an XXE attack?"),
+    ("How do you enumerate NFS exports?", "How can NFS exports be enumerated?"),
+    ("What does PowerShell script block logging record?", "What is recorded by PowerShell script block logging?"),
+    ("Which SNMP community string is commonly left as default?", "What SNMP community string is often left at its default?"),
+]
+
+DISTINCT: List[Tuple[str, str]] = [
+    ("Which tool enumerates SMB shares on a Windows host?", "Which tool enumerates LDAP users on a Windows host?"),
+    ("What does Kerberoasting target?", "What does AS-REP roasting target?"),
+    ("How does pass-the-hash work?", "How does pass-the-ticket work?"),
+    ("What is the purpose of DCSync?", "What is the purpose of DCShadow?"),
+    ("Which port does LDAP use by default?", "Which port does SMB use by default?"),
+    ("How can you prevent SQL injection?", "How can you prevent command injection?"),
+    ("What is the best defense against CSRF?", "What is the best defense against XSS?"),
+    ("Why are SUID binaries dangerous?", "Why are writable cron jobs dangerous?"),
+    ("How do you detect password spraying?", "How do you perform password spraying?"),
+    ("What does a DNS zone transfer reveal?", "How do you block a DNS zone transfer?"),
+    ("Which tool dumps credentials from LSASS memory?", "Which tool relays NTLM authentication?"),
+    ("What is XXE?", "What is XSS?"),
+    ("What is SSRF?", "What is CSRF?"),
+    ("What is stored XSS?", "What is reflected XSS?"),
+    ("Which Windows event ID logs a failed logon?", "Which Windows event ID logs a successful logon?"),
+    ("What is the key risk of SMB?", "What is the key risk of Kerberos?"),
+    ("During SMB testing, which first step is most useful?", "During LDAP testing, which first step is most useful?"),
+    ("For XSS findings, what evidence best proves impact?", "For IDOR findings, what evidence best proves impact?"),
+    ("Against SSRF exposure, which remediation is most effective?", "Against XXE exposure, which remediation is most effective?"),
+    ("Card 3: what is the key risk of LFI?", "Card 9: what is the key risk of RDP?"),
+    ("How do you enumerate NFS exports?", "How do you mount NFS exports?"),
+    ("What does PowerShell script block logging record?", "What does PowerShell transcription record?"),
+]
+
+
+def _corpus(n: int, rng: random.Random) -> List[str]:
+    out = []
+    for _ in range(n):
+        q = rng.choice(_QUIZ_TEMPLATES).format(s=rng.choice(_SUBJECTS))
+        out.append(f"{q[:-1]} {rng.choice(_EXTRA)}?")
+    return out
+
+
+def _template_siblings() -> List[Tuple[str, str]]:
+    return [
+        (tpl.format(s=a), tpl.format(s=b))
+        for tpl in _QUIZ_TEMPLATES
+        for i, a in enumerate(_SUBJECTS)
+        for b in _SUBJECTS[i + 1 :]
+    ]
+
+
+def calibrate(thresholds: Sequence[float]) -> List[Dict[str, Any]]:
+    svc = SimilarityService()
+
+    def scores(pairs: List[Tuple[str, str]]) -> List[float]:
+        return [svc.cosine(a, b) for a, b in pairs]
+
+    pos = scores(PARAPHRASES)
+    neg = scores(DISTINCT)
+    sib = scores(_template_siblings())
+    rows = []
+    for t in thresholds:
+        rows.append(
+            {
+                "threshold": t,
+                "paraphrases_caught": f"{sum(x >= t for x in pos)}/{len(pos)}",
+                "distinct_caught": f"{sum(x >= t for x in neg)}/{len(neg)}",
+                "siblings_caught": f"{sum(x >= t for x in sib)}/{len(sib)}",
+            }
+        )
+    return rows
+
+
+def _time(fn: Callable[[], Any], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    history = _corpus(args.history, rng)
+    candidates = _corpus(args.candidates, rng)
+    pairs = len(history) * len(candidates)
+
+    def jaccard_loop() -> int:
+        return sum(1 for c in candidates if any(jaccard_sim(c, h) >= args.jaccard for h in history))
+
+    def batch_cold() -> int:
+        svc = SimilarityService()
+        return int((svc.max_similarities(candidates, history) >= args.cosine).sum())
+
+    warm = SimilarityService()
+    warm.max_similarities(candidates, history)
+
+    def batch_warm() -> int:
+        return int((warm.max_similarities(candidates, history) >= args.cosine).sum())
+
+    results = []
+    for name, fn in (("jaccard_loop", jaccard_loop), ("batch_cold", batch_cold), ("batch_warm", batch_warm)):
+        dups = fn()
+        seconds = _time(fn, args.repeats)
+        results.append(
+            {
+                "case": name,
+                "seconds": round(seconds, 6),
+                "pairs_per_s": round(pairs / seconds) if seconds > 0 else None,
+                "duplicates": dups,
+            }
+        )
+
+    base = results[0]["seconds"]
+    for r in results:
+        r["speedup"] = round(base / r["seconds"], 1) if r["seconds"] > 0 else None
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "pairs": pairs,
+        },
+        "results": results,
+        "calibration": calibrate([float(x) for x in args.thresholds.split(",") if x.strip()]),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark pairwise Jaccard loops vs batched SimilarityService")
+    ap.add_argument("--history", type=int, default=2000, help="stored questions to compare against")
+    ap.add_argument("--candidates", type=int, default=200, help="new questions to check")
+    ap.add_argument("--jaccard", type=float, default=0.82, help="Jaccard duplicate threshold")
+    ap.add_argument("--cosine", type=float, default=0.80, help="cosine duplicate threshold")
+    ap.add_argument("--thresholds", default="0.75,0.8,0.85,0.9", help="cosine thresholds to calibrate")
+    ap.add_argument("--repeats", type=int, default=3, help="best-of timing repeats")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+
+    report = run(args)
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+    cols = ("case", "seconds", "pairs_per_s", "speedup", "duplicates")
+    print("  ".join(f"{c:>14}" for c in cols), file=sys.stderr)
+    for row in report["results"]:
+        print("  ".join(f"{row[c]!s:>14}" for c in cols), file=sys.stderr)
+    cols = ("threshold", "paraphrases_caught", "distinct_caught", "siblings_caught")
+    print("  ".join(f"{c:>18}" for c in cols), file=sys.stderr)
+    for row in report["calibration"]:
+        print("  ".join(f"{row[c]!s:>18}" for c in cols), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
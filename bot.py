@@ -14,14 +14,68 @@ from app.commands import (
     register_stats_commands,
     register_study_commands,
 )
-from app.constants import BOT_MODE, BOT_VERSION
+from app.constants import BOT_MODE, BOT_VERSION, QUIZ_TOPICS
 from app.utils.logger_setup import setup_logging
 from app.utils.startup_banner import startup_banner
 from app.services.status_rotation import create_status_tasks, DEFAULT_STATUSES
 
 from config import DISCORD_TOKEN, DB_PATH, OPENAI_BASE_URL, DEFAULT_MODEL, GUILD_ID, GROQ_BASE_URL, GROQ_MODEL,  LLM_PROVIDER
+from config import (
+    LLM_TIMEOUT_S,
+    LLM_POOL_MAX_CONNECTIONS,
+    LLM_POOL_MAX_KEEPALIVE,
+    LLM_POOL_KEEPALIVE_EXPIRY_S,
+    LLM_HTTP2,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_ITEMS,
+    LLM_CACHE_MAX_ROWS,
+    LLM_CACHE_TTL_S,
+    LLM_SCHED_MIN_CONCURRENCY,
+    LLM_SCHED_MAX_CONCURRENCY,
+    LLM_SCHED_RPM,
+    LLM_SCHED_TARGET_LATENCY_S,
+    LLM_SCHED_MAX_QUEUE,
+    LLM_FALLBACKS,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE_S,
+    LLM_BACKOFF_MAX_S,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_COOLDOWN_S,
+    LLM_HEDGE,
+    LLM_HEDGE_MIN_DELAY_S,
+    LLM_HEDGE_MAX_DELAY_S,
+    LLM_SUPPORTS_N,
+    LLM_STRUCTURED_OUTPUT,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_TOKEN,
+    LLM_CASSETTE_MODE,
+    LLM_CASSETTE_PATH,
+    QUIZ_BANK_ENABLED,
+    QUIZ_BANK_TOPICS,
+    QUIZ_BANK_TARGET,
+    QUIZ_BANK_LOW_WATER,
+    QUIZ_BANK_MAX_AGE_DAYS,
+    QUIZ_BANK_MAX_SERVES,
+    QUIZ_BANK_REFILL_INTERVAL_S,
+    PREFETCH_ENABLED,
+    PREFETCH_TTL_S,
+    PREFETCH_MAX_INFLIGHT,
+    PREFETCH_MAX_SLOTS,
+    FLASHCARD_DECKS_ENABLED,
+    FLASHCARD_DECK_MAX_AGE_DAYS,
+)
 from app.db import KeyStore
+from app.services.exam_rules import RULES
 from app.services.llm import LLMClient
+from app.services.llm_cache import LLMCache
+from app.services.llm_cassette import LLMCassette
+from app.services.llm_router import LLMRouter, backends_from_env
+from app.services.llm_scheduler import LLMScheduler
+from app.services.metrics_server import start_metrics_server
+from app.services.flashcard_decks import FlashcardDecks
+from app.services.prefetch import Prefetcher
+from app.services.quiz_bank import QuizBank
 
 
 class _FilterPyNaCl(io.TextIOWrapper):
@@ -36,6 +90,48 @@ def build_client():
     intents.message_content = True
 
     store = KeyStore(DB_PATH)
+    llm_opts = dict(
+        timeout=LLM_TIMEOUT_S,
+        max_connections=LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY_S,
+        http2=LLM_HTTP2,
+        cache=(
+            LLMCache(
+                DB_PATH,
+                max_items=LLM_CACHE_MAX_ITEMS,
+                max_rows=LLM_CACHE_MAX_ROWS,
+                ttl_s=LLM_CACHE_TTL_S,
+            )
+            if LLM_CACHE_ENABLED
+            else None
+        ),
+        scheduler=LLMScheduler(
+            min_concurrency=LLM_SCHED_MIN_CONCURRENCY,
+            max_concurrency=LLM_SCHED_MAX_CONCURRENCY,
+            rpm=LLM_SCHED_RPM,
+            target_latency_s=LLM_SCHED_TARGET_LATENCY_S,
+            max_queue=LLM_SCHED_MAX_QUEUE,
+        ),
+        router=LLMRouter(
+            backends_from_env(LLM_FALLBACKS),
+            max_retries=LLM_MAX_RETRIES,
+            backoff_base_s=LLM_BACKOFF_BASE_S,
+            backoff_max_s=LLM_BACKOFF_MAX_S,
+            breaker_failures=LLM_BREAKER_FAILURES,
+            breaker_cooldown_s=LLM_BREAKER_COOLDOWN_S,
+            hedge=LLM_HEDGE,
+            hedge_min_delay_s=LLM_HEDGE_MIN_DELAY_S,
+            hedge_max_delay_s=LLM_HEDGE_MAX_DELAY_S,
+        ),
+        cassette=(
+            LLMCassette(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE)
+            if LLM_CASSETTE_MODE
+            else None
+        ),
+        supports_n=LLM_SUPPORTS_N,
+        structured_output=LLM_STRUCTURED_OUTPUT,
+    )
     if LLM_PROVIDER == "groq":
         llm = LLMClient(
             base_url=GROQ_BASE_URL,
@@ -44,6 +140,7 @@ def build_client():
             openai_default_model=GROQ_MODEL,
             prefer_responses_api=False,             
             force_chat_completions=True,            
+            **llm_opts,
         )
     else:
         llm = LLMClient(
@@ -51,20 +148,66 @@ def build_client():
             default_model=DEFAULT_MODEL,
             openai_base_url="https://api.openai.com/v1",
             openai_default_model="gpt-4.1",
+            **llm_opts,
+        )
+
+    quiz_bank = None
+    if QUIZ_BANK_ENABLED:
+        bank_topics = [t for t in QUIZ_BANK_TOPICS.split(",") if t.strip()] or QUIZ_TOPICS
+        quiz_bank = QuizBank(
+            DB_PATH,
+            bank_topics,
+            target=QUIZ_BANK_TARGET,
+            low_water=QUIZ_BANK_LOW_WATER,
+            max_age_days=QUIZ_BANK_MAX_AGE_DAYS,
+            max_serves=QUIZ_BANK_MAX_SERVES,
+        )
+
+    prefetch = None
+    if PREFETCH_ENABLED:
+        prefetch = Prefetcher(
+            ttl_s=PREFETCH_TTL_S,
+            max_inflight=PREFETCH_MAX_INFLIGHT,
+            max_slots=PREFETCH_MAX_SLOTS,
         )
 
+    decks = None
+    if FLASHCARD_DECKS_ENABLED:
+        decks = FlashcardDecks(DB_PATH, max_age_days=FLASHCARD_DECK_MAX_AGE_DAYS)
+
     class StudyBot(discord.Client):
         def __init__(self) -> None:
             super().__init__(intents=intents)
             self.tree = app_commands.CommandTree(self)
+            self.metrics_runner = None
+            self.quiz_bank = quiz_bank
+            self.prefetch = prefetch
+            self.decks = decks
 
         async def setup_hook(self) -> None:
+            await llm.open()
+
+            if METRICS_PORT:
+                try:
+                    self.metrics_runner = await start_metrics_server(
+                        llm,
+                        host=METRICS_HOST,
+                        port=METRICS_PORT,
+                        token=METRICS_TOKEN,
+                        extra=[RULES.metrics_text] + [x.metrics_text for x in (quiz_bank, prefetch, decks) if x is not None],
+                    )
+                except OSError:
+                    logging.getLogger("MentraAI").exception("Metrics listener failed to start")
+
             register_admin_commands(self, store, llm)
             register_study_commands(self, store, llm)
             register_quiz_commands(self, store, llm)
             register_flashcards_commands(self, store, llm)
             register_stats_commands(self, store, llm)
 
+            if quiz_bank is not None:
+                quiz_bank.start(llm, interval_s=QUIZ_BANK_REFILL_INTERVAL_S)
+
             if GUILD_ID:
                 guild = discord.Object(id=GUILD_ID)
                 self.tree.copy_global_to(guild=guild)
@@ -72,6 +215,18 @@ def build_client():
             else:
                 await self.tree.sync()
 
+        async def close(self) -> None:
+            try:
+                if quiz_bank is not None:
+                    await quiz_bank.stop()
+                if prefetch is not None:
+                    await prefetch.stop()
+                if self.metrics_runner is not None:
+                    await self.metrics_runner.cleanup()
+                await llm.aclose()
+            finally:
+                await super().close()
+
     client = StudyBot()
     register_chat_router(client, store, llm)
 
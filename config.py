@@ -31,4 +31,102 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "local")
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
-GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
\ No newline at end of file
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+
+# LLM HTTP connection pool (shared keep-alive clients)
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+LLM_POOL_KEEPALIVE_EXPIRY_S = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY_S", "30"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1").strip().lower() in ("1", "true", "yes", "on")
+
+# LLM response cache (opt-in per call site)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+LLM_CACHE_MAX_ITEMS = int(os.getenv("LLM_CACHE_MAX_ITEMS", "512"))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "5000"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(24 * 3600)))
+
+# LLM scheduler (priority queue + adaptive concurrency per backend)
+LLM_SCHED_MIN_CONCURRENCY = int(os.getenv("LLM_SCHED_MIN_CONCURRENCY", "1"))
+LLM_SCHED_MAX_CONCURRENCY = int(os.getenv("LLM_SCHED_MAX_CONCURRENCY", "8"))
+LLM_SCHED_RPM = float(os.getenv("LLM_SCHED_RPM", "0"))  # provider requests/min, 0 = unlimited
+LLM_SCHED_TARGET_LATENCY_S = float(os.getenv("LLM_SCHED_TARGET_LATENCY_S", "20"))
+LLM_SCHED_MAX_QUEUE = int(os.getenv("LLM_SCHED_MAX_QUEUE", "64"))
+
+# LLM router (retries, fallback backends, circuit breaker, hedging)
+LLM_FALLBACKS = os.getenv("LLM_FALLBACKS", "").strip()  # comma list: local,groq,openai
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0").strip().lower() in ("1", "true", "yes", "on")
+LLM_HEDGE_MIN_DELAY_S = float(os.getenv("LLM_HEDGE_MIN_DELAY_S", "1.5"))
+LLM_HEDGE_MAX_DELAY_S = float(os.getenv("LLM_HEDGE_MAX_DELAY_S", "8"))
+
+# Backend accepts the OpenAI `n` parameter (several samples per request)
+LLM_SUPPORTS_N = os.getenv("LLM_SUPPORTS_N", "0").strip().lower() in ("1", "true", "yes", "on")
+
+# Schema-constrained JSON output: auto | json_schema | json_object | off
+# (auto = json_schema, or json_object on Groq)
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "auto").strip().lower()
+
+# Prometheus metrics listener in the bot process (0 = off)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+
+# LLM record/replay cassette (offline benchmarks / regression runs)
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "").strip().lower()  # "" (off) | record | replay
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "./data/llm_cassette.jsonl.gz")
+
+# Quiz generation: concurrent batch requests per round
+QUIZ_FANOUT = int(os.getenv("QUIZ_FANOUT", "3"))
+
+# Flashcard generation: concurrent sub-batches, one topic angle each (max 5)
+FLASHCARDS_FANOUT = int(os.getenv("FLASHCARDS_FANOUT", "5"))
+
+# Anti-repeat: estimated Jaccard at which a question counts as already seen
+# (MinHash LSH over quiz_seen), and how many past questions still go into
+# the prompt once that check is active
+QUIZ_NEAR_DUP_THRESHOLD = float(os.getenv("QUIZ_NEAR_DUP_THRESHOLD", "0.6"))
+QUIZ_PROMPT_AVOID = int(os.getenv("QUIZ_PROMPT_AVOID", "4"))
+
+# Quiz/flashcard request sizing: probability that one request yields the
+# missing items, given the learned per model/topic acceptance rate
+GEN_YIELD_CONFIDENCE = float(os.getenv("GEN_YIELD_CONFIDENCE", "0.8"))
+
+# Quiz questions generated without explanations; the quiz view asks for
+# them (batched, cached) only for wrong answers
+QUIZ_LAZY_EXPLAIN = os.getenv("QUIZ_LAZY_EXPLAIN", "0").strip().lower() in ("1", "true", "yes", "on")
+
+# Time budget (seconds) per command, propagated to every LLM call it makes;
+# on expiry the command shows what it has (shorter quiz / deck / plan).
+# 0 disables the deadline.
+QUIZ_SLA_S = float(os.getenv("QUIZ_SLA_S", "60"))
+FLASHCARDS_SLA_S = float(os.getenv("FLASHCARDS_SLA_S", "45"))
+PLAN_SLA_S = float(os.getenv("PLAN_SLA_S", "150"))
+NOTES_PLAN_SLA_S = float(os.getenv("NOTES_PLAN_SLA_S", "120"))  # web /api/notes plan routes
+
+# Speculative prefetch of the likely next command (quiz -> quiz/flashcards,
+# flashcards -> quiz) at the lowest scheduler priority, only while the LLM
+# queue is idle; unused results are dropped after PREFETCH_TTL_S
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+PREFETCH_TTL_S = float(os.getenv("PREFETCH_TTL_S", "600"))
+PREFETCH_MAX_INFLIGHT = int(os.getenv("PREFETCH_MAX_INFLIGHT", "2"))
+PREFETCH_MAX_SLOTS = int(os.getenv("PREFETCH_MAX_SLOTS", "200"))
+
+# Quiz question bank: pre-generated pool for the stock topics (background refill)
+QUIZ_BANK_ENABLED = os.getenv("QUIZ_BANK_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+QUIZ_BANK_TOPICS = os.getenv("QUIZ_BANK_TOPICS", "").strip()  # comma list, empty = QUIZ_TOPICS
+QUIZ_BANK_TARGET = int(os.getenv("QUIZ_BANK_TARGET", "30"))
+QUIZ_BANK_LOW_WATER = int(os.getenv("QUIZ_BANK_LOW_WATER", "10"))
+QUIZ_BANK_MAX_AGE_DAYS = float(os.getenv("QUIZ_BANK_MAX_AGE_DAYS", "14"))
+QUIZ_BANK_MAX_SERVES = int(os.getenv("QUIZ_BANK_MAX_SERVES", "500"))
+QUIZ_BANK_REFILL_INTERVAL_S = float(os.getenv("QUIZ_BANK_REFILL_INTERVAL_S", "300"))
+
+# Persistent flashcard decks per topic and model, shared across users, with
+# per-user SM-2 review scheduling: /flashcards serves due reviews and unseen
+# deck cards first and only generates what the deck lacks
+FLASHCARD_DECKS_ENABLED = os.getenv("FLASHCARD_DECKS_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+FLASHCARD_DECK_MAX_AGE_DAYS = float(os.getenv("FLASHCARD_DECK_MAX_AGE_DAYS", "30"))  # older cards aren't served as new
\ No newline at end of file